@@ -0,0 +1,51 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from .config import settings
+from .profiling import sampler, SLOW_QUERIES
+
+PROFILE_TARGETS = ("get_overview", "timeseries_counts", "poll_tick")
+
+def check_admin_token(token: Optional[str]) -> bool:
+    return bool(settings.admin_token) and hmac.compare_digest(token or "", settings.admin_token)
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.post("/profile/start")
+def profile_start(targets: str = ",".join(PROFILE_TARGETS), interval_ms: float = Query(5, gt=0), duration_s: float = Query(60, gt=0, le=600)):
+    """Start sampling the named targets' stacks.
+
+    get_overview and timeseries_counts are coroutines: they are sampled only
+    while running on the event loop, never while awaiting the database, so
+    their profiles show Python-side work (query building, row shaping) and
+    not query time. Use /admin/slow-queries for that. poll_tick is sync and
+    is sampled in full.
+    """
+    names = [t.strip() for t in targets.split(",") if t.strip()]
+    unknown = [t for t in names if t not in PROFILE_TARGETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown targets: {', '.join(unknown)}")
+    sampler.start(names, interval_ms=interval_ms, duration_s=duration_s)
+    return sampler.snapshot()
+
+@router.post("/profile/stop")
+def profile_stop():
+    sampler.stop()
+    return sampler.snapshot()
+
+@router.get("/profile")
+def profile(format: str = "json"):
+    snap = sampler.snapshot()
+    if format == "folded":
+        return PlainTextResponse(snap["folded"])
+    return snap
+
+@router.get("/slow-queries")
+def slow_queries():
+    return list(reversed(SLOW_QUERIES))
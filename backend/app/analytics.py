@@ -0,0 +1,216 @@
+"""Columnar copy of settled days for long-window metrics.
+
+The worker exports UTC days older than ANALYTICS_SETTLE_DAYS from
+workflow_runs (and those runs' jobs) to Parquet under ANALYTICS_DIR, one
+hive-style file per table per month. For windows of ANALYTICS_MIN_WINDOW_DAYS
+or more, app.metrics reads the exported days through DuckDB and asks Postgres
+only for the days after the newest export. Export state is tracked per day;
+a month is rewritten when one of its days is new, or gained or changed runs
+since its last export (e.g. through app.backfill, or a re-run of an old run).
+"""
+import logging, os, tempfile, threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal, engine, dialect_insert
+from . import models
+from .telemetry import ANALYTICS_ROWS_EXPORTED
+
+log = logging.getLogger("ci.analytics")
+
+_LOCK_KEY = 0x43494146  # pg advisory lock: one exporter across workers
+
+# table -> (COPY source query, DuckDB column types); repo is denormalized so reads need no join
+EXPORTS: Dict[str, Tuple[str, Tuple[Tuple[str, str], ...]]] = {
+    "workflow_runs": (
+        "SELECT r.id, r.repo_id, p.full_name AS repo, r.workflow_name, r.head_branch, r.event, r.status, r.conclusion,"
+        " r.started_at, r.completed_at, r.duration_secs, r.url, r.actor"
+        " FROM workflow_runs r JOIN repos p ON p.id = r.repo_id"
+        " WHERE r.started_at >= %(start)s AND r.started_at < %(end)s",
+        (("id", "BIGINT"), ("repo_id", "INTEGER"), ("repo", "VARCHAR"), ("workflow_name", "VARCHAR"),
+         ("head_branch", "VARCHAR"), ("event", "VARCHAR"), ("status", "VARCHAR"), ("conclusion", "VARCHAR"),
+         ("started_at", "TIMESTAMP"), ("completed_at", "TIMESTAMP"), ("duration_secs", "DOUBLE"),
+         ("url", "VARCHAR"), ("actor", "VARCHAR")),
+    ),
+    "workflow_jobs": (
+        "SELECT j.id, j.run_id, r.repo_id, p.full_name AS repo, r.head_branch, j.name, j.status, j.conclusion,"
+        " j.started_at, j.completed_at, j.duration_secs"
+        " FROM workflow_jobs j JOIN workflow_runs r ON r.id = j.run_id JOIN repos p ON p.id = r.repo_id"
+        " WHERE r.started_at >= %(start)s AND r.started_at < %(end)s",
+        (("id", "BIGINT"), ("run_id", "BIGINT"), ("repo_id", "INTEGER"), ("repo", "VARCHAR"),
+         ("head_branch", "VARCHAR"), ("name", "VARCHAR"), ("status", "VARCHAR"), ("conclusion", "VARCHAR"),
+         ("started_at", "TIMESTAMP"), ("completed_at", "TIMESTAMP"), ("duration_secs", "DOUBLE")),
+    ),
+}
+
+def partition_path(table: str, month: date) -> str:
+    # Monthly files: daily ones are too small for columnar scans to pay off
+    return os.path.join(settings.analytics_dir, table, f"month={month:%Y-%m}", "part.parquet")
+
+def _month_after(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _quote(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+# ---- Export (worker) ----
+
+def dirty_days(db: Session, until: date) -> List[date]:
+    # Days with runs that were never exported, or gained or changed rows since their export
+    # (re-runs and late conclusions update settled runs; rows from before updated_at existed fall back to created_at)
+    r, p = models.WorkflowRun, models.AnalyticsPartition
+    d = func.date(r.started_at)
+    q = (db.query(d)
+         .outerjoin(p, and_(p.table_name == "workflow_runs", p.day == d))
+         .filter(r.started_at != None, r.started_at < datetime.combine(until, time.min))
+         .filter(or_(p.day == None, func.coalesce(r.updated_at, r.created_at) > p.exported_at))
+         .group_by(d).order_by(d))
+    return [row[0] for row in q]
+
+def _export(cur, table: str, month: date, query: str, columns) -> Dict[date, int]:
+    path = partition_path(table, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    types = "{" + ", ".join(f"{_quote(c)}: {_quote(t)}" for c, t in columns) + "}"
+    with tempfile.NamedTemporaryFile("wb+", suffix=".csv", dir=os.path.dirname(path)) as buf:
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", buf)
+        buf.flush()
+        con = duckdb.connect()
+        try:
+            con.execute(f"COPY (SELECT * FROM read_csv({_quote(buf.name)}, header = true, columns = {types}) ORDER BY started_at) "
+                        f"TO {_quote(tmp)} (FORMAT parquet, COMPRESSION zstd)")
+            rows = dict(con.execute(f"SELECT CAST(started_at AS DATE), count(*) FROM read_parquet({_quote(tmp)}) GROUP BY 1").fetchall())
+        finally:
+            con.close()
+    os.replace(tmp, path)  # readers never see a half-written file
+    return rows
+
+def export_month(db: Session, month: date, until: date) -> Dict[str, Dict[date, int]]:
+    """Rewrite one month's files with every day before `until`; returns per-day row counts by table."""
+    params = {"start": datetime.combine(month, time.min), "end": datetime.combine(min(_month_after(month), until), time.min)}
+    cur = db.connection().connection.cursor()
+    return {table: _export(cur, table, month, cur.mogrify(query, params).decode(), columns)
+            for table, (query, columns) in EXPORTS.items()}
+
+def export_tick():
+    if not settings.analytics_enabled:
+        return
+    if engine.dialect.name != "postgresql":
+        log.warning("analytics export needs Postgres (COPY); skipping")
+        return
+    with engine.connect() as lock:
+        if not lock.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _LOCK_KEY}).scalar():
+            return  # another worker is exporting
+        db: Session = SessionLocal()
+        try:
+            until = datetime.utcnow().date() - timedelta(days=settings.analytics_settle_days)
+            # Oldest first, so every day before the newest exported one is always covered
+            for month in sorted({d.replace(day=1) for d in dirty_days(db, until)}):
+                exported_at = datetime.utcnow()  # taken before reading, so rows landing mid-export re-dirty the day
+                counts = export_month(db, month, until)
+                rows = [{"table_name": t, "day": d, "row_count": n, "exported_at": exported_at}
+                        for t, per_day in counts.items() for d, n in per_day.items()]
+                for i in range(0, len(rows), 500):
+                    stmt = dialect_insert(db, models.AnalyticsPartition).values(rows[i:i+500])
+                    db.execute(stmt.on_conflict_do_update(
+                        index_elements=["table_name", "day"],
+                        set_={"row_count": stmt.excluded.row_count, "exported_at": stmt.excluded.exported_at}))
+                db.commit()
+                for t, per_day in counts.items():
+                    ANALYTICS_ROWS_EXPORTED.inc(sum(per_day.values()), table=t)
+                log.info("exported %s: %s", f"{month:%Y-%m}", {t: sum(v.values()) for t, v in counts.items()})
+        except Exception:
+            db.rollback()
+            log.exception("analytics export failed")
+        finally:
+            db.close()
+            lock.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+
+# ---- Reads (API) ----
+
+_con = None
+_con_lock = threading.Lock()
+
+def _cursor():
+    # One in-memory DuckDB database per process; cursors are independent connections safe to use per thread
+    global _con
+    with _con_lock:
+        if _con is None:
+            _con = duckdb.connect()
+    return _con.cursor()
+
+async def split_point(db: AsyncSession, window_days: int) -> Optional[datetime]:
+    """Start of the first day not exported yet, when this window should use Parquet; else None."""
+    if not settings.analytics_enabled or window_days < settings.analytics_min_window_days:
+        return None
+    p = models.AnalyticsPartition
+    last = (await db.execute(select(func.max(p.day)).where(p.table_name == "workflow_runs"))).scalar()
+    return datetime.combine(last + timedelta(days=1), time.min) if last else None
+
+def _runs_source(since: datetime, until: datetime) -> Optional[str]:
+    months, m = [], since.date().replace(day=1)
+    while m < until.date():
+        months.append(m)
+        m = _month_after(m)
+    files = [p for p in (partition_path("workflow_runs", m) for m in months) if os.path.exists(p)]
+    return f"read_parquet([{', '.join(_quote(f) for f in files)}])" if files else None
+
+def _where(repo_full: Optional[str], branch: Optional[str], since: datetime, until: datetime) -> Tuple[str, list]:
+    # The upper bound matters: a month file can be rewritten with newer days after the split was read
+    clauses, params = ["started_at >= ?", "started_at < ?"], [since, until]
+    if repo_full:
+        clauses.append("repo = ?")
+        params.append(repo_full)
+    if branch:
+        clauses.append("head_branch = ?")
+        params.append(branch)
+    return " AND ".join(clauses), params
+
+def overview(repo_full: Optional[str], branch: Optional[str], since: datetime, until: datetime, with_last: bool = True) -> Optional[Dict]:
+    # Blocking; call through run_in_threadpool
+    src = _runs_source(since, until)
+    if src is None:
+        return None
+    where, params = _where(repo_full, branch, since, until)
+    cur = _cursor()
+    try:
+        total, successes, failures, dur_sum, dur_n = cur.execute(
+            "SELECT count(*), sum(CASE WHEN conclusion = 'success' THEN 1 ELSE 0 END),"
+            " sum(CASE WHEN conclusion = 'failure' THEN 1 ELSE 0 END),"
+            " sum(CASE WHEN duration_secs > 0 THEN duration_secs END), count(CASE WHEN duration_secs > 0 THEN 1 END)"
+            f" FROM {src} WHERE {where}", params).fetchone()
+        last = cur.execute(f"SELECT status, conclusion, started_at, url, repo, head_branch FROM {src} WHERE {where}"
+                           " ORDER BY started_at DESC LIMIT 1", params).fetchone() if with_last else None
+    finally:
+        cur.close()
+    return {"total": int(total or 0), "successes": int(successes or 0), "failures": int(failures or 0),
+            "dur_sum": float(dur_sum or 0.0), "dur_n": int(dur_n or 0), "last": last}
+
+def timeseries(repo_full: Optional[str], branch: Optional[str], since: datetime, until: datetime,
+               resolution: str = "day", tz: str = "UTC") -> List[tuple]:
+    src = _runs_source(since, until)
+    if src is None:
+        return []
+    where, params = _where(repo_full, branch, since, until)
+    cur = _cursor()
+    try:
+        # ICU time zone conversion is slow per row, so pre-aggregate to 15-minute UTC slots (every zone offset
+        # is a multiple of 15 minutes) and only convert those before bucketing in the viewer's zone
+        return cur.execute(
+            "WITH slots AS (SELECT time_bucket(INTERVAL 15 MINUTE, started_at) AS slot,"
+            " sum(CASE WHEN conclusion = 'success' THEN 1 ELSE 0 END) AS success,"
+            " sum(CASE WHEN conclusion = 'failure' THEN 1 ELSE 0 END) AS failure,"
+            " sum(CASE WHEN conclusion IN ('success', 'failure') THEN 0 ELSE 1 END) AS other,"
+            " sum(CASE WHEN duration_secs > 0 THEN duration_secs END) AS dur_sum, count(CASE WHEN duration_secs > 0 THEN 1 END) AS dur_n"
+            f" FROM {src} WHERE {where} GROUP BY slot)"
+            " SELECT date_trunc(?, timezone(?, slot AT TIME ZONE 'UTC')) AS bucket,"
+            " sum(success), sum(failure), sum(other), sum(dur_sum), sum(dur_n)"
+            " FROM slots GROUP BY bucket ORDER BY bucket", params + [resolution, tz]).fetchall()
+    finally:
+        cur.close()
@@ -0,0 +1,161 @@
+"""Import historical workflow runs (optionally with jobs) for selected repos.
+
+    python -m app.backfill --months 6 --repos 'myorg/*,other/api' --jobs
+
+Repos come from the repos table, so discovery must have run first. Each repo's
+history is walked newest window first, starting below the runs live polling
+owns, and written through the bulk upsert path, with a checkpoint in backfill_checkpoints after every page, so an
+interrupted backfill picks up where it stopped. Requests pause while an
+installation has fewer than GITHUB_RATE_RESERVE + BACKFILL_RATE_RESERVE
+calls left, which keeps that headroom for live polling. Repos the poller
+hasn't listed yet are skipped; rerun once it has.
+"""
+import argparse, fnmatch, logging, signal, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import func
+
+from .config import settings
+from .database import SessionLocal, init_db
+from .github import CircuitOpenError, GitHubClient
+from . import ingestor, models
+
+log = logging.getLogger("ci.backfill")
+
+def select_repos(db, patterns: List[str]) -> List[int]:
+    q = db.query(models.Repo.id, models.Repo.full_name).filter(models.Repo.is_active == True).order_by(models.Repo.id)
+    return [rid for rid, full in q if not patterns or any(fnmatch.fnmatch(full, p) for p in patterns)]
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def live_horizon(db, repo: models.Repo) -> datetime:
+    # Every tick the poller lists the newest max_runs_per_repo runs and applies their completions (jobs, logs,
+    # reliability, alerts); a completed run the backfill stored first would skip all of that, so history ends
+    # at the oldest of those runs, or at the last listing if there were fewer
+    r = models.WorkflowRun
+    newest = (db.query(r.started_at).filter(r.repo_id == repo.id, r.started_at != None)
+              .order_by(r.id.desc()).limit(settings.max_runs_per_repo).subquery())
+    oldest = db.query(func.min(newest.c.started_at)).scalar()
+    return min(oldest or repo.last_checked_at, repo.last_checked_at)
+
+def _checkpoint(db, repo: models.Repo, since: datetime) -> models.BackfillCheckpoint:
+    cp = db.get(models.BackfillCheckpoint, repo.id)
+    if cp is None:
+        cp = models.BackfillCheckpoint(repo_id=repo.id, since=since, cursor=live_horizon(db, repo).replace(microsecond=0), runs_imported=0)
+        db.add(cp)
+    elif since < cp.since:
+        # More history than last time: carry on down from the existing cursor
+        cp.since, cp.completed_at = since, None
+    return cp
+
+def _wait_for_budget(gh: GitHubClient, stop: threading.Event):
+    reserve = settings.github_rate_reserve + settings.backfill_rate_reserve
+    while not stop.is_set() and not gh.has_budget(reserve):
+        wait = max(1.0, (gh.rate_reset or time.time() + 60) - time.time())
+        log.info("rate budget low for %s (%s left), pausing %ds", gh.name or "token", gh.rate_remaining, wait)
+        stop.wait(min(wait, 60))
+
+def backfill_repo(repo_id: int, since: datetime, with_jobs: bool, stop: threading.Event) -> int:
+    db = SessionLocal()
+    try:
+        repo = db.get(models.Repo, repo_id)
+        gh = ingestor.client_for(repo)
+        cp = _checkpoint(db, repo, since)
+        db.commit()
+        imported = 0
+        window = timedelta(days=settings.backfill_window_days)
+        while cp.completed_at is None and not stop.is_set():
+            if cp.cursor <= cp.since:
+                cp.completed_at = datetime.utcnow()
+                db.commit()
+                break
+            start = max(cp.since, cp.cursor - window)
+            url = cp.next_url or gh.runs_url(repo.owner, repo.name, created=f"{_iso(start)}..{_iso(cp.cursor)}")
+            _wait_for_budget(gh, stop)
+            if stop.is_set():
+                break
+            try:
+                _, _, body, next_url = gh.get_page_conditional(url)
+            except CircuitOpenError as e:
+                log.warning("repo_id=%s: %s", repo_id, e)
+                stop.wait(e.retry_in)
+                continue
+            runs = body.get("workflow_runs", [])
+            ingestor.bulk_upsert_runs(db, repo, runs)
+            if with_jobs:
+                for run in runs:
+                    _wait_for_budget(gh, stop)
+                    if stop.is_set():
+                        break
+                    ingestor.bulk_upsert_jobs(db, run["id"], gh.list_jobs_for_run(repo.owner, repo.name, run["id"]).get("jobs", []))
+                if stop.is_set():
+                    db.commit()  # keep what was fetched; the checkpoint isn't advanced so this page is redone on resume
+                    break
+            imported += len(runs)
+            cp.runs_imported = (cp.runs_imported or 0) + len(runs)
+            if next_url:
+                cp.next_url = next_url
+            else:
+                cp.cursor, cp.next_url = start, None
+            cp.updated_at = datetime.utcnow()
+            db.commit()
+        return imported
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--months", type=int, default=6, help="how far back to import")
+    ap.add_argument("--since", help="ISO date to import back to (overrides --months)")
+    ap.add_argument("--repos", default="", help="comma-separated full_name globs (default: all active repos)")
+    ap.add_argument("--jobs", action="store_true", help="also import jobs for every run (one extra request per run)")
+    ap.add_argument("--concurrency", type=int, default=settings.backfill_concurrency, help="repos imported in parallel")
+    ap.add_argument("--restart", action="store_true", help="discard existing checkpoints for the selected repos")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    since = datetime.fromisoformat(args.since) if args.since else datetime.utcnow() - timedelta(days=30 * args.months)
+    init_db()
+    ingestor.init_client()
+    db = SessionLocal()
+    try:
+        repo_ids = select_repos(db, [p.strip() for p in args.repos.split(",") if p.strip()])
+        unpolled = {rid for (rid,) in db.query(models.Repo.id).filter(models.Repo.id.in_(repo_ids), models.Repo.last_checked_at == None)}
+        if unpolled:
+            log.warning("skipping %d repos live polling hasn't listed yet: %s", len(unpolled), sorted(unpolled))
+            repo_ids = [rid for rid in repo_ids if rid not in unpolled]
+        if args.restart and repo_ids:
+            db.query(models.BackfillCheckpoint).filter(models.BackfillCheckpoint.repo_id.in_(repo_ids)).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+    if not repo_ids and not unpolled:
+        log.error("no active repos match %r; run discovery first", args.repos or "*")
+        sys.exit(1)
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    log.info("backfilling %d repos since %s (concurrency=%d, jobs=%s)", len(repo_ids), since.date(), args.concurrency, args.jobs)
+    failed, total = 0, 0
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = {pool.submit(backfill_repo, rid, since, args.jobs, stop): rid for rid in repo_ids}
+        for f in as_completed(futures):
+            try:
+                n = f.result()
+                total += n
+                log.info("repo_id=%s: %d runs", futures[f], n)
+            except Exception:
+                failed += 1
+                log.exception("backfill failed for repo_id=%s", futures[f])
+    log.info("imported %d runs%s", total, "; interrupted, rerun to resume" if stop.is_set()
+             else f"; {len(unpolled)} repos skipped, rerun once they've been polled" if unpolled else "")
+    sys.exit(1 if failed or stop.is_set() or unpolled else 0)
+
+if __name__ == "__main__":
+    main()
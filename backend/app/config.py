@@ -10,11 +10,49 @@ def _bool(s: str, default: bool=False) -> bool:
 class Settings(BaseModel):
     # GitHub
     github_token: str = os.getenv("GITHUB_TOKEN", "")
-    repo_discovery_mode: str = os.getenv("REPO_DISCOVERY_MODE", "all")
+    github_api_url: str = os.getenv("GITHUB_API_URL", "https://api.github.com")
+    # GitHub App auth (takes precedence over GITHUB_TOKEN): one installation token + rate budget per org
+    github_app_id: str = os.getenv("GITHUB_APP_ID", "")
+    github_app_private_key: str = os.getenv("GITHUB_APP_PRIVATE_KEY", "")
+    github_app_private_key_path: str = os.getenv("GITHUB_APP_PRIVATE_KEY_PATH", "")
+    github_rate_reserve: int = int(os.getenv("GITHUB_RATE_RESERVE", "200"))  # stop polling an installation below this
+    # GitHub transport: pooled keep-alive connections, jittered retries on 5xx / connection errors, per-endpoint breakers
+    github_pool_size: int = int(os.getenv("GITHUB_POOL_SIZE", "10"))  # per client; >= concurrent ingest threads
+    github_connect_timeout: float = float(os.getenv("GITHUB_CONNECT_TIMEOUT", "5"))
+    github_read_timeout: float = float(os.getenv("GITHUB_READ_TIMEOUT", "30"))
+    github_retries: int = int(os.getenv("GITHUB_RETRIES", "3"))
+    github_backoff_factor: float = float(os.getenv("GITHUB_BACKOFF_FACTOR", "0.5"))  # 0.5s, 1s, 2s ... plus up to this much jitter
+    github_breaker_threshold: int = int(os.getenv("GITHUB_BREAKER_THRESHOLD", "5"))  # consecutive failures that open an endpoint's circuit
+    github_breaker_cooldown_seconds: float = float(os.getenv("GITHUB_BREAKER_COOLDOWN_SECONDS", "30"))
+    repo_discovery_mode: str = os.getenv("REPO_DISCOVERY_MODE", "all")  # 'all' | 'allowlist'
+    repo_allowlist: str = os.getenv("REPO_ALLOWLIST", "")  # comma-separated full_name globs, e.g. 'myorg/*,other/api'
+    repo_include_forks: bool = _bool(os.getenv("REPO_INCLUDE_FORKS", "true"))
+    repo_include_archived: bool = _bool(os.getenv("REPO_INCLUDE_ARCHIVED", "true"))
+    discovery_interval_seconds: int = int(os.getenv("DISCOVERY_INTERVAL_SECONDS", "900"))
     branch_filters: str = os.getenv("BRANCH_FILTERS", "")  # comma-separated
     poll_interval_seconds: int = int(os.getenv("POLL_INTERVAL_SECONDS", "30"))
     poll_shards: int = int(os.getenv("POLL_SHARDS", "4"))
     max_runs_per_repo: int = int(os.getenv("MAX_RUNS_PER_REPO", "50"))
+    # Change probe: one GraphQL query per 100 leased repos; only repos whose activity fingerprint changed are listed
+    github_probe: bool = _bool(os.getenv("GITHUB_PROBE", "true"))
+    # The probe can't see fork-PR runs or re-runs on other branches: list an idle repo anyway once its last full listing is this old
+    probe_full_poll_minutes: float = float(os.getenv("PROBE_FULL_POLL_MINUTES", "10"))
+    poll_idle_max_factor: int = int(os.getenv("POLL_IDLE_MAX_FACTOR", "4"))  # idle repos' poll interval doubles up to this multiple
+    # Fast lane: queued / in-progress runs refreshed one by one (conditional GET) until they complete
+    open_runs_poll_seconds: int = int(os.getenv("OPEN_RUNS_POLL_SECONDS", "10"))  # 0 = off
+    open_runs_batch_size: int = int(os.getenv("OPEN_RUNS_BATCH_SIZE", "100"))
+    open_runs_max_age_hours: int = int(os.getenv("OPEN_RUNS_MAX_AGE_HOURS", "12"))  # stuck runs fall back to the regular poll
+    # Historical backfill (python -m app.backfill); its reserve sits on top of github_rate_reserve so live polling keeps priority
+    backfill_rate_reserve: int = int(os.getenv("BACKFILL_RATE_RESERVE", "1000"))
+    backfill_window_days: int = int(os.getenv("BACKFILL_WINDOW_DAYS", "7"))  # GitHub caps filtered run listings at 1000 results
+    backfill_concurrency: int = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+
+    # Ingest workers (repos are leased from the repo_leases table)
+    worker_id: str = os.getenv("WORKER_ID", "")  # defaults to hostname-pid
+    poll_batch_size: int = int(os.getenv("POLL_BATCH_SIZE", "25"))
+    lease_seconds: int = int(os.getenv("LEASE_SECONDS", "120"))
+    ingest_processes: int = int(os.getenv("INGEST_PROCESSES", "2"))  # process pool for log compression/parsing
+    embedded_ingestor: bool = _bool(os.getenv("EMBEDDED_INGESTOR", "false"))  # run the scheduler inside the API (single-process dev setups)
 
     # Storage / Logs
     log_storage: str = os.getenv("LOG_STORAGE", "disk")
@@ -22,18 +60,52 @@ class Settings(BaseModel):
     log_gzip: bool = _bool(os.getenv("LOG_GZIP", "true"))
     log_retention_days: int = int(os.getenv("LOG_RETENTION_DAYS", "7"))
     max_log_bytes_per_job: int = int(os.getenv("MAX_LOG_BYTES_PER_JOB", "10485760"))
+    # Failure excerpts (kept in the DB for every failed job, also when the log itself is over the size cap)
+    excerpt_tail_lines: int = int(os.getenv("EXCERPT_TAIL_LINES", "50"))
+    excerpt_context_lines: int = int(os.getenv("EXCERPT_CONTEXT_LINES", "10"))  # before and after the first ##[error]
+
+    # Columnar analytics: the worker exports settled days to Parquet, the API reads them with DuckDB (both need ANALYTICS_DIR)
+    analytics_enabled: bool = _bool(os.getenv("ANALYTICS_ENABLED", "false"))
+    analytics_dir: str = os.getenv("ANALYTICS_DIR", "/data/analytics")
+    analytics_min_window_days: int = int(os.getenv("ANALYTICS_MIN_WINDOW_DAYS", "30"))  # shorter windows stay on Postgres
+    analytics_settle_days: int = int(os.getenv("ANALYTICS_SETTLE_DAYS", "2"))  # days this recent may still change; not exported
+    analytics_export_minutes: int = int(os.getenv("ANALYTICS_EXPORT_MINUTES", "60"))
+
+    # Duration regressions: EWMA baseline of successful runs per repo + workflow (see app.regressions)
+    regression_alpha: float = float(os.getenv("REGRESSION_ALPHA", "0.1"))  # weight of each new run in the baseline
+    regression_min_samples: int = int(os.getenv("REGRESSION_MIN_SAMPLES", "10"))  # runs before anything is flagged
+    regression_zscore: float = float(os.getenv("REGRESSION_ZSCORE", "3"))  # standard deviations above the mean
+    regression_min_secs: float = float(os.getenv("REGRESSION_MIN_SECS", "60"))  # and at least this much slower
+    regression_alert_runs: int = int(os.getenv("REGRESSION_ALERT_RUNS", "0"))  # Slack alert after N slow runs in a row (0 = off)
 
     # Alerts (Slack)
     alerts_enabled: bool = _bool(os.getenv("ALERTS_ENABLED", "true"))
     alert_channel_mentions: str = os.getenv("ALERT_CHANNEL_MENTIONS", "channel")  # 'channel'|'here'|''
     slack_webhook_url: str = os.getenv("SLACK_WEBHOOK_URL", "")
+    flaky_suppress_score: float = float(os.getenv("FLAKY_SUPPRESS_SCORE", "0"))  # skip alerts when all failed jobs score >= this (0 = off)
+    flaky_min_commits: int = int(os.getenv("FLAKY_MIN_COMMITS", "3"))  # flaky commits needed before suppressing
 
     # API / UI
-    tz: str = os.getenv("TZ", "Asia/Kolkata")
+    tz: str = os.getenv("TZ", "Asia/Kolkata")  # default timezone for timeseries buckets
+    timeseries_max_points: int = int(os.getenv("TIMESERIES_MAX_POINTS", "200"))
+    export_batch_size: int = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))  # rows per server-side cursor fetch in /api/export
     jwt_secret: str = os.getenv("JWT_SECRET", "change_me")
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")  # enables /admin (X-Admin-Token header); empty disables it
+    slow_query_ms: int = int(os.getenv("SLOW_QUERY_MS", "200"))  # 0 disables slow-query capture
     api_port: int = int(os.getenv("API_PORT", "8080"))
+    worker_metrics_port: int = int(os.getenv("WORKER_METRICS_PORT", "9100"))  # 0 disables the worker's /metrics
 
     # DB
     database_url: str = os.getenv("DATABASE_URL", "postgresql://ci:ci@db:5432/ci_metrics")
+    # Per engine and per process: the API's async read engine and the sync engine each get their own pool
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; stay under proxy/LB idle cutoffs
+    db_statement_timeout_ms: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # API engines only; 0 disables
+    # Read replicas for dashboard reads (comma-separated); empty sends everything to DATABASE_URL
+    database_read_urls: str = os.getenv("DATABASE_READ_URLS", os.getenv("DATABASE_READ_URL", ""))
+    replica_max_lag_seconds: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))  # lagging replicas are skipped
+    replica_lag_check_seconds: float = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
 
 settings = Settings()
@@ -1,15 +1,124 @@
-from sqlalchemy import create_engine
+import itertools, logging, time
+from contextlib import asynccontextmanager
+from typing import List
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base, Session as ORMSession
 from .config import settings
+from .telemetry import DB_POOL_CONNECTIONS, DB_READS, DB_REPLICA_LAG_SECONDS, on_collect
 
-engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
+log = logging.getLogger("ci.database")
+
+def _pool_args() -> dict:
+    return {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout, "pool_recycle": settings.db_pool_recycle}
+
+def _api_connect_args(url: str) -> dict:
+    # Cap dashboard queries so a runaway aggregate can't hold connections (and locks) indefinitely
+    if not settings.db_statement_timeout_ms or not url.startswith("postgresql+asyncpg"):
+        return {}
+    return {"server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}}
+
+def async_url(url: str) -> str:
+    # Same database, asyncpg driver (read endpoints run on the event loop instead of the threadpool)
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+engine = create_engine(settings.database_url, pool_pre_ping=True, future=True, **_pool_args())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
+def _api_engine(url: str):
+    url = async_url(url)
+    return create_async_engine(url, pool_pre_ping=True, connect_args=_api_connect_args(url), **_pool_args())
+
+_async_primary = None  # (engine, sessionmaker); built on first use so importing this module works with any DATABASE_URL
+
+def _async_sessions() -> async_sessionmaker:
+    global _async_primary
+    if _async_primary is None:
+        eng = _api_engine(settings.database_url)
+        _async_primary = eng, async_sessionmaker(eng, expire_on_commit=False, autoflush=False)
+    return _async_primary[1]
+
+def AsyncSessionLocal() -> AsyncSession:
+    return _async_sessions()()
+
+class _Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = _api_engine(url)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False, autoflush=False)
+        self.lag = None
+        self.checked_at = float("-inf")
+
+READ_REPLICAS: List[_Replica] = [_Replica(f"replica{i}", u.strip())
+                                 for i, u in enumerate(settings.database_read_urls.split(",")) if u.strip()]
+_next_replica = itertools.count()
+
+# 0 when the replica has replayed everything it received (an idle primary makes the replay timestamp look old)
+_LAG_SQL = text("SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END")
+
 Base = declarative_base()
 
+# Run right before the named unique index is first built, to remove rows that would violate it
+_BEFORE_INDEX = {
+    # Older versions inserted a new row per step on every job fetch; keep the newest of each (job_id, number)
+    "uq_workflow_steps_job_number": "DELETE FROM workflow_steps WHERE number IS NOT NULL AND EXISTS ("
+                                    "SELECT 1 FROM workflow_steps d WHERE d.job_id = workflow_steps.job_id"
+                                    " AND d.number = workflow_steps.number AND d.id > workflow_steps.id)",
+}
+
+_MIGRATE_LOCK_KEY = 0x43494442  # pg advisory lock: one schema migration at a time
+
 def init_db():
-    from . import models  # noqa: F401 - ensure models are imported
+    # The API bootstrap, workers and backfill all run this at start; on Postgres they take turns,
+    # so concurrent starts don't race on CREATE TABLE / ADD COLUMN / CREATE INDEX or the seeds
+    if engine.dialect.name != "postgresql":
+        return _migrate()
+    with engine.connect() as lock:
+        lock.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _MIGRATE_LOCK_KEY})
+        try:
+            _migrate()
+        finally:
+            lock.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _MIGRATE_LOCK_KEY})
+
+def _migrate():
+    from . import models, statusboard  # noqa: F401 - ensure models are imported
+    created = {t.name for t in Base.metadata.sorted_tables} - set(inspect(engine).get_table_names())
     Base.metadata.create_all(bind=engine)
+    if "branch_status" in created:
+        # Derived from stored runs; later kept current by the ingestor
+        with engine.begin() as conn:
+            log.info("branch_status: seeded %d rows", statusboard.seed(conn))
+    # create_all skips existing tables, so add columns and indexes declared after a table was first created
+    # (additive changes only: new columns must be nullable)
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            have = {c["name"] for c in existing.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in have:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"))
+    for table in Base.metadata.sorted_tables:
+        have = {i["name"] for i in inspect(engine).get_indexes(table.name)}
+        for idx in table.indexes:
+            if idx.name not in have:
+                with engine.begin() as conn:
+                    if idx.name in _BEFORE_INDEX:
+                        log.info("%s: removed %d rows before building %s", table.name,
+                                 conn.execute(text(_BEFORE_INDEX[idx.name])).rowcount, idx.name)
+                    idx.create(bind=conn)
+
+def dialect_insert(db, model):
+    # INSERT construct with ON CONFLICT support for the session's backend (Postgres in prod, SQLite locally)
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(model)
 
 def get_db():
     db = SessionLocal()
@@ -18,5 +127,52 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    # Primary; for routes that write, or must read what they (or the ingestor) just wrote
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def _replica_ok(r: _Replica, db: AsyncSession) -> bool:
+    if time.monotonic() - r.checked_at >= settings.replica_lag_check_seconds:
+        r.checked_at = time.monotonic()
+        try:
+            r.lag = float((await db.execute(_LAG_SQL)).scalar() or 0.0)
+        except Exception:
+            await db.rollback()
+            r.lag = None
+            log.warning("read replica %s unreachable; using other targets", r.name, exc_info=True)
+        DB_REPLICA_LAG_SECONDS.set(-1 if r.lag is None else r.lag, replica=r.name)
+    return r.lag is not None and r.lag <= settings.replica_max_lag_seconds
+
+@asynccontextmanager
+async def read_session():
+    # Dashboard reads: round-robin over replicas within REPLICA_MAX_LAG_SECONDS, else the primary
+    for _ in range(len(READ_REPLICAS)):
+        r = READ_REPLICAS[next(_next_replica) % len(READ_REPLICAS)]
+        async with r.sessions() as db:
+            if await _replica_ok(r, db):
+                DB_READS.inc(target=r.name)
+                yield db
+                return
+    DB_READS.inc(target="primary")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with read_session() as db:
+        yield db
+
+@on_collect
+def _collect_pool_stats():
+    engines = [("primary", engine)] + ([("primary_async", _async_primary[0].sync_engine)] if _async_primary else []) \
+        + [(r.name, r.engine.sync_engine) for r in READ_REPLICAS]
+    for name, eng in engines:
+        pool = eng.pool
+        if not hasattr(pool, "checkedout"):
+            continue  # e.g. SQLite's single-connection pools
+        DB_POOL_CONNECTIONS.set(pool.checkedout(), engine=name, state="in_use")
+        DB_POOL_CONNECTIONS.set(pool.checkedin(), engine=name, state="idle")
+        DB_POOL_CONNECTIONS.set(max(0, pool.overflow()), engine=name, state="overflow")
+
 # Type alias
 Session = ORMSession
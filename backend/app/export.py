@@ -0,0 +1,154 @@
+"""Streaming bulk export of runs and jobs as CSV, NDJSON or Parquet.
+
+Rows come from a server-side cursor in EXPORT_BATCH_SIZE batches, and each
+batch is encoded off the event loop, so memory stays flat however many
+rows match. CSV and NDJSON stream as they are read. Parquet needs the whole
+file before its footer can be written: batches are spooled to a temp file
+in the NDJSON export's own encoding, read by DuckDB with the columns' declared
+types (so NULL and '' stay distinct and nothing is re-inferred), and the
+finished file is then streamed out.
+"""
+import csv, io, os, tempfile
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import duckdb, orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Float, Integer, DateTime, select, text
+
+from .config import settings
+from .database import read_session
+from . import models
+from .telemetry import EXPORT_ROWS
+
+FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+_RUN_COLUMNS = (
+    models.WorkflowRun.id,
+    models.Repo.full_name.label("repo"),
+    models.WorkflowRun.workflow_name,
+    models.WorkflowRun.head_branch,
+    models.WorkflowRun.head_sha,
+    models.WorkflowRun.event,
+    models.WorkflowRun.status,
+    models.WorkflowRun.conclusion,
+    models.WorkflowRun.run_attempt,
+    models.WorkflowRun.started_at,
+    models.WorkflowRun.completed_at,
+    models.WorkflowRun.duration_secs,
+    models.WorkflowRun.url,
+    models.WorkflowRun.actor,
+)
+_JOB_COLUMNS = (
+    models.WorkflowJob.id,
+    models.WorkflowJob.run_id,
+    models.Repo.full_name.label("repo"),
+    models.WorkflowRun.workflow_name,
+    models.WorkflowRun.head_branch,
+    models.WorkflowJob.name,
+    models.WorkflowJob.status,
+    models.WorkflowJob.conclusion,
+    models.WorkflowJob.run_attempt,
+    models.WorkflowJob.started_at,
+    models.WorkflowJob.completed_at,
+    models.WorkflowJob.duration_secs,
+)
+
+def _naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt is not None and dt.tzinfo else dt
+
+def _filter(stmt, repo_full, branch, workflow, since, until):
+    # Both exports filter on the run's started_at (indexed); jobs inherit their run's time
+    if since:
+        stmt = stmt.where(models.WorkflowRun.started_at >= _naive_utc(since))
+    if until:
+        stmt = stmt.where(models.WorkflowRun.started_at < _naive_utc(until))
+    if repo_full:
+        stmt = stmt.where(models.Repo.full_name == repo_full)
+    if branch:
+        stmt = stmt.where(models.WorkflowRun.head_branch == branch)
+    if workflow:
+        stmt = stmt.where(models.WorkflowRun.workflow_name == workflow)
+    return stmt
+
+def runs_query(repo_full=None, branch=None, workflow=None, since=None, until=None):
+    stmt = select(*_RUN_COLUMNS).join(models.Repo, models.Repo.id == models.WorkflowRun.repo_id)
+    return _filter(stmt, repo_full, branch, workflow, since, until).order_by(models.WorkflowRun.started_at, models.WorkflowRun.id)
+
+def jobs_query(repo_full=None, branch=None, workflow=None, since=None, until=None):
+    stmt = (select(*_JOB_COLUMNS)
+            .join(models.WorkflowRun, models.WorkflowRun.id == models.WorkflowJob.run_id)
+            .join(models.Repo, models.Repo.id == models.WorkflowRun.repo_id))
+    return _filter(stmt, repo_full, branch, workflow, since, until).order_by(models.WorkflowRun.started_at, models.WorkflowJob.id)
+
+async def _batches(stmt) -> AsyncIterator[list]:
+    async with read_session() as db:
+        if db.bind.dialect.name == "postgresql":
+            await db.execute(text("SET LOCAL statement_timeout = 0"))  # the API's timeout is for dashboard queries
+        result = await db.stream(stmt.execution_options(yield_per=settings.export_batch_size))
+        async for rows in result.partitions():
+            yield rows
+
+def _csv_chunk(keys, rows, header: bool) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(keys)
+    w.writerows(rows)
+    return buf.getvalue().encode()
+
+def _ndjson_chunk(keys, rows, header: bool) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(keys, r))) + b"\n" for r in rows)
+
+def _duck_type(t) -> str:
+    if isinstance(t, Integer):
+        return "BIGINT"
+    if isinstance(t, Float):
+        return "DOUBLE"
+    if isinstance(t, DateTime):
+        return "TIMESTAMP"
+    return "VARCHAR"
+
+def _ndjson_to_parquet(src: str, dst: str, columns):
+    types = "{" + ", ".join(f"'{name}': '{_duck_type(t)}'" for name, t in columns) + "}"
+    con = duckdb.connect()
+    try:
+        # Explicit columns keep the file's schema (and column order) even when there are no rows
+        con.execute(f"COPY (SELECT * FROM read_json('{src}', format = 'newline_delimited', columns = {types})) "
+                    f"TO '{dst}' (FORMAT parquet, COMPRESSION zstd)")
+    finally:
+        con.close()
+
+def _spool(f, keys, rows):
+    f.write(_ndjson_chunk(keys, rows, False))
+
+async def stream(kind: str, stmt, fmt: str) -> AsyncIterator[bytes]:
+    keys = [c.name for c in stmt.selected_columns]
+    if fmt != "parquet":
+        encode, header = (_csv_chunk if fmt == "csv" else _ndjson_chunk), True
+        async for rows in _batches(stmt):
+            yield await run_in_threadpool(encode, keys, rows, header)
+            EXPORT_ROWS.inc(len(rows), kind=kind, format=fmt)
+            header = False
+        if header and fmt == "csv":
+            yield _csv_chunk(keys, [], True)  # no rows: header only
+        return
+
+    tmp = tempfile.mkdtemp(prefix="export-")
+    src, dst = os.path.join(tmp, "rows.ndjson"), os.path.join(tmp, "rows.parquet")
+    try:
+        n = 0
+        with open(src, "wb") as f:
+            async for rows in _batches(stmt):
+                await run_in_threadpool(_spool, f, keys, rows)
+                n += len(rows)
+        await run_in_threadpool(_ndjson_to_parquet, src, dst, [(c.name, c.type) for c in stmt.selected_columns])
+        EXPORT_ROWS.inc(n, kind=kind, format=fmt)
+        with open(dst, "rb") as f:
+            while chunk := await run_in_threadpool(f.read, 1 << 20):
+                yield chunk
+    finally:
+        for p in (src, dst):
+            if os.path.exists(p):
+                os.remove(p)
+        os.rmdir(tmp)
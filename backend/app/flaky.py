@@ -0,0 +1,123 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+from . import models
+from .config import settings
+from .reliability import FAILURE_CONCLUSIONS, SUCCESS_CONCLUSIONS
+
+# A commit is flaky for a workflow (job_name '') or job once it has both failed and passed
+# without a code change: a re-run attempt, or another run on the same head_sha.
+
+def get_stat(db: Session, repo_id: int, workflow: str, job: str) -> models.FlakyStat:
+    stat = db.query(models.FlakyStat).filter(
+        models.FlakyStat.repo_id == repo_id,
+        models.FlakyStat.workflow_name == workflow,
+        models.FlakyStat.job_name == job,
+    ).first()
+    if not stat:
+        stat = models.FlakyStat(repo_id=repo_id, workflow_name=workflow, job_name=job,
+                                commits_total=0, failed_commits=0, flaky_commits=0, score=0.0)
+        db.add(stat)
+        db.flush()  # sessions don't autoflush: the next lookup of this key must find it
+    return stat
+
+def _mark_flaky(stat: models.FlakyStat, result: models.CommitResult, at: datetime):
+    result.flaky_at = at
+    stat.flaky_commits += 1
+    stat.last_flaky_at = at
+    stat.last_flaky_sha = result.head_sha
+
+def _observe(db: Session, run: models.WorkflowRun, job: str, failed: bool):
+    workflow = run.workflow_name or ""
+    stat = get_stat(db, run.repo_id, workflow, job)
+    result = db.query(models.CommitResult).filter(
+        models.CommitResult.repo_id == run.repo_id,
+        models.CommitResult.workflow_name == workflow,
+        models.CommitResult.job_name == job,
+        models.CommitResult.head_sha == run.head_sha,
+    ).first()
+    if not result:
+        result = models.CommitResult(repo_id=run.repo_id, workflow_name=workflow, job_name=job,
+                                     head_sha=run.head_sha, failures=0, successes=0)
+        db.add(result)
+        db.flush()
+        stat.commits_total += 1
+    if failed:
+        if result.failures == 0:
+            stat.failed_commits += 1
+        result.failures += 1
+    else:
+        result.successes += 1
+        if result.failures and result.flaky_at is None:
+            _mark_flaky(stat, result, run.completed_at)
+    _update_score(stat)
+
+def _update_score(stat: models.FlakyStat):
+    stat.score = stat.flaky_commits / stat.failed_commits if stat.failed_commits else 0.0
+    stat.updated_at = datetime.utcnow()
+
+def failed_jobs(db: Session, run: models.WorkflowRun) -> List[str]:
+    # Jobs of the run's current attempt only; earlier attempts' jobs stay under the same run_id
+    q = db.query(models.WorkflowJob.name).filter(
+        models.WorkflowJob.run_id == run.id,
+        func.coalesce(models.WorkflowJob.run_attempt, 1) == (run.run_attempt or 1),
+        models.WorkflowJob.conclusion.in_(FAILURE_CONCLUSIONS),
+    ).distinct()
+    return sorted(name for (name,) in q if name)
+
+def record(db: Session, run: models.WorkflowRun) -> Optional[models.RunAttempt]:
+    """Keep the completed attempt and fold it into the commit / flakiness rows.
+
+    Each (run, attempt) is applied once; seeing it again is a no-op. Failed
+    attempts count per workflow and per failed job (their jobs must already
+    be stored); a passing attempt clears every job that failed on that commit.
+    """
+    if run.status != "completed" or not run.completed_at:
+        return None
+    attempt = run.run_attempt or 1
+    if db.get(models.RunAttempt, (run.id, attempt)):
+        return None
+    rec = models.RunAttempt(run_id=run.id, attempt=attempt, repo_id=run.repo_id, workflow_name=run.workflow_name,
+                            head_sha=run.head_sha, conclusion=run.conclusion,
+                            started_at=run.started_at, completed_at=run.completed_at)
+    db.add(rec)
+    if not run.head_sha or run.conclusion not in FAILURE_CONCLUSIONS + SUCCESS_CONCLUSIONS:
+        return rec
+    if run.conclusion in FAILURE_CONCLUSIONS:
+        _observe(db, run, "", True)
+        for name in failed_jobs(db, run):
+            _observe(db, run, name, True)
+        return rec
+
+    _observe(db, run, "", False)
+    # Jobs aren't fetched for passing runs; the workflow passing means every job that failed on this commit passed
+    db.flush()  # failures counted earlier in this batch must be visible to the query
+    pending = db.query(models.CommitResult).filter(
+        models.CommitResult.repo_id == run.repo_id,
+        models.CommitResult.workflow_name == (run.workflow_name or ""),
+        models.CommitResult.head_sha == run.head_sha,
+        models.CommitResult.job_name != "",
+        models.CommitResult.flaky_at == None,
+        models.CommitResult.failures > 0,
+    ).all()
+    for result in pending:
+        result.successes += 1
+        stat = get_stat(db, run.repo_id, result.workflow_name, result.job_name)
+        _mark_flaky(stat, result, run.completed_at)
+        _update_score(stat)
+    return rec
+
+def is_known_flaky(db: Session, run: models.WorkflowRun) -> bool:
+    # Every failed job (or the workflow, when no job failed) must already have a flaky history
+    if settings.flaky_suppress_score <= 0:
+        return False
+    names = failed_jobs(db, run) or [""]
+    stats = db.query(models.FlakyStat).filter(
+        models.FlakyStat.repo_id == run.repo_id,
+        models.FlakyStat.workflow_name == (run.workflow_name or ""),
+        models.FlakyStat.job_name.in_(names),
+    ).all()
+    ok = {s.job_name for s in stats
+          if s.flaky_commits >= settings.flaky_min_commits and s.score >= settings.flaky_suppress_score}
+    return all(n in ok for n in names)
@@ -1,25 +1,170 @@
+import hashlib
+import json
+import re
 import requests
-from typing import List, Dict, Optional, Tuple
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlencode
+from typing import List, Dict, Optional, Tuple, Callable
 from datetime import datetime, timezone
 from dateutil import parser as dtparser
 
+from .config import settings
+from .telemetry import GITHUB_REQUEST_SECONDS, GITHUB_RATE_REMAINING, GITHUB_CIRCUIT_OPEN, GITHUB_CIRCUIT_REJECTED
+
 API_URL = "https://api.github.com"
 
+_REPO_PATH = re.compile(r"/repos/[^/]+/[^/]+")
+_NUMERIC = re.compile(r"/\d+(?=/|$)")
+
+def endpoint_label(url: str) -> str:
+    # Low-cardinality metric label: /repos/o/r/actions/runs/123/jobs -> /repos/{repo}/actions/runs/{id}/jobs
+    path = re.sub(r"^https?://[^/]+", "", url).split("?", 1)[0]
+    return _NUMERIC.sub("/{id}", _REPO_PATH.sub("/repos/{repo}", path))
+
+def build_session() -> requests.Session:
+    """Pooled session that retries idempotent calls on 5xx and connection/read errors.
+
+    Backoff is exponential with jitter so workers don't retry in lockstep; 403/429
+    rate-limit responses are not retried here (the rate budget handles those).
+    Read timeouts are retried once at most, so a hung endpoint costs about two
+    read timeouts per call until its breaker opens.
+    """
+    retry = Retry(total=settings.github_retries, connect=settings.github_retries, read=min(1, settings.github_retries),
+                  status=settings.github_retries, status_forcelist=(500, 502, 503, 504),
+                  backoff_factor=settings.github_backoff_factor, backoff_jitter=settings.github_backoff_factor,
+                  backoff_max=10, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.github_pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({
+        "Accept": "application/vnd.github+json",
+        "X-GitHub-Api-Version": "2022-11-28",
+        "User-Agent": "ci-dashboard"
+    })
+    return s
+
+def timeouts(read: Optional[float] = None) -> Tuple[float, float]:
+    return settings.github_connect_timeout, read or settings.github_read_timeout
+
+class CircuitOpenError(requests.RequestException):
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"circuit open for {endpoint}; retry in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Fails fast on one endpoint after `threshold` consecutive failures.
+
+    Failures are connection errors, timeouts and 5xx left after retries. Once
+    open, calls raise CircuitOpenError without touching the network until
+    `cooldown` has passed; then a single trial call goes through and closes
+    the circuit on success or re-opens it on failure.
+    """
+
+    def __init__(self, endpoint: str, threshold: int, cooldown: float):
+        self.endpoint = endpoint
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    def before(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            wait = self.cooldown - (time.monotonic() - self.opened_at)
+            if wait > 0 or self.trial:
+                GITHUB_CIRCUIT_REJECTED.inc(endpoint=self.endpoint)
+                raise CircuitOpenError(self.endpoint, max(wait, 1.0))
+            self.trial = True
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.failures, self.opened_at, self.trial = 0, None, False
+            else:
+                self.failures += 1
+                self.trial = False
+                if self.failures >= self.threshold or self.opened_at is not None:
+                    self.opened_at = time.monotonic()
+            GITHUB_CIRCUIT_OPEN.set(0 if self.opened_at is None else 1, endpoint=self.endpoint)
+
+# Shared by every client in the process: an endpoint outage affects all installations alike
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    with _breakers_lock:
+        b = _breakers.get(endpoint)
+        if b is None:
+            b = _breakers[endpoint] = CircuitBreaker(endpoint, settings.github_breaker_threshold, settings.github_breaker_cooldown_seconds)
+        return b
+
+_PROBE_FIELDS = ("pushedAt defaultBranchRef { target { ... on Commit { oid "
+                 "checkSuites(last: 1) { nodes { status conclusion updatedAt } } } } }")
+
 class GitHubClient:
-    def __init__(self, token: str):
-        self.session = requests.Session()
-        self.session.headers.update({
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/vnd.github+json",
-            "X-GitHub-Api-Version": "2022-11-28",
-            "User-Agent": "ci-dashboard"
-        })
+    def __init__(self, token: str = "", api_url: str = API_URL, token_provider: Optional[Callable[[], str]] = None, name: str = ""):
+        # token_provider is used for short-lived credentials (GitHub App installation tokens)
+        self.name = name  # installation login in App mode; labels the rate-limit gauge
+        self.api_url = (api_url or API_URL).rstrip("/")
+        self.token_provider = token_provider or (lambda: token)
+        self.rate_remaining: Optional[int] = None
+        self.rate_reset: Optional[float] = None  # epoch seconds
+        self.session = build_session()
+
+    def _get(self, url: str, params: Dict = None, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        return self._request("GET", url, params=params, timeout=timeout, **kwargs)
+
+    def _request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        # timeout is the read timeout; connect timeout, retries and the endpoint's breaker are shared settings
+        endpoint = endpoint_label(url)
+        breaker = breaker_for(endpoint)
+        # Token first: minting an installation token can fail, and must not strand the breaker mid-trial
+        headers = {**kwargs.pop("headers", {}), "Authorization": f"Bearer {self.token_provider()}"}
+        breaker.before()
+        start = time.perf_counter()
+        status = "error"
+        try:
+            resp = self.session.request(method, url, timeout=timeouts(timeout), headers=headers, **kwargs)
+            status = resp.status_code
+        except BaseException:
+            breaker.record(False)  # every exit after before() must record, or a trial call never ends
+            raise
+        finally:
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=status)
+        breaker.record(resp.status_code < 500)
+        self._track_rate(resp)
+        return resp
+
+    def _track_rate(self, resp: requests.Response):
+        if resp.headers.get("X-RateLimit-Resource") == "graphql":
+            return  # separate points budget; has_budget guards the REST limit
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset = resp.headers.get("X-RateLimit-Reset")
+        if remaining is not None:
+            self.rate_remaining = int(remaining)
+            GITHUB_RATE_REMAINING.set(self.rate_remaining, source=self.name or "token")
+        if reset is not None:
+            self.rate_reset = float(reset)
+
+    def has_budget(self, reserve: int = 0) -> bool:
+        if self.rate_remaining is None or self.rate_remaining > reserve:
+            return True
+        # Budget is spent until the window resets
+        return bool(self.rate_reset and time.time() >= self.rate_reset)
 
     def _get_paginated(self, url: str, params: Dict=None) -> List[Dict]:
         params = params or {}
         items = []
         while url:
-            resp = self.session.get(url, params=params, timeout=30)
+            resp = self._get(url, params=params)
             if resp.status_code == 304:
                 break
             resp.raise_for_status()
@@ -46,30 +191,81 @@ class GitHubClient:
             links[rel] = url
         return links
 
+    def get_page_conditional(self, url: str, etag: Optional[str] = None) -> Tuple[int, Optional[str], object, Optional[str]]:
+        # Returns (status, etag, body, next_url); 304s don't count against the rate limit
+        headers = {"If-None-Match": etag} if etag else {}
+        resp = self._get(url, headers=headers)
+        if resp.status_code == 304:
+            return 304, etag, None, None
+        resp.raise_for_status()
+        next_url = self._parse_link_header(resp.headers['link']).get('next') if 'link' in resp.headers else None
+        return resp.status_code, resp.headers.get("ETag"), resp.json(), next_url
+
     # Discover repos the user can access
-    def list_all_repos(self) -> List[Dict]:
+    def user_repos_url(self) -> str:
         # Use affiliation to include owner, collaborator, org member
+        return f"{self.api_url}/user/repos?per_page=100&affiliation=owner,collaborator,organization_member"
+
+    def installation_repos_url(self) -> str:
+        return f"{self.api_url}/installation/repositories?per_page=100"
+
+    def list_all_repos(self) -> List[Dict]:
         params = {"per_page": 100, "affiliation": "owner,collaborator,organization_member"}
-        return self._get_paginated(f"{API_URL}/user/repos", params)
+        return self._get_paginated(f"{self.api_url}/user/repos", params)
 
     def list_runs(self, owner: str, repo: str, per_page: int = 50) -> Dict:
         params = {"per_page": per_page}
-        url = f"{API_URL}/repos/{owner}/{repo}/actions/runs"
-        resp = self.session.get(url, params=params, timeout=30)
+        url = f"{self.api_url}/repos/{owner}/{repo}/actions/runs"
+        resp = self._get(url, params=params)
         if resp.status_code == 304:
             return {"workflow_runs": []}
         resp.raise_for_status()
         return resp.json()
 
+    def runs_url(self, owner: str, repo: str, created: Optional[str] = None, per_page: int = 100) -> str:
+        # created uses GitHub's date qualifier syntax, e.g. '2024-01-01T00:00:00Z..2024-01-08T00:00:00Z'
+        q = {"per_page": per_page, **({"created": created} if created else {})}
+        return f"{self.api_url}/repos/{owner}/{repo}/actions/runs?{urlencode(q, safe=':.')}"
+
+    def run_url(self, owner: str, repo: str, run_id: int) -> str:
+        return f"{self.api_url}/repos/{owner}/{repo}/actions/runs/{run_id}"
+
+    def graphql_url(self) -> str:
+        # GitHub Enterprise serves REST under /api/v3 and GraphQL under /api/graphql
+        return self.api_url[:-len("/v3")] + "/graphql" if self.api_url.endswith("/api/v3") else f"{self.api_url}/graphql"
+
+    def graphql(self, query: str, variables: Dict) -> Dict:
+        resp = self._request("POST", self.graphql_url(), json={"query": query, "variables": variables})
+        resp.raise_for_status()
+        return resp.json()
+
+    def probe_repos(self, repos: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[str]]:
+        """Activity fingerprint per (owner, name), for up to 100 repos in one GraphQL query.
+
+        The fingerprint covers the last push to any branch and the newest check
+        suite on the default branch head, so it changes when runs are created
+        by a push or by schedule/dispatch on the default branch. Repos GitHub
+        returns no data for map to None (poll them normally).
+        """
+        decls = ", ".join(f"$o{i}: String!, $n{i}: String!" for i in range(len(repos)))
+        fields = " ".join(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ {_PROBE_FIELDS} }}" for i in range(len(repos)))
+        variables = {k: v for i, (owner, name) in enumerate(repos) for k, v in ((f"o{i}", owner), (f"n{i}", name))}
+        data = self.graphql(f"query({decls}) {{ {fields} }}", variables).get("data") or {}
+        out = {}
+        for i, key in enumerate(repos):
+            node = data.get(f"r{i}")
+            out[key] = hashlib.sha1(json.dumps(node, sort_keys=True).encode()).hexdigest() if node else None
+        return out
+
     def list_jobs_for_run(self, owner: str, repo: str, run_id: int) -> Dict:
-        url = f"{API_URL}/repos/{owner}/{repo}/actions/runs/{run_id}/jobs"
-        resp = self.session.get(url, params={"per_page": 100}, timeout=60)
+        url = f"{self.api_url}/repos/{owner}/{repo}/actions/runs/{run_id}/jobs"
+        resp = self._get(url, params={"per_page": 100}, timeout=60)
         resp.raise_for_status()
         return resp.json()
 
     def download_job_log(self, owner: str, repo: str, job_id: int) -> bytes:
-        url = f"{API_URL}/repos/{owner}/{repo}/actions/jobs/{job_id}/logs"
+        url = f"{self.api_url}/repos/{owner}/{repo}/actions/jobs/{job_id}/logs"
         # GitHub may redirect to signed URL; allow redirects
-        resp = self.session.get(url, allow_redirects=True, timeout=120)
+        resp = self._get(url, allow_redirects=True, timeout=120)
         resp.raise_for_status()
         return resp.content
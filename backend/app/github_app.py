@@ -0,0 +1,117 @@
+import threading
+import time
+import jwt
+from typing import Dict, List, Optional, Tuple
+from dateutil import parser as dtparser
+
+from .config import settings
+from .github import GitHubClient, API_URL, build_session, timeouts
+
+# Installation tokens live for 1 hour; mint a new one this long before expiry
+TOKEN_REFRESH_MARGIN_SECS = 300
+INSTALLATIONS_TTL_SECS = 600
+
+class GitHubAppAuth:
+    def __init__(self, app_id: str, private_key: str, api_url: str = API_URL):
+        self.app_id = app_id
+        self.private_key = private_key
+        self.api_url = (api_url or API_URL).rstrip("/")
+        self.session = build_session()
+        self._tokens: Dict[int, Tuple[str, float]] = {}  # installation_id -> (token, expires_at epoch)
+        self._lock = threading.Lock()
+
+    def app_jwt(self) -> str:
+        now = int(time.time())
+        # iat backdated for clock drift; GitHub caps exp at 10 minutes
+        payload = {"iat": now - 60, "exp": now + 540, "iss": str(self.app_id)}
+        return jwt.encode(payload, self.private_key, algorithm="RS256")
+
+    def _app_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.app_jwt()}"}
+
+    def list_installations(self) -> List[Dict]:
+        items = []
+        url = f"{self.api_url}/app/installations"
+        params = {"per_page": 100}
+        while url:
+            resp = self.session.get(url, params=params, headers=self._app_headers(), timeout=timeouts())
+            resp.raise_for_status()
+            items.extend(resp.json())
+            url = GitHubClient._parse_link_header(resp.headers["link"]).get("next") if "link" in resp.headers else None
+            params = None
+        return items
+
+    def installation_token(self, installation_id: int) -> str:
+        with self._lock:
+            cached = self._tokens.get(installation_id)
+            if cached and cached[1] - time.time() > TOKEN_REFRESH_MARGIN_SECS:
+                return cached[0]
+            url = f"{self.api_url}/app/installations/{installation_id}/access_tokens"
+            resp = self.session.post(url, headers=self._app_headers(), timeout=timeouts())
+            resp.raise_for_status()
+            data = resp.json()
+            expires_at = dtparser.parse(data["expires_at"]).timestamp()
+            self._tokens[installation_id] = (data["token"], expires_at)
+            return data["token"]
+
+class ClientPool:
+    """Hands out the GitHubClient (and so the rate budget) a repo's calls should use.
+
+    With a GitHub App configured there is one client per installation, keyed by
+    the installation's account login (org or user); otherwise every repo shares
+    the single PAT client.
+    """
+
+    def __init__(self, token: str = "", api_url: str = API_URL, app: Optional[GitHubAppAuth] = None):
+        self.api_url = api_url
+        self.app = app
+        self.default = None if app else GitHubClient(token, api_url=api_url)
+        self._by_owner: Dict[str, GitHubClient] = {}
+        self._installations: Dict[str, int] = {}
+        self._installations_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh_installations(self, force: bool = False):
+        if not force and time.time() - self._installations_at < INSTALLATIONS_TTL_SECS:
+            return
+        self._installations = {i["account"]["login"].lower(): i["id"] for i in self.app.list_installations()}
+        self._installations_at = time.time()
+
+    def _client_for_installation(self, login: str, installation_id: int) -> GitHubClient:
+        c = self._by_owner.get(login)
+        if c is None:
+            c = GitHubClient(api_url=self.api_url, token_provider=lambda: self.app.installation_token(installation_id), name=login)
+            self._by_owner[login] = c
+        return c
+
+    def for_owner(self, owner: str) -> GitHubClient:
+        if not self.app:
+            return self.default
+        login = (owner or "").lower()
+        with self._lock:
+            if login in self._by_owner:
+                return self._by_owner[login]
+            self._refresh_installations()
+            if login not in self._installations:
+                self._refresh_installations(force=True)
+            if login not in self._installations:
+                raise LookupError(f"GitHub App is not installed for {owner}")
+            return self._client_for_installation(login, self._installations[login])
+
+    def sources(self) -> List[Tuple[str, GitHubClient]]:
+        # (installation login, client) per installation in App mode, or ('', PAT client)
+        if not self.app:
+            return [("", self.default)]
+        with self._lock:
+            self._refresh_installations()
+            return [(login, self._client_for_installation(login, iid)) for login, iid in self._installations.items()]
+
+def build_client_pool() -> ClientPool:
+    if settings.github_app_id:
+        key = settings.github_app_private_key
+        if not key and settings.github_app_private_key_path:
+            with open(settings.github_app_private_key_path) as f:
+                key = f.read()
+        app = GitHubAppAuth(settings.github_app_id, key, api_url=settings.github_api_url)
+        return ClientPool(api_url=settings.github_api_url, app=app)
+    return ClientPool(settings.github_token, api_url=settings.github_api_url)
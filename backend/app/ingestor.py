@@ -1,195 +1,460 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import and_, func, or_, select, update
 from datetime import datetime, timedelta, timezone
 from dateutil import parser as dtparser
 from typing import List, Dict, Tuple
-import time
+import fnmatch, json, logging, time
+import requests
 
 from .config import settings
-from .database import SessionLocal
-from .github import GitHubClient
-from . import models
-from .logs import store_job_log_gz, cleanup_old_logs, read_job_log_text
-from .slack import post_slack_webhook, render_failure_blocks
+from .database import SessionLocal, dialect_insert
+from .github import CircuitOpenError, GitHubClient
+from .github_app import ClientPool, build_client_pool
+from . import analytics, flaky, models, procpool, regressions, reliability, leases, statusboard
+from .logs import store_job_log_gz, cleanup_old_logs, prepare_log, format_excerpt
+from .slack import post_slack_webhook, render_failure_blocks, render_regression_blocks
+from .profiling import profiled
+from .telemetry import POLL_TICK_SECONDS, REPOS_POLLED, RUNS_UPSERTED, ALERT_SEND_SECONDS, ALERTS_SUPPRESSED, OPEN_RUNS_REFRESHED
 
+log = logging.getLogger("ci.ingestor")
 scheduler = BackgroundScheduler()
-client = None
-shard_index = 0
+clients: ClientPool = None
+
+def init_client():
+    global clients
+    clients = build_client_pool()
+
+def client_for(repo: models.Repo) -> GitHubClient:
+    return clients.for_owner(repo.owner)
+
+def add_jobs(sched):
+    # Discovery runs as a regular job (first run immediately) so it never blocks startup
+    sched.add_job(discover_and_sync_repos, "interval", seconds=settings.discovery_interval_seconds, id="discovery", next_run_time=datetime.now())
+    sched.add_job(poll_tick, "interval", seconds=settings.poll_interval_seconds, id="poll")
+    if settings.open_runs_poll_seconds > 0:
+        sched.add_job(open_runs_tick, "interval", seconds=settings.open_runs_poll_seconds, id="open_runs")
+    sched.add_job(retention_tick, "cron", hour="*/6", id="retention")  # cleanup every 6 hours
+    if settings.analytics_enabled:
+        sched.add_job(analytics.export_tick, "interval", minutes=settings.analytics_export_minutes, id="analytics_export", next_run_time=datetime.now())
 
 def start_scheduler():
-    global client
-    client = GitHubClient(settings.github_token)
-    # Run repo discovery on startup
-    discover_and_sync_repos()
-    # Start jobs
-    scheduler.add_job(poll_tick, "interval", seconds=settings.poll_interval_seconds, id="poll")
-    scheduler.add_job(retention_tick, "cron", hour="*/6", id="retention")  # cleanup every 6 hours
+    # Embedded mode: ingestion on background threads of the API process (see app.worker for the standalone worker)
+    init_client()
+    add_jobs(scheduler)
     scheduler.start()
 
 def discover_and_sync_repos():
     db: Session = SessionLocal()
     try:
-        repos = client.list_all_repos()
-        existing = {r.full_name: r for r in db.query(models.Repo).all()}
-        for r in repos:
-            full = r.get("full_name")
-            owner = r.get("owner", {}).get("login")
-            name = r.get("name")
-            default_branch = r.get("default_branch")
-            if full in existing:
-                item = existing[full]
-                item.default_branch = default_branch
-                item.is_active = True
-            else:
-                db.add(models.Repo(
-                    owner=owner,
-                    name=name,
-                    full_name=full,
-                    default_branch=default_branch,
-                    is_active=True
-                ))
-        # Optionally deactivate repos no longer visible (keep them active for simplicity)
+        visible = []
+        for source, c in clients.sources():
+            url = c.installation_repos_url() if clients.app else c.user_repos_url()
+            visible.extend(_fetch_repo_pages(db, source, c, url, "repositories" if clients.app else None))
+        if not visible:
+            return  # nothing visible at all is more likely a token problem than an empty account
+        selected = {r["full_name"]: r for r in visible if repo_selected(r)}
+
+        rows = [{"owner": r["owner"], "name": r["name"], "full_name": full, "default_branch": r["default_branch"], "is_active": True}
+                for full, r in selected.items()]
+        for i in range(0, len(rows), 500):
+            stmt = dialect_insert(db, models.Repo).values(rows[i:i+500])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["full_name"],
+                set_={"owner": stmt.excluded.owner, "name": stmt.excluded.name,
+                      "default_branch": stmt.excluded.default_branch, "is_active": True},
+            ))
+        # Repos that disappeared (or no longer match the discovery filters) stop being polled
+        db.execute(update(models.Repo)
+                   .where(models.Repo.is_active == True, models.Repo.full_name.notin_(list(selected)))
+                   .values(is_active=False))
+        leases.discovered(db)
         db.commit()
     finally:
         db.close()
 
-def select_repos_for_tick(db: Session) -> List[models.Repo]:
-    # shard repos across ticks
-    global shard_index
-    repos = db.query(models.Repo).filter(models.Repo.is_active == True).order_by(models.Repo.id).all()
-    n = len(repos) or 1
-    shards = settings.poll_shards if settings.poll_shards > 0 else 1
-    per = max(1, n // shards)
-    start = (shard_index * per) % n
-    end = start + per
-    shard_index = (shard_index + 1) % shards
-    return repos[start:end]
+def _fetch_repo_pages(db: Session, source: str, c: GitHubClient, url: str, key: str = None) -> List[Dict]:
+    # Walk the repo list with If-None-Match per page; unchanged pages come from the cached copy
+    cached = {p.url: p for p in db.query(models.DiscoveryPage).filter(models.DiscoveryPage.source == source).all()}
+    out, seen = [], set()
+    while url and url not in seen:
+        seen.add(url)
+        page = cached.get(url)
+        status, etag, data, next_url = c.get_page_conditional(url, page.etag if page else None)
+        if status == 304 and page is not None:
+            items = json.loads(page.repos or "[]")
+            next_url = page.next_url
+        else:
+            items = [_repo_summary(r) for r in (data[key] if key else data)]
+            if page is None:
+                page = models.DiscoveryPage(source=source, url=url)
+                db.add(page)
+            page.etag, page.next_url, page.repos = etag, next_url, json.dumps(items)
+            page.fetched_at = datetime.utcnow()
+        out.extend(items)
+        url = next_url
+    for u, page in cached.items():
+        if u not in seen:
+            db.delete(page)  # the list got shorter
+    return out
+
+def _repo_summary(r: Dict) -> Dict:
+    return {
+        "full_name": r.get("full_name"),
+        "owner": (r.get("owner") or {}).get("login"),
+        "name": r.get("name"),
+        "default_branch": r.get("default_branch"),
+        "fork": bool(r.get("fork")),
+        "archived": bool(r.get("archived")),
+    }
 
+def repo_selected(r: Dict) -> bool:
+    if r.get("fork") and not settings.repo_include_forks:
+        return False
+    if r.get("archived") and not settings.repo_include_archived:
+        return False
+    if settings.repo_discovery_mode == "allowlist":
+        patterns = [p.strip().lower() for p in settings.repo_allowlist.split(",") if p.strip()]
+        return any(fnmatch.fnmatchcase(r["full_name"].lower(), p) for p in patterns)
+    return True
+
+@profiled("poll_tick")
 def poll_tick():
+    with POLL_TICK_SECONDS.time():
+        _poll_tick()
+
+def _poll_tick():
     db: Session = SessionLocal()
     try:
-        repos = select_repos_for_tick(db)
-        for r in repos:
+        leases.heartbeat(db)
+        leases.ensure_leases(db)
+        repo_ids = leases.acquire(db, settings.poll_batch_size)
+        probes = probe_activity(db, repo_ids) if settings.github_probe else {}
+        last_beat = time.monotonic()
+        for repo_id in repo_ids:
+            next_poll_at, activity = None, {}
             try:
-                ingest_repo_runs(db, r)
+                r = db.get(models.Repo, repo_id)
+                gh = client_for(r) if r is not None else None
+                if gh is not None and not gh.has_budget(settings.github_rate_reserve):
+                    # This installation's budget is spent; come back after its window resets
+                    next_poll_at = datetime.utcfromtimestamp(gh.rate_reset or time.time() + 60)
+                    REPOS_POLLED.inc(outcome="deferred")
+                elif r is not None:
+                    fp = probes.get(repo_id)
+                    if fp is None:
+                        ingest_repo_runs(db, r)  # probe off, failed, or no data for this repo
+                        REPOS_POLLED.inc(outcome="ok")
+                    else:
+                        full, activity = probe_decision(r, db.get(models.RepoLease, repo_id), fp, datetime.utcnow())
+                        if full:
+                            ingest_repo_runs(db, r)
+                            REPOS_POLLED.inc(outcome="ok")
+                        else:
+                            REPOS_POLLED.inc(outcome="unchanged")
                 db.commit()
+            except CircuitOpenError as e:
+                # GitHub is failing on this endpoint; retry the repo once the breaker lets calls through again
+                db.rollback()
+                activity = {}
+                next_poll_at = datetime.utcnow() + timedelta(seconds=e.retry_in)
+                REPOS_POLLED.inc(outcome="circuit_open")
+                log.warning("poll deferred for repo_id=%s: %s", repo_id, e)
+            except Exception:
+                db.rollback()
+                activity = {}
+                REPOS_POLLED.inc(outcome="error")
+                log.exception("poll failed for repo_id=%s", repo_id)
+            finally:
+                leases.release(db, repo_id, next_poll_at, **activity)
+            if time.monotonic() - last_beat > settings.lease_seconds / 3:
+                leases.heartbeat(db)
+                last_beat = time.monotonic()
+    finally:
+        db.close()
+
+def probe_decision(repo: models.Repo, lease: models.RepoLease, fp: str, now: datetime) -> Tuple[bool, Dict]:
+    """Whether to list a probed repo in full, and the activity to store with its lease.
+
+    An unchanged fingerprint is an idle tick (leases.release stretches the
+    interval), but the repo is listed anyway once its last full listing
+    (last_checked_at) is PROBE_FULL_POLL_MINUTES old.
+    """
+    idle = (lease.idle_polls or 0) + 1 if fp == lease.probe_state else 0
+    stale = repo.last_checked_at is None or now - repo.last_checked_at >= timedelta(minutes=settings.probe_full_poll_minutes)
+    return not idle or stale, {"idle_polls": idle, "probe_state": fp}
+
+def probe_activity(db: Session, repo_ids: List[int]) -> Dict[int, str]:
+    # One GraphQL query per installation and 100 repos; repos missing from the result are listed in full
+    by_client: Dict[int, Tuple[GitHubClient, List[models.Repo]]] = {}
+    for r in db.query(models.Repo).filter(models.Repo.id.in_(repo_ids)).all():
+        try:
+            gh = client_for(r)
+        except LookupError:
+            continue
+        by_client.setdefault(id(gh), (gh, []))[1].append(r)
+    out = {}
+    for gh, repos in by_client.values():
+        for i in range(0, len(repos), 100):
+            chunk = repos[i:i+100]
+            try:
+                fps = gh.probe_repos([(r.owner, r.name) for r in chunk])
             except Exception as e:
+                log.warning("activity probe failed for %d repos, polling them in full: %s", len(chunk), e)
+                continue
+            out.update({r.id: fps[(r.owner, r.name)] for r in chunk if fps.get((r.owner, r.name))})
+    return out
+
+def open_runs_tick():
+    # Fast lane: refresh queued / in-progress runs through the per-run endpoint; 304s cost no rate budget
+    db: Session = SessionLocal()
+    try:
+        for run_id, repo_id, etag in leases.claim_open_runs(db, settings.open_runs_batch_size):
+            outcome = "error"
+            try:
+                r = db.get(models.Repo, repo_id)
+                gh = client_for(r)
+                if not gh.has_budget(settings.github_rate_reserve):
+                    outcome = "deferred"  # already pushed one interval ahead by the claim
+                    continue
+                status, new_etag, body, _ = gh.get_page_conditional(gh.run_url(r.owner, r.name, run_id), etag)
+                if status == 304:
+                    outcome = "not_modified"
+                    continue
+                run = upsert_run(db, r, body)
+                if run.status == "completed":
+                    outcome = "completed"  # upsert_run took it out of the fast lane
+                else:
+                    db.execute(update(models.OpenRun).where(models.OpenRun.run_id == run_id).values(etag=new_etag))
+                    outcome = "updated"
+                db.commit()
+            except CircuitOpenError:
                 db.rollback()
-                # you may want to log this to a file
+                outcome = "circuit_open"  # retried on a later tick
+            except requests.HTTPError as e:
+                db.rollback()
+                if e.response is not None and e.response.status_code == 404:
+                    leases.close_run(db, run_id)  # deleted on GitHub
+                    db.commit()
+                    outcome = "gone"
+                else:
+                    log.warning("open run %s refresh failed: %s", run_id, e)
+            except Exception:
+                db.rollback()
+                log.exception("open run %s refresh failed", run_id)
+            finally:
+                OPEN_RUNS_REFRESHED.inc(outcome=outcome)
     finally:
         db.close()
 
 def parse_time(s: str):
     if not s:
         return None
-    return dtparser.parse(s)
+    dt = dtparser.parse(s)
+    # Columns are naive UTC; normalize so comparisons and inserts don't depend on the DB session timezone
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def _branch_filters() -> List[str]:
+    return [b.strip() for b in settings.branch_filters.split(",") if b.strip()] if settings.branch_filters else []
 
 def ingest_repo_runs(db: Session, repo: models.Repo):
-    data = client.list_runs(repo.owner, repo.name, per_page=settings.max_runs_per_repo)
+    data = client_for(repo).list_runs(repo.owner, repo.name, per_page=settings.max_runs_per_repo)
     runs = data.get("workflow_runs", [])
-    branch_filters = [b.strip() for b in settings.branch_filters.split(",") if b.strip()] if settings.branch_filters else []
+    branch_filters = _branch_filters()
 
-    for run in runs:
-        run_id = run.get("id")
+    # GitHub lists newest first (by creation); per-branch state advances in completion order, and
+    # overlapping runs on a branch can finish in either order, so completed runs sort by completion time
+    for run in sorted(runs, key=_apply_order):
         head_branch = run.get("head_branch")
         if branch_filters and head_branch not in branch_filters:
             continue
-
-        existing = db.get(models.WorkflowRun, run_id)
-        started_at = parse_time(run.get("run_started_at") or run.get("created_at"))
-        completed_at = parse_time(run.get("updated_at") if run.get("status") != "completed" else run.get("updated_at"))
-        # GitHub returns 'updated_at' even while in progress; we compute duration only if completed and have started_at
-        duration = None
-        if started_at and run.get("status") == "completed" and run.get("updated_at"):
-            end = parse_time(run.get("updated_at"))
-            duration = (end - started_at).total_seconds()
-
-        if not existing:
-            rec = models.WorkflowRun(
-                id=run_id,
-                repo_id=repo.id,
-                workflow_name=run.get("name"),
-                head_branch=head_branch,
-                head_sha=run.get("head_sha"),
-                event=run.get("event"),
-                status=run.get("status"),
-                conclusion=run.get("conclusion"),
-                started_at=started_at,
-                completed_at=parse_time(run.get("updated_at")) if run.get("status") == "completed" else None,
-                duration_secs=duration,
-                url=run.get("html_url"),
-                actor=(run.get("actor") or {}).get("login") if run.get("actor") else None,
-            )
-            db.add(rec)
-            db.flush()  # ensure inserted for FK
-            # If failed, fetch jobs + logs and alert
-            if rec.conclusion == "failure":
-                ingest_jobs_and_logs(db, repo, rec)
-                send_failure_alert(repo, rec, db)
-        else:
-            # Update mutable fields
-            existing.status = run.get("status")
-            existing.conclusion = run.get("conclusion")
-            existing.started_at = started_at
-            existing.completed_at = parse_time(run.get("updated_at")) if run.get("status") == "completed" else None
-            existing.duration_secs = duration
-            existing.url = run.get("html_url")
-            db.add(existing)
-            db.flush()
-            if existing.conclusion == "failure":
-                # ensure jobs/logs exist
-                has_jobs = db.query(models.WorkflowJob).filter(models.WorkflowJob.run_id == existing.id).first()
-                if not has_jobs:
-                    ingest_jobs_and_logs(db, repo, existing)
-                    send_failure_alert(repo, existing, db)
+        upsert_run(db, repo, run)
 
     repo.last_checked_at = datetime.utcnow()
     db.add(repo)
 
+def _apply_order(run: Dict) -> Tuple:
+    done = run.get("status") == "completed"
+    return parse_time(run.get("updated_at") if done else run.get("created_at")) or datetime.min, run.get("id") or 0
+
+def _run_row(repo: models.Repo, run: Dict) -> Dict:
+    started_at = parse_time(run.get("run_started_at") or run.get("created_at"))
+    # GitHub returns 'updated_at' even while in progress; we compute duration only if completed and have started_at
+    completed_at = parse_time(run.get("updated_at")) if run.get("status") == "completed" else None
+    duration = None
+    if started_at and completed_at:
+        duration = (completed_at - started_at).total_seconds()
+    return {
+        "id": run.get("id"),
+        "repo_id": repo.id,
+        "workflow_name": run.get("name"),
+        "head_branch": run.get("head_branch"),
+        "head_sha": run.get("head_sha"),
+        "event": run.get("event"),
+        "status": run.get("status"),
+        "conclusion": run.get("conclusion"),
+        "started_at": started_at,
+        "completed_at": completed_at,
+        "duration_secs": duration,
+        "url": run.get("html_url"),
+        "actor": (run.get("actor") or {}).get("login") if run.get("actor") else None,
+        "run_attempt": run.get("run_attempt") or 1,
+    }
+
+_RUN_UPDATE_FIELDS = ("status", "conclusion", "started_at", "completed_at", "duration_secs", "url", "run_attempt")
+
+def upsert_run(db: Session, repo: models.Repo, run: Dict) -> models.WorkflowRun:
+    row = _run_row(repo, run)
+    # Row lock: the regular poll and the open-runs fast lane may see the same transition concurrently
+    existing = db.get(models.WorkflowRun, row["id"], with_for_update=True)
+
+    if not existing:
+        rec = models.WorkflowRun(**row)
+        db.add(rec)
+        db.flush()  # ensure inserted for FK
+        RUNS_UPSERTED.inc(op="insert")
+        statusboard.record(db, rec)
+        if rec.status == "completed":
+            on_attempt_completed(db, repo, rec)
+        elif settings.open_runs_poll_seconds > 0:
+            leases.open_run(db, rec)
+        return rec
+
+    # A re-run reuses the run id with a new run_attempt; its completion is a new transition
+    prev_status = existing.status
+    was_completed = prev_status == "completed" and (existing.run_attempt or 1) == row["run_attempt"]
+    changed = any(getattr(existing, k) != row[k] for k in _RUN_UPDATE_FIELDS)
+    # Update mutable fields
+    for k in _RUN_UPDATE_FIELDS:
+        setattr(existing, k, row[k])
+    db.add(existing)
+    db.flush()
+    RUNS_UPSERTED.inc(op="update")
+    if changed:
+        statusboard.record(db, existing)
+    if existing.status == "completed" and not was_completed:
+        leases.close_run(db, existing.id)
+        on_attempt_completed(db, repo, existing)
+    elif existing.status != "completed" and prev_status == "completed" and settings.open_runs_poll_seconds > 0:
+        leases.open_run(db, existing)  # re-run started
+    elif existing.conclusion == "failure" and not has_attempt_jobs(db, existing):
+        # ensure jobs/logs exist (an earlier fetch failed)
+        ingest_jobs_and_logs(db, repo, existing)
+        send_failure_alert(repo, existing, db)
+    return existing
+
+def has_attempt_jobs(db: Session, run: models.WorkflowRun) -> bool:
+    return db.query(models.WorkflowJob.id).filter(
+        models.WorkflowJob.run_id == run.id,
+        func.coalesce(models.WorkflowJob.run_attempt, 1) == (run.run_attempt or 1),
+    ).first() is not None
+
+def on_attempt_completed(db: Session, repo: models.Repo, run: models.WorkflowRun):
+    # If failed, fetch jobs + logs first (flaky stats are kept per job), then aggregates, then alert
+    failed = run.conclusion == "failure"
+    if failed and not has_attempt_jobs(db, run):
+        ingest_jobs_and_logs(db, repo, run)
+    on_run_completed(db, repo, run)
+    if failed:
+        send_failure_alert(repo, run, db)
+
+def bulk_upsert_runs(db: Session, repo: models.Repo, runs: List[Dict]) -> int:
+    # History path (backfill): one INSERT .. ON CONFLICT per chunk, no alerts, jobs, reliability or flaky updates.
+    # Stored rows are only touched once live ingestion has applied their current attempt's completion: moving a
+    # row to completed (or to a new attempt) here would make upsert_run skip that completion's hooks
+    branch_filters = _branch_filters()
+    now = datetime.utcnow()
+    rows = [{**_run_row(repo, r), "updated_at": now} for r in runs if not branch_filters or r.get("head_branch") in branch_filters]
+    for i in range(0, len(rows), 500):
+        stmt = dialect_insert(db, models.WorkflowRun).values(rows[i:i+500])
+        r = models.WorkflowRun
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["id"],
+            # ON CONFLICT skips Column.onupdate; bump updated_at here, and only for rows that actually change
+            set_={**{k: getattr(stmt.excluded, k) for k in _RUN_UPDATE_FIELDS}, "updated_at": stmt.excluded.updated_at},
+            where=and_(r.status == "completed", func.coalesce(r.run_attempt, 1) == stmt.excluded.run_attempt,
+                       or_(*(getattr(r, k).is_distinct_from(getattr(stmt.excluded, k)) for k in _RUN_UPDATE_FIELDS))),
+        ))
+        statusboard.upsert(db, rows[i:i+500])  # only moves keys whose stored run is older
+    RUNS_UPSERTED.inc(len(rows), op="bulk")
+    return len(rows)
+
+def bulk_upsert_jobs(db: Session, run_id: int, jobs: List[Dict]) -> int:
+    rows = []
+    for j in jobs:
+        started_at, completed_at = parse_time(j.get("started_at")), parse_time(j.get("completed_at"))
+        rows.append({"id": j.get("id"), "run_id": run_id, "name": j.get("name"), "status": j.get("status"),
+                     "conclusion": j.get("conclusion"), "started_at": started_at, "completed_at": completed_at,
+                     "duration_secs": (completed_at - started_at).total_seconds() if started_at and completed_at else None,
+                     "run_attempt": j.get("run_attempt")})
+    if rows:
+        stmt = dialect_insert(db, models.WorkflowJob).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={k: getattr(stmt.excluded, k) for k in ("status", "conclusion", "started_at", "completed_at", "duration_secs", "run_attempt")},
+        ))
+    return len(rows)
+
+def bulk_upsert_steps(db: Session, jobs: List[Dict]) -> int:
+    # Keyed by (job_id, number): fetching a job's steps again updates them in place
+    rows = [{"job_id": j.get("id"), "name": s.get("name"), "status": s.get("status"), "conclusion": s.get("conclusion"),
+             "number": s.get("number"), "started_at": parse_time(s.get("started_at")), "completed_at": parse_time(s.get("completed_at"))}
+            for j in jobs for s in (j.get("steps") or []) if s.get("number") is not None]
+    for i in range(0, len(rows), 500):
+        stmt = dialect_insert(db, models.WorkflowStep).values(rows[i:i+500])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["job_id", "number"],
+            set_={k: getattr(stmt.excluded, k) for k in ("name", "status", "conclusion", "started_at", "completed_at")},
+        ))
+    return len(rows)
+
+def on_run_completed(db: Session, repo: models.Repo, run: models.WorkflowRun):
+    # Incremental per-run aggregates; called once per attempt as it transitions to completed
+    reliability.advance(db, run)
+    flaky.record(db, run)
+    reg = regressions.observe(db, run)
+    if reg is not None and regressions.alert_due(reg):
+        send_regression_alert(repo, run, reg)
+
 def ingest_jobs_and_logs(db: Session, repo: models.Repo, run: models.WorkflowRun):
-    jobs = client.list_jobs_for_run(repo.owner, repo.name, run.id).get("jobs", [])
+    gh = client_for(repo)
+    jobs = gh.list_jobs_for_run(repo.owner, repo.name, run.id).get("jobs", [])
+    bulk_upsert_jobs(db, run.id, jobs)
+    bulk_upsert_steps(db, jobs)
+
+    # Logs only for failed jobs (respect size cap); each log is compressed and scanned in the
+    # process pool while the next one downloads
+    pending = []
     for j in jobs:
+        if j.get("conclusion") != "failure":
+            continue
+        try:
+            data = gh.download_job_log(repo.owner, repo.name, j.get("id"))
+        except Exception:
+            # One missing log must not fail the run (or the repo's poll)
+            log.warning("log download failed for job %s in %s", j.get("id"), repo.full_name, exc_info=True)
+            continue
+        keep = len(data) <= settings.max_log_bytes_per_job
+        pending.append((j, data, keep, procpool.submit(prepare_log, data, keep, settings.excerpt_tail_lines, settings.excerpt_context_lines)))
+
+    for j, data, keep, prepared in pending:
         job_id = j.get("id")
-        started_at = parse_time(j.get("started_at"))
-        completed_at = parse_time(j.get("completed_at"))
-        duration = (completed_at - started_at).total_seconds() if started_at and completed_at else None
-        job_rec = models.WorkflowJob(
-            id=job_id,
-            run_id=run.id,
-            name=j.get("name"),
-            status=j.get("status"),
-            conclusion=j.get("conclusion"),
-            started_at=started_at,
-            completed_at=completed_at,
-            duration_secs=duration,
-        )
-        db.merge(job_rec)  # merge to upsert
-        db.flush()
-
-        # Steps
-        for s in j.get("steps", []) or []:
-            step = models.WorkflowStep(
-                job_id=job_id,
-                name=s.get("name"),
-                status=s.get("status"),
-                conclusion=s.get("conclusion"),
-                number=s.get("number"),
-                started_at=parse_time(s.get("started_at")),
-                completed_at=parse_time(s.get("completed_at")),
-            )
-            db.add(step)
-
-        # Logs only for failed jobs (respect size cap)
-        if j.get("conclusion") == "failure":
-            try:
-                data = client.download_job_log(repo.owner, repo.name, job_id)
-                if len(data) <= settings.max_log_bytes_per_job:
-                    path = store_job_log_gz(repo.owner, repo.name, run.id, job_id, data)
-                    log = models.RunLog(job_id=job_id, storage="disk", path=path, size_bytes=len(data))
-                    db.merge(log)
-            except Exception:
-                pass
+        try:
+            gz, excerpt = prepared.result()
+            path = store_job_log_gz(repo.owner, repo.name, run.id, job_id, data, compressed=gz) if keep else None
+        except Exception:
+            log.warning("log processing failed for job %s in %s", job_id, repo.full_name, exc_info=True)
+            continue
+        if path:
+            run_log = models.RunLog(job_id=job_id, storage="disk", path=path, size_bytes=len(data))
+            db.merge(run_log)
+        step = next((s for s in j.get("steps") or [] if s.get("conclusion") == "failure"), {})
+        row = {"job_id": job_id, "step_name": step.get("name"), "step_number": step.get("number"), **excerpt,
+               "created_at": datetime.utcnow()}
+        stmt = dialect_insert(db, models.FailureExcerpt).values(row)
+        db.execute(stmt.on_conflict_do_update(index_elements=["job_id"], set_={k: getattr(stmt.excluded, k) for k in row if k != "job_id"}))
 
 def summarize_failed_jobs(db: Session, run_id: int) -> str:
     # Return a small human-readable summary for alert
@@ -200,29 +465,54 @@ def summarize_failed_jobs(db: Session, run_id: int) -> str:
     parts = [f"• {j.name} (id {j.id})" for j in failed]
     return "\n".join(parts[:10])
 
-def get_log_snippet(db: Session, run_id: int, lines: int = 200) -> str:
-    jobs = db.query(models.WorkflowJob).filter(models.WorkflowJob.run_id == run_id).all()
-    for j in jobs:
-        if j.conclusion == "failure" and j.log and j.log.path:
-            txt = read_job_log_text(j.log.path, max_bytes=1_000_000)
-            if not txt:
-                continue
-            # get last N lines
-            arr = txt.splitlines()
-            return "\n".join(arr[-lines:])
-    return ""
+def get_log_snippet(db: Session, run: models.WorkflowRun) -> str:
+    # Precomputed at log download; no log file is read on the alert path
+    e = models.FailureExcerpt
+    row = (db.query(e.step_name, e.error_context, e.tail)
+           .join(models.WorkflowJob, models.WorkflowJob.id == e.job_id)
+           .filter(models.WorkflowJob.run_id == run.id,
+                   func.coalesce(models.WorkflowJob.run_attempt, 1) == (run.run_attempt or 1),
+                   models.WorkflowJob.conclusion == "failure")
+           .order_by(models.WorkflowJob.id).first())
+    return format_excerpt(*row) if row else ""
 
 def send_failure_alert(repo: models.Repo, run: models.WorkflowRun, db: Session):
     if not settings.alerts_enabled or not settings.slack_webhook_url:
         return
+    if flaky.is_known_flaky(db, run):
+        ALERTS_SUPPRESSED.inc(reason="flaky")
+        log.info("alert for run %s suppressed: failing jobs are known flaky", run.id)
+        return
     mention = settings.alert_channel_mentions.strip()
     prefix = settings.alert_title_prefix if hasattr(settings, 'alert_title_prefix') else "[CI Failure]"
-    # Duration to friendly
-    dur = f"{int((run.duration_secs or 0)//60)}m {(int(run.duration_secs or 0)%60)}s"
-    snippet = get_log_snippet(db, run.id, lines=int(getattr(settings, 'alert_log_snippet_lines', 200)))
-    blocks = render_failure_blocks(prefix, mention, repo.full_name, run.head_branch or "-", run.workflow_name or "-", run.conclusion or "-", dur, run.url or "-", snippet if getattr(settings, 'alert_include_log_snippet', True) else "")
-    text = f"{prefix} {repo.full_name} {run.workflow_name} failed"
-    post_slack_webhook(settings.slack_webhook_url, text, blocks=blocks)
+    snippet = get_log_snippet(db, run)
+    blocks = render_failure_blocks(prefix, mention, repo.full_name, run.head_branch or "-", run.workflow_name or "-", run.conclusion or "-", _friendly_secs(run.duration_secs), run.url or "-", snippet if getattr(settings, 'alert_include_log_snippet', True) else "")
+    _post_alert(run, f"{prefix} {repo.full_name} {run.workflow_name} failed", blocks)
+
+def send_regression_alert(repo: models.Repo, run: models.WorkflowRun, reg: models.DurationRegression):
+    if not settings.alerts_enabled or not settings.slack_webhook_url:
+        return
+    prefix = "[CI Slowdown]"
+    blocks = render_regression_blocks(prefix, settings.alert_channel_mentions.strip(), repo.full_name, run.head_branch or "-", run.workflow_name or "-",
+                                      reg.slow_streak, _friendly_secs(reg.duration_secs), _friendly_secs(reg.baseline_secs), run.url or "-")
+    _post_alert(run, f"{prefix} {repo.full_name} {run.workflow_name} is running slower", blocks)
+
+def _friendly_secs(secs) -> str:
+    return f"{int((secs or 0)//60)}m {(int(secs or 0)%60)}s"
+
+def _post_alert(run: models.WorkflowRun, text: str, blocks: list):
+    start, result = time.perf_counter(), "error"
+    try:
+        ok, err = post_slack_webhook(settings.slack_webhook_url, text, blocks=blocks)
+        result = "ok" if ok else "rejected"
+    except Exception:
+        # Like a missing log, a lost alert must not roll back the run it's about (or the repo's poll)
+        log.warning("slack alert failed for run %s", run.id, exc_info=True)
+        return
+    finally:
+        ALERT_SEND_SECONDS.observe(time.perf_counter() - start, result=result)
+    if not ok:
+        log.warning("slack alert failed for run %s: %s", run.id, err)
 
 def retention_tick():
     cleanup_old_logs()
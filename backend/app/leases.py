@@ -0,0 +1,110 @@
+import os, socket
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update, or_
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from .config import settings
+from .database import dialect_insert
+from . import models
+
+WORKER_ID = settings.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+def _touch_worker(db: Session, worker_id: str, now: datetime, **fields):
+    stmt = dialect_insert(db, models.IngestWorker).values(id=worker_id, hostname=socket.gethostname(), pid=os.getpid(), started_at=now, heartbeat_at=now, **fields)
+    db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={"heartbeat_at": now, **fields}))
+
+def heartbeat(db: Session, worker_id: str = WORKER_ID):
+    now = datetime.utcnow()
+    _touch_worker(db, worker_id, now)
+    # Keep leases we still hold alive while a long tick is running
+    db.execute(update(models.RepoLease)
+               .where(models.RepoLease.worker_id == worker_id, models.RepoLease.leased_until != None)
+               .values(leased_until=now + timedelta(seconds=settings.lease_seconds)))
+    db.commit()
+
+def discovered(db: Session, worker_id: str = WORKER_ID):
+    # Stored with the worker row: /ready runs in the API process, which (split deployment) never discovers
+    now = datetime.utcnow()
+    _touch_worker(db, worker_id, now, last_discovery_at=now)
+
+def ensure_leases(db: Session):
+    # Every active repo gets a queue row; concurrent workers may race here, so conflicts are ignored
+    missing = select(models.Repo.id).where(
+        models.Repo.is_active == True,
+        ~select(models.RepoLease.repo_id).where(models.RepoLease.repo_id == models.Repo.id).exists(),
+    )
+    stmt = dialect_insert(db, models.RepoLease).from_select(["repo_id"], missing)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["repo_id"]))
+    db.commit()
+
+def acquire(db: Session, limit: int, worker_id: str = WORKER_ID) -> List[int]:
+    """Lease up to `limit` due repos for this worker.
+
+    Rows locked by another worker's in-flight acquire are skipped rather than
+    waited on, and a lease whose holder stopped heartbeating expires after
+    `lease_seconds` so another worker picks the repo up.
+    """
+    now = datetime.utcnow()
+    leases = (db.query(models.RepoLease)
+              .join(models.Repo, models.Repo.id == models.RepoLease.repo_id)
+              .filter(models.Repo.is_active == True)
+              .filter(or_(models.RepoLease.next_poll_at == None, models.RepoLease.next_poll_at <= now))
+              .filter(or_(models.RepoLease.leased_until == None, models.RepoLease.leased_until < now))
+              .order_by(models.RepoLease.next_poll_at.asc().nullsfirst())
+              .limit(limit)
+              .with_for_update(skip_locked=True, of=models.RepoLease)
+              .all())
+    until = now + timedelta(seconds=settings.lease_seconds)
+    for l in leases:
+        l.worker_id = worker_id
+        l.leased_until = until
+    repo_ids = [l.repo_id for l in leases]
+    db.commit()
+    return repo_ids
+
+def release(db: Session, repo_id: int, next_poll_at: Optional[datetime] = None, worker_id: str = WORKER_ID, **activity):
+    # activity: idle_polls / probe_state from the change probe, stored with the lease
+    now = datetime.utcnow()
+    if next_poll_at is None:
+        # Same cadence as the old round-robin shards: each repo once every poll_shards ticks,
+        # doubled per consecutive idle tick up to poll_idle_max_factor
+        shards = settings.poll_shards if settings.poll_shards > 0 else 1
+        factor = min(2 ** min(activity.get("idle_polls") or 0, 16), max(1, settings.poll_idle_max_factor))
+        next_poll_at = now + timedelta(seconds=settings.poll_interval_seconds * shards * factor)
+    db.execute(update(models.RepoLease)
+               .where(models.RepoLease.repo_id == repo_id, models.RepoLease.worker_id == worker_id)
+               .values(worker_id=None, leased_until=None, next_poll_at=next_poll_at, last_polled_at=now, **activity))
+    db.commit()
+
+# ---- Open runs (fast lane) ----
+
+def open_run(db: Session, run: models.WorkflowRun):
+    stmt = dialect_insert(db, models.OpenRun).values(run_id=run.id, repo_id=run.repo_id, opened_at=datetime.utcnow())
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["run_id"]))
+
+def close_run(db: Session, run_id: int):
+    db.execute(delete(models.OpenRun).where(models.OpenRun.run_id == run_id))
+
+def claim_open_runs(db: Session, limit: int) -> List[Tuple[int, int, Optional[str]]]:
+    """Claim up to `limit` due open runs as (run_id, repo_id, etag).
+
+    Claiming pushes next_check_at one interval ahead, so no lease columns are
+    needed: a worker that dies mid-refresh just leaves the rows due again.
+    Runs open for longer than open_runs_max_age_hours are dropped first.
+    """
+    now = datetime.utcnow()
+    db.execute(delete(models.OpenRun).where(models.OpenRun.opened_at < now - timedelta(hours=settings.open_runs_max_age_hours)))
+    rows = (db.query(models.OpenRun)
+            .join(models.Repo, models.Repo.id == models.OpenRun.repo_id)
+            .filter(models.Repo.is_active == True)
+            .filter(or_(models.OpenRun.next_check_at == None, models.OpenRun.next_check_at <= now))
+            .order_by(models.OpenRun.next_check_at.asc().nullsfirst())
+            .limit(limit)
+            .with_for_update(skip_locked=True, of=models.OpenRun)
+            .all())
+    out = [(r.run_id, r.repo_id, r.etag) for r in rows]
+    for r in rows:
+        r.next_check_at = now + timedelta(seconds=settings.open_runs_poll_seconds)
+    db.commit()
+    return out
@@ -1,17 +1,47 @@
-import os, gzip, io
+import os, gzip, io, re
 from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 from .config import settings
+from . import procpool
+from .telemetry import LOG_BYTES_STORED, LOGS_STORED
 
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
-def store_job_log_gz(owner: str, repo: str, run_id: int, job_id: int, content: bytes) -> str:
+def compress_log(content: bytes) -> bytes:
+    # Runs in the worker's process pool; must stay a picklable module-level function
+    return gzip.compress(content, compresslevel=6)
+
+_TIMESTAMP = re.compile(r"^\ufeff?\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z ")
+_MAX_LINE = 400
+
+def extract_excerpt(content: bytes, tail_lines: int, context_lines: int) -> Dict:
+    # Last lines plus the lines around the first ##[error] marker, without GitHub's per-line timestamps
+    lines = [_TIMESTAMP.sub("", l)[:_MAX_LINE] for l in content.decode("utf-8", errors="replace").splitlines()]
+    first = next((i for i, l in enumerate(lines) if "##[error]" in l), None)
+    context = lines[max(0, first - context_lines):first + context_lines + 1] if first is not None else []
+    return {"error_line": first + 1 if first is not None else None, "error_context": "\n".join(context),
+            "tail": "\n".join(lines[-tail_lines:]), "total_lines": len(lines), "log_bytes": len(content)}
+
+def prepare_log(content: bytes, compress: bool, tail_lines: int, context_lines: int) -> Tuple[Optional[bytes], Dict]:
+    # Runs in the worker's process pool: the log crosses the process boundary once for both jobs
+    return (compress_log(content) if compress else None), extract_excerpt(content, tail_lines, context_lines)
+
+def format_excerpt(step_name: Optional[str], error_context: Optional[str], tail: Optional[str]) -> str:
+    body = error_context or tail or ""
+    return f"Step: {step_name}\n{body}" if step_name else body
+
+def store_job_log_gz(owner: str, repo: str, run_id: int, job_id: int, content: bytes, compressed: Optional[bytes] = None) -> str:
     base = settings.log_dir
     folder = os.path.join(base, f"{owner}_{repo}", str(run_id))
     ensure_dir(folder)
     path = os.path.join(folder, f"{job_id}.log.gz")
-    with gzip.open(path, 'wb') as f:
-        f.write(content)
+    data = compressed if compressed is not None else procpool.run(compress_log, content)
+    with open(path, 'wb') as f:
+        f.write(data)
+    LOGS_STORED.inc()
+    LOG_BYTES_STORED.inc(len(content), kind="raw")
+    LOG_BYTES_STORED.inc(len(data), kind="compressed")
     return path
 
 def read_job_log_text(path: str, max_bytes: int = 2_000_000) -> str:
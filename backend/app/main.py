@@ -3,19 +3,27 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-import os
+from sqlalchemy import func, select, text
+import asyncio, logging, os, threading, time
 
 from .config import settings
-from .database import init_db, get_db, Session
+from .database import init_db, get_db, Session, AsyncSessionLocal
 from . import models
 from .routes import router as api_router
 from .ingestor import start_scheduler
+from . import telemetry
+from .admin import router as admin_router
+from .profiling import TimingMiddleware, TimedJSONResponse
 
 app = FastAPI(
     title="CI/CD Pipeline Health Dashboard API",
     version="1.0.0",
+    default_response_class=TimedJSONResponse,
 )
 
+app.add_middleware(TimingMiddleware)
+app.add_middleware(telemetry.MetricsMiddleware)
+
 # CORS for local frontend
 app.add_middleware(
     CORSMiddleware,
@@ -25,15 +33,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+log = logging.getLogger("ci.api")
+
+# Set by the bootstrap thread; /ready reports it
+_boot = {"db_ready": False, "db_error": None, "started_at": time.monotonic()}
+
+def _bootstrap():
+    # Schema setup retries until the DB is reachable, so a DB (or GitHub) outage delays readiness, not startup
+    delay = 1.0
+    while True:
+        try:
+            init_db()
+            break
+        except Exception as e:
+            _boot["db_error"] = str(e).splitlines()[0][:300]
+            log.warning("database not ready, retrying in %.0fs: %s", delay, _boot["db_error"])
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+    _boot["db_ready"], _boot["db_error"] = True, None
+    log.info("database ready after %.2fs", time.monotonic() - _boot["started_at"])
+    # Ingestion runs in the standalone worker (python -m app.worker); the API only reads
+    if settings.embedded_ingestor:
+        start_scheduler()  # discovery and polling run as scheduler jobs, never on this thread
+
 @app.on_event("startup")
 def on_startup():
-    init_db()
-    # Start the polling scheduler
-    start_scheduler()
+    # Returns at once; requests are served while the bootstrap thread sets up the schema
+    threading.Thread(target=_bootstrap, name="bootstrap", daemon=True).start()
 
 # Mount API routes under /api
 app.include_router(api_router, prefix="/api")
+app.include_router(admin_router, prefix="/admin", include_in_schema=False)
 
 @app.get("/health")
 def health():
+    # Liveness only: touches neither the DB nor GitHub
     return {"status": "ok", "time": datetime.now().isoformat()}
+
+async def _ingestion_status() -> dict:
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.lease_seconds * 2)
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+        workers = (await db.execute(select(func.count()).select_from(models.IngestWorker)
+                                    .where(models.IngestWorker.heartbeat_at >= cutoff))).scalar()
+        last_poll = (await db.execute(select(func.max(models.RepoLease.last_polled_at)))).scalar()
+        last_discovery = (await db.execute(select(func.max(models.IngestWorker.last_discovery_at)))).scalar()
+        repos = (await db.execute(select(func.count()).select_from(models.Repo).where(models.Repo.is_active == True))).scalar()
+    return {"ready": bool(workers) and last_poll is not None, "workers": workers, "activeRepos": repos,
+            "lastPollAt": last_poll.isoformat() if last_poll else None,
+            "lastDiscoveryAt": last_discovery.isoformat() if last_discovery else None}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the schema is set up and the DB answers, else 503.
+
+    Ingestion (a live worker heartbeat and at least one completed poll) is
+    reported but doesn't gate readiness, so a GitHub outage or a stopped
+    worker never takes the API out of rotation.
+    """
+    db = {"ok": _boot["db_ready"], "error": _boot["db_error"]}
+    ingestion = None
+    if db["ok"]:
+        try:
+            ingestion = await asyncio.wait_for(_ingestion_status(), timeout=2)
+        except Exception as e:
+            db = {"ok": False, "error": (str(e).splitlines() or [type(e).__name__])[0][:300]}
+    body = {"ready": db["ok"], "db": db, "ingestion": ingestion}
+    return TimedJSONResponse(body, status_code=200 if db["ok"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=telemetry.render(), media_type=telemetry.CONTENT_TYPE)
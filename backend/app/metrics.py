@@ -1,73 +1,199 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, case
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
-from . import models
+from fastapi.concurrency import run_in_threadpool
+from . import analytics, models
+from .profiling import profiled
 
-def get_overview(db: Session, repo_full: Optional[str], branch: Optional[str], window_days: int = 7) -> Dict[str, Any]:
-    cutoff = datetime.utcnow() - timedelta(days=window_days)
-    q = db.query(models.WorkflowRun).join(models.Repo).filter(models.WorkflowRun.started_at != None)
-    q = q.filter(models.WorkflowRun.started_at >= cutoff)
+def _window_filter(stmt, repo_full: Optional[str], branch: Optional[str], since: datetime):
+    stmt = stmt.where(models.WorkflowRun.started_at != None, models.WorkflowRun.started_at >= since)
     if repo_full:
-        q = q.filter(models.Repo.full_name == repo_full)
+        stmt = stmt.where(models.Repo.full_name == repo_full)
     if branch:
-        q = q.filter(models.WorkflowRun.head_branch == branch)
+        stmt = stmt.where(models.WorkflowRun.head_branch == branch)
+    return stmt
 
-    runs = q.all()
-    total = len(runs)
-    successes = len([r for r in runs if r.conclusion == 'success'])
-    failures = len([r for r in runs if r.conclusion == 'failure'])
-    durations = [r.duration_secs for r in runs if (r.duration_secs or 0) > 0]
+# Aggregates are computed in SQL so the event loop never iterates over run rows
+_SUCCESS = func.sum(case((models.WorkflowRun.conclusion == 'success', 1), else_=0))
+_FAILURE = func.sum(case((models.WorkflowRun.conclusion == 'failure', 1), else_=0))
+# Sum + count rather than avg so the Postgres and Parquet halves of a long window can be merged
+_DURATION_SUM = func.sum(case((models.WorkflowRun.duration_secs > 0, models.WorkflowRun.duration_secs)))
+_DURATION_N = func.count(case((models.WorkflowRun.duration_secs > 0, 1)))
 
-    avg_duration = sum(durations)/len(durations) if durations else 0.0
+@profiled("get_overview")
+async def get_overview(db: AsyncSession, repo_full: Optional[str], branch: Optional[str], window_days: int = 7) -> Dict[str, Any]:
+    since = datetime.utcnow() - timedelta(days=window_days)
+    # Long windows: exported days come from Parquet, Postgres only covers the days after the last export
+    split = await analytics.split_point(db, window_days)
+    hot_since = max(since, split) if split else since
+
+    base = select(func.count(models.WorkflowRun.id), _SUCCESS, _FAILURE, _DURATION_SUM, _DURATION_N).join(models.Repo)
+    total, successes, failures, dur_sum, dur_n = (await db.execute(_window_filter(base, repo_full, branch, hot_since))).one()
+    total, successes, failures, dur_sum, dur_n = int(total or 0), int(successes or 0), int(failures or 0), float(dur_sum or 0.0), int(dur_n or 0)
 
     # Last build (by started_at)
-    last = None
-    if runs:
-        last = sorted(runs, key=lambda r: r.started_at or r.completed_at or datetime.min, reverse=True)[0]
+    last_q = select(models.WorkflowRun.status, models.WorkflowRun.conclusion, models.WorkflowRun.started_at,
+                    models.WorkflowRun.url, models.Repo.full_name, models.WorkflowRun.head_branch).join(models.Repo)
+    last_q = _window_filter(last_q, repo_full, branch, hot_since).order_by(models.WorkflowRun.started_at.desc()).limit(1)
+    last = (await db.execute(last_q)).first()
+
+    if split and split > since:
+        cold = await run_in_threadpool(analytics.overview, repo_full, branch, since, split, last is None)
+        if cold:
+            total, successes, failures = total + cold["total"], successes + cold["successes"], failures + cold["failures"]
+            dur_sum, dur_n = dur_sum + cold["dur_sum"], dur_n + cold["dur_n"]
+            last = last or cold["last"]
 
+    status, conclusion, started_at, url, repo, head_branch = last or (None,) * 6
     return {
         "total": total,
         "successRate": round((successes/total)*100, 2) if total else 0.0,
         "failureRate": round((failures/total)*100, 2) if total else 0.0,
-        "avgDurationSecs": avg_duration,
+        "avgDurationSecs": dur_sum / dur_n if dur_n else 0.0,
         "lastBuild": {
-            "status": last.status if last else None,
-            "conclusion": last.conclusion if last else None,
-            "startedAt": (last.started_at.isoformat() if last and last.started_at else None),
-            "url": last.url if last else None,
-            "repo": (last.repo.full_name if last and last.repo else None),
-            "branch": (last.head_branch if last else None),
+            "status": status,
+            "conclusion": conclusion,
+            "startedAt": started_at.isoformat() if started_at else None,
+            "url": url,
+            "repo": repo,
+            "branch": head_branch,
         }
     }
 
-def timeseries_counts(db: Session, repo_full: Optional[str], branch: Optional[str], window_days: int = 7):
-    cutoff = datetime.utcnow() - timedelta(days=window_days)
-    q = db.query(models.WorkflowRun).join(models.Repo).filter(models.WorkflowRun.started_at != None)
-    q = q.filter(models.WorkflowRun.started_at >= cutoff)
-    if repo_full:
-        q = q.filter(models.Repo.full_name == repo_full)
-    if branch:
-        q = q.filter(models.WorkflowRun.head_branch == branch)
+RESOLUTIONS = ("hour", "day", "week", "month")
+_BUCKET_HOURS = {"hour": 1, "day": 24, "week": 24 * 7, "month": 24 * 30.4}
 
-    # Group by date
-    buckets = {}
-    for r in q.all():
-        day = (r.started_at.date() if r.started_at else r.completed_at.date())
-        b = buckets.setdefault(day.isoformat(), {"success":0, "failure":0, "other":0, "avgDuration":0.0, "n":0})
-        if r.conclusion == 'success':
-            b["success"] += 1
-        elif r.conclusion == 'failure':
-            b["failure"] += 1
-        else:
-            b["other"] += 1
-        if r.duration_secs:
-            b["avgDuration"] += r.duration_secs
-            b["n"] += 1
-    # finalize avg
+def effective_resolution(window_days: int, resolution: str, max_points: int) -> str:
+    # Coarsen (hour -> day -> week -> month) until the window fits in max_points buckets
+    for res in RESOLUTIONS[RESOLUTIONS.index(resolution):]:
+        if window_days * 24 / _BUCKET_HOURS[res] <= max_points:
+            return res
+    return RESOLUTIONS[-1]
+
+@profiled("timeseries_counts")
+async def timeseries_counts(db: AsyncSession, repo_full: Optional[str], branch: Optional[str], window_days: int = 7,
+                            resolution: str = "day", tz: str = "UTC"):
+    since = datetime.utcnow() - timedelta(days=window_days)
+    split = await analytics.split_point(db, window_days)
+    hot_since = max(since, split) if split else since
+    # started_at is naive UTC: tag it as UTC, convert to the viewer's zone, then truncate to the bucket start
+    bucket = func.date_trunc(resolution, func.timezone(tz, func.timezone('UTC', models.WorkflowRun.started_at)))
+    stmt = select(
+        bucket.label("bucket"),
+        _SUCCESS,
+        _FAILURE,
+        func.sum(case((models.WorkflowRun.conclusion.in_(('success', 'failure')), 0), else_=1)),
+        _DURATION_SUM,
+        _DURATION_N,
+    ).join(models.Repo)
+    # By label: the tz/resolution bind params would otherwise make SELECT and GROUP BY look like different expressions
+    stmt = _window_filter(stmt, repo_full, branch, hot_since).group_by("bucket").order_by("bucket")
+    rows = list((await db.execute(stmt)).all())
+    if split and split > since:
+        # Local buckets can straddle the (UTC midnight) split, so merge by bucket rather than concatenate
+        rows = await run_in_threadpool(analytics.timeseries, repo_full, branch, since, split, resolution, tz) + rows
+    merged: Dict[datetime, list] = {}
+    for b, success, failure, other, dur_sum, dur_n in rows:
+        acc = merged.setdefault(b, [0, 0, 0, 0.0, 0])
+        for i, v in enumerate((success, failure, other, dur_sum, dur_n)):
+            acc[i] += v or 0
     series = []
-    for day in sorted(buckets.keys()):
-        b = buckets[day]
-        avg = (b["avgDuration"]/b["n"]) if b["n"] else 0.0
-        series.append({"date": day, "success": b["success"], "failure": b["failure"], "other": b["other"], "avgDuration": avg})
+    for b in sorted(merged):
+        success, failure, other, dur_sum, dur_n = merged[b]
+        series.append({"date": (b if resolution == "hour" else b.date()).isoformat(), "success": int(success), "failure": int(failure),
+                       "other": int(other), "avgDuration": float(dur_sum) / dur_n if dur_n else 0.0})
     return series
+
+async def get_reliability(db: AsyncSession, repo_full: Optional[str], branch: Optional[str]) -> List[Dict[str, Any]]:
+    # Reads the incrementally maintained state rows (one per repo/branch/workflow) and rolls them up per branch
+    s = models.BranchReliability
+    q = select(
+        models.Repo.full_name,
+        s.head_branch,
+        func.sum(s.runs_total),
+        func.sum(s.failures_total),
+        func.sum(s.recoveries),
+        func.sum(s.recovery_secs_total),
+        func.max(s.current_streak),
+        func.max(s.longest_streak),
+        func.min(s.failing_since),
+        func.max(s.last_completed_at),
+    ).join(models.Repo, models.Repo.id == s.repo_id)
+    if repo_full:
+        q = q.where(models.Repo.full_name == repo_full)
+    if branch:
+        q = q.where(s.head_branch == branch)
+    q = q.group_by(models.Repo.full_name, s.head_branch).order_by(models.Repo.full_name, s.head_branch)
+
+    out = []
+    for full, br, runs, failures, recoveries, recovery_secs, streak, longest, failing_since, last_at in (await db.execute(q)).all():
+        runs = int(runs or 0)
+        failures = int(failures or 0)
+        recoveries = int(recoveries or 0)
+        out.append({
+            "repo": full,
+            "branch": br or None,
+            "runs": runs,
+            "failures": failures,
+            "changeFailureRate": round((failures/runs)*100, 2) if runs else 0.0,
+            "recoveries": recoveries,
+            "mttrSecs": (float(recovery_secs)/recoveries) if recoveries else None,
+            "currentFailureStreak": int(streak or 0),
+            "longestFailureStreak": int(longest or 0),
+            "failingSince": failing_since.isoformat() if failing_since and streak else None,
+            "lastCompletedAt": last_at.isoformat() if last_at else None,
+        })
+    return out
+
+async def get_flaky(db: AsyncSession, repo_full: Optional[str], workflow: Optional[str], limit: int = 50) -> List[Dict[str, Any]]:
+    # Precomputed at ingest (app.flaky); this is an index scan on score
+    s = models.FlakyStat
+    q = (select(models.Repo.full_name, s.workflow_name, s.job_name, s.commits_total, s.failed_commits,
+                s.flaky_commits, s.score, s.last_flaky_at, s.last_flaky_sha)
+         .join(models.Repo, models.Repo.id == s.repo_id).where(s.flaky_commits > 0))
+    if repo_full:
+        q = q.where(models.Repo.full_name == repo_full)
+    if workflow:
+        q = q.where(s.workflow_name == workflow)
+    q = q.order_by(s.score.desc(), s.flaky_commits.desc()).limit(limit)
+    return [{
+        "repo": full,
+        "workflow": wf or None,
+        "job": job or None,  # None = the workflow as a whole
+        "commits": total,
+        "failedCommits": failed,
+        "flakyCommits": flaky_n,
+        "score": round(score or 0.0, 4),
+        "lastFlakyAt": last_at.isoformat() if last_at else None,
+        "lastFlakySha": last_sha,
+    } for full, wf, job, total, failed, flaky_n, score, last_at, last_sha in (await db.execute(q)).all()]
+
+async def get_regressions(db: AsyncSession, repo_full: Optional[str], workflow: Optional[str], days: int, limit: int = 100) -> List[Dict[str, Any]]:
+    # Flagged at ingest against the EWMA baseline (app.regressions); newest first via the detected_at index
+    r = models.DurationRegression
+    q = (select(models.Repo.full_name, r.workflow_name, r.head_branch, r.run_id, r.run_attempt, r.duration_secs,
+                r.baseline_secs, r.baseline_std_secs, r.zscore, r.slow_streak, r.detected_at, models.WorkflowRun.url)
+         .join(models.Repo, models.Repo.id == r.repo_id)
+         .join(models.WorkflowRun, models.WorkflowRun.id == r.run_id)
+         .where(r.detected_at >= datetime.utcnow() - timedelta(days=days)))
+    if repo_full:
+        q = q.where(models.Repo.full_name == repo_full)
+    if workflow:
+        q = q.where(r.workflow_name == workflow)
+    q = q.order_by(r.detected_at.desc()).limit(limit)
+    return [{
+        "repo": full,
+        "workflow": wf,
+        "branch": branch,
+        "runId": run_id,
+        "runAttempt": attempt,
+        "durationSecs": round(secs, 1),
+        "baselineSecs": round(base, 1),
+        "baselineStdSecs": round(std, 1),
+        "slowdownPct": round(100.0 * (secs - base) / base, 1) if base else None,
+        "zscore": z,
+        "slowStreak": streak,
+        "detectedAt": at.isoformat(),
+        "url": url,
+    } for full, wf, branch, run_id, attempt, secs, base, std, z, streak, at, url in (await db.execute(q)).all()]
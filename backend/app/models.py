@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, BigInteger, DateTime, Boolean, Text, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, BigInteger, Date, DateTime, Boolean, Text, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
 
+# SQLite only autoincrements an INTEGER PRIMARY KEY; BIGINT everywhere else
+BigId = BigInteger().with_variant(Integer, "sqlite")
+
 class Repo(Base):
     __tablename__ = "repos"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -11,7 +14,7 @@ class Repo(Base):
     full_name = Column(String(512), nullable=False, unique=True)
     default_branch = Column(String(255), nullable=True)
     is_active = Column(Boolean, default=True)
-    last_checked_at = Column(DateTime, nullable=True)
+    last_checked_at = Column(DateTime, nullable=True)  # last full listing of runs (probe-skipped ticks leave it)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     runs = relationship("WorkflowRun", back_populates="repo")
@@ -26,12 +29,14 @@ class WorkflowRun(Base):
     event = Column(String(64), nullable=True)
     status = Column(String(64), nullable=True)       # queued | in_progress | completed
     conclusion = Column(String(64), nullable=True)   # success | failure | cancelled | ...
-    started_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True, index=True)  # window filters; keeps the hot (post-export) slice cheap
     completed_at = Column(DateTime, nullable=True)
     duration_secs = Column(Float, nullable=True)
     url = Column(String(1024), nullable=True)
     actor = Column(String(255), nullable=True)
+    run_attempt = Column(Integer, nullable=True, default=1)  # status/conclusion above belong to this attempt
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # last insert/change; re-dirties analytics days
 
     repo = relationship("Repo", back_populates="runs")
     jobs = relationship("WorkflowJob", back_populates="run")
@@ -46,6 +51,7 @@ class WorkflowJob(Base):
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     duration_secs = Column(Float, nullable=True)
+    run_attempt = Column(Integer, nullable=True)  # re-runs create new job ids under the same run
 
     run = relationship("WorkflowRun", back_populates="jobs")
     steps = relationship("WorkflowStep", back_populates="job")
@@ -53,8 +59,10 @@ class WorkflowJob(Base):
 
 class WorkflowStep(Base):
     __tablename__ = "workflow_steps"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
-    job_id = Column(BigInteger, ForeignKey("workflow_jobs.id"), index=True)
+    # Also serves job_id lookups; database.init_db removes duplicates left by older versions before building it
+    __table_args__ = (Index("uq_workflow_steps_job_number", "job_id", "number", unique=True),)
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    job_id = Column(BigInteger, ForeignKey("workflow_jobs.id"))
     name = Column(String(255), nullable=True)
     status = Column(String(64), nullable=True)
     conclusion = Column(String(64), nullable=True)
@@ -74,3 +82,188 @@ class RunLog(Base):
     size_bytes = Column(BigInteger, nullable=True)
 
     job = relationship("WorkflowJob", back_populates="log")
+
+class BranchReliability(Base):
+    # Incrementally maintained failure/recovery state per repo + branch + workflow
+    __tablename__ = "branch_reliability"
+    __table_args__ = (UniqueConstraint("repo_id", "head_branch", "workflow_name", name="uq_branch_reliability"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), index=True, nullable=False)
+    head_branch = Column(String(255), nullable=False, default="")
+    workflow_name = Column(String(255), nullable=False, default="")
+    runs_total = Column(Integer, default=0)
+    failures_total = Column(Integer, default=0)
+    current_streak = Column(Integer, default=0)      # consecutive failures right now
+    longest_streak = Column(Integer, default=0)
+    failing_since = Column(DateTime, nullable=True)  # completion time of the first failure in the current streak
+    recoveries = Column(Integer, default=0)
+    recovery_secs_total = Column(Float, default=0.0)
+    last_recovery_secs = Column(Float, nullable=True)
+    last_conclusion = Column(String(64), nullable=True)
+    last_run_id = Column(BigInteger, nullable=True)
+    last_completed_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class BranchStatus(Base):
+    # Latest run per repo + branch + workflow, kept in the run upsert's transaction; backs /api/status-board
+    __tablename__ = "branch_status"
+    __table_args__ = (UniqueConstraint("repo_id", "head_branch", "workflow_name", name="uq_branch_status"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), nullable=False)
+    head_branch = Column(String(255), nullable=False, default="")
+    workflow_name = Column(String(255), nullable=False, default="")
+    run_id = Column(BigInteger, nullable=False)  # no FK: runs may be pruned independently
+    run_attempt = Column(Integer, nullable=True)
+    status = Column(String(64), nullable=True)
+    conclusion = Column(String(64), nullable=True)
+    failing = Column(Boolean, nullable=False, default=False)  # last completed run failed; kept while a newer run is in progress
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    url = Column(String(1024), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# Board order: failing first, then stalest first
+Index("ix_branch_status_board", BranchStatus.failing.desc(), BranchStatus.started_at)
+
+class FailureExcerpt(Base):
+    # Compact view of a failed job's log, built in the ingest process pool when the log is downloaded
+    __tablename__ = "failure_excerpts"
+    job_id = Column(BigInteger, ForeignKey("workflow_jobs.id"), primary_key=True)
+    step_name = Column(String(255), nullable=True)  # first failed step, from the jobs API
+    step_number = Column(Integer, nullable=True)
+    error_line = Column(Integer, nullable=True)  # 1-based line of the first ##[error]
+    error_context = Column(Text, nullable=True)
+    tail = Column(Text, nullable=True)
+    total_lines = Column(Integer, nullable=True)
+    log_bytes = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class RepoLease(Base):
+    # Poll work queue: one row per repo, leased by an ingest worker with FOR UPDATE SKIP LOCKED
+    __tablename__ = "repo_leases"
+    repo_id = Column(Integer, ForeignKey("repos.id"), primary_key=True)
+    worker_id = Column(String(255), nullable=True)
+    leased_until = Column(DateTime, nullable=True)
+    next_poll_at = Column(DateTime, nullable=True, index=True)
+    last_polled_at = Column(DateTime, nullable=True)
+    probe_state = Column(String(64), nullable=True)  # activity fingerprint from the GraphQL probe at the last full poll
+    idle_polls = Column(Integer, nullable=True)  # consecutive ticks without a change; stretches next_poll_at
+
+class OpenRun(Base):
+    # Fast-lane queue: runs not completed yet; claimed by pushing next_check_at forward under FOR UPDATE SKIP LOCKED
+    __tablename__ = "open_runs"
+    run_id = Column(BigInteger, ForeignKey("workflow_runs.id"), primary_key=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), nullable=False)
+    etag = Column(String(255), nullable=True)
+    next_check_at = Column(DateTime, nullable=True, index=True)
+    opened_at = Column(DateTime, default=datetime.utcnow)
+
+class IngestWorker(Base):
+    __tablename__ = "ingest_workers"
+    id = Column(String(255), primary_key=True)
+    hostname = Column(String(255), nullable=True)
+    pid = Column(Integer, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_discovery_at = Column(DateTime, nullable=True)  # this worker's last completed repo discovery
+
+class DiscoveryPage(Base):
+    # Cached repo-list pages for conditional (ETag) discovery requests
+    __tablename__ = "discovery_pages"
+    source = Column(String(255), primary_key=True)  # installation login, '' for the PAT
+    url = Column(String(1024), primary_key=True)
+    etag = Column(String(255), nullable=True)
+    next_url = Column(String(1024), nullable=True)
+    repos = Column(Text, nullable=True)  # JSON list of repo summaries on this page
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+
+class BackfillCheckpoint(Base):
+    # Progress of `python -m app.backfill` per repo; history is imported newest window first
+    __tablename__ = "backfill_checkpoints"
+    repo_id = Column(Integer, ForeignKey("repos.id"), primary_key=True)
+    since = Column(DateTime, nullable=False)          # oldest created_at requested
+    cursor = Column(DateTime, nullable=True)          # runs created at/after this are imported
+    next_url = Column(String(1024), nullable=True)    # next page within the window ending at cursor
+    runs_imported = Column(BigInteger, default=0)
+    completed_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class AnalyticsPartition(Base):
+    # Export state per table per UTC day; the Parquet files themselves are monthly (see app.analytics)
+    __tablename__ = "analytics_partitions"
+    table_name = Column(String(64), primary_key=True)
+    day = Column(Date, primary_key=True)
+    row_count = Column(BigInteger, default=0)
+    exported_at = Column(DateTime, default=datetime.utcnow)  # rows inserted after this make the day stale
+
+class RunAttempt(Base):
+    # One row per completed attempt; WorkflowRun only keeps the latest
+    __tablename__ = "run_attempts"
+    run_id = Column(BigInteger, ForeignKey("workflow_runs.id"), primary_key=True)
+    attempt = Column(Integer, primary_key=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), index=True, nullable=False)
+    workflow_name = Column(String(255), nullable=True)
+    head_sha = Column(String(64), nullable=True, index=True)
+    conclusion = Column(String(64), nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+class CommitResult(Base):
+    # Outcomes seen for one commit per workflow ('' job) or per job; a failure followed by a pass marks it flaky
+    __tablename__ = "commit_results"
+    __table_args__ = (UniqueConstraint("repo_id", "workflow_name", "job_name", "head_sha", name="uq_commit_results"),)
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), nullable=False)
+    workflow_name = Column(String(255), nullable=False, default="")
+    job_name = Column(String(255), nullable=False, default="")
+    head_sha = Column(String(64), nullable=False)
+    failures = Column(Integer, default=0)
+    successes = Column(Integer, default=0)
+    flaky_at = Column(DateTime, nullable=True)
+
+class FlakyStat(Base):
+    # Incrementally maintained flakiness per repo + workflow ('' job) and per job
+    __tablename__ = "flaky_stats"
+    __table_args__ = (UniqueConstraint("repo_id", "workflow_name", "job_name", name="uq_flaky_stats"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), nullable=False)
+    workflow_name = Column(String(255), nullable=False, default="")
+    job_name = Column(String(255), nullable=False, default="")
+    commits_total = Column(Integer, default=0)
+    failed_commits = Column(Integer, default=0)
+    flaky_commits = Column(Integer, default=0)
+    score = Column(Float, default=0.0, index=True)  # flaky_commits / failed_commits
+    last_flaky_at = Column(DateTime, nullable=True)
+    last_flaky_sha = Column(String(64), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DurationBaseline(Base):
+    # EWMA of successful run duration per repo + workflow, updated once per completed attempt (app.regressions)
+    __tablename__ = "duration_baselines"
+    __table_args__ = (UniqueConstraint("repo_id", "workflow_name", name="uq_duration_baselines"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), nullable=False)
+    workflow_name = Column(String(255), nullable=False, default="")
+    samples = Column(Integer, default=0)
+    mean_secs = Column(Float, nullable=True)
+    var_secs = Column(Float, nullable=True)
+    slow_streak = Column(Integer, default=0)  # consecutive flagged runs
+    last_run_id = Column(BigInteger, nullable=True)
+    last_completed_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DurationRegression(Base):
+    # A run significantly slower than its workflow's baseline at the time it completed
+    __tablename__ = "duration_regressions"
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    run_id = Column(BigInteger, ForeignKey("workflow_runs.id"), index=True, nullable=False)
+    run_attempt = Column(Integer, nullable=True)
+    repo_id = Column(Integer, ForeignKey("repos.id"), nullable=False)
+    workflow_name = Column(String(255), nullable=True)
+    head_branch = Column(String(255), nullable=True)
+    duration_secs = Column(Float, nullable=False)
+    baseline_secs = Column(Float, nullable=False)
+    baseline_std_secs = Column(Float, nullable=False)
+    zscore = Column(Float, nullable=False)
+    slow_streak = Column(Integer, nullable=True)  # position in the streak; >= REGRESSION_ALERT_RUNS means sustained
+    detected_at = Column(DateTime, nullable=False, index=True)  # run completion time
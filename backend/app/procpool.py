@@ -0,0 +1,31 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Optional
+
+# CPU-bound helpers (log compression / parsing) run here when a pool is started;
+# without one (API process, scripts) they run inline on the calling thread.
+_pool: Optional[ProcessPoolExecutor] = None
+
+def start(workers: int):
+    global _pool
+    if workers > 0 and _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+
+def submit(fn: Callable, *args) -> Future:
+    # Submit every item of a batch before waiting on any, or the calls run one at a time
+    if _pool is not None:
+        return _pool.submit(fn, *args)
+    f = Future()
+    try:
+        f.set_result(fn(*args))
+    except Exception as e:
+        f.set_exception(e)
+    return f
+
+def run(fn: Callable, *args):
+    return submit(fn, *args).result()
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
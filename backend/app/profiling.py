@@ -0,0 +1,169 @@
+import sys, threading, time
+from collections import Counter as _Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+# ---- Per-request timing (Server-Timing) ----
+
+# Mutable dict per request; sync handlers run in a copied context so they update the same object
+_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+SLOW_QUERIES: deque = deque(maxlen=200)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["_query_start"].pop()
+    t = _timings.get()
+    if t is not None:
+        t["db"] += elapsed
+        t["db_n"] += 1
+    if settings.slow_query_ms and elapsed * 1000 >= settings.slow_query_ms:
+        SLOW_QUERIES.append({
+            "at": datetime.utcnow().isoformat(),
+            "ms": round(elapsed * 1000, 2),
+            "route": t.get("route") if t else None,
+            "statement": statement[:2000],
+        })
+
+def add_serialization(seconds: float):
+    t = _timings.get()
+    if t is not None:
+        t["ser"] += seconds
+
+class TimedJSONResponse(ORJSONResponse):
+    """orjson-encoded response that reports its encode time as Server-Timing ser.
+
+    Handlers on the hot path return an instance directly with plain rows
+    (datetimes included) so FastAPI skips the jsonable_encoder pass.
+    """
+
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = super().render(content)
+        add_serialization(time.perf_counter() - start)
+        return body
+
+class TimingMiddleware:
+    """Adds Server-Timing (db / ser / app / total) to every response.
+
+    db is time inside cursor.execute, ser is response rendering, app is the rest
+    of the handler. Values are as of when headers are sent, so for streamed
+    responses they cover only the work done before the first chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t = {"db": 0.0, "db_n": 0, "ser": 0.0, "route": scope.get("path")}
+        token = _timings.set(t)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - start
+                app_time = max(0.0, total - t["db"] - t["ser"])
+                value = (f'db;dur={t["db"]*1000:.2f};desc="{t["db_n"]} queries", ser;dur={t["ser"]*1000:.2f}, '
+                         f'app;dur={app_time*1000:.2f}, total;dur={total*1000:.2f}')
+                message.setdefault("headers", []).append((b"server-timing", value.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+
+# ---- Sampled statistical profiles ----
+
+# code object -> target name, filled by @profiled
+_TARGET_CODES: Dict[object, str] = {}
+
+class Sampler:
+    """Samples the stacks of threads currently executing a @profiled function.
+
+    A thread is attributed to a target when that function's frame is on its
+    stack, which works for sync code on worker threads and for coroutines
+    on the event loop alike (a suspended coroutine isn't on any stack, so
+    time spent awaiting is not sampled). Off by default and free while off.
+    Aggregated stacks are kept in folded format ("a;b;c count"), which
+    flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.targets: set = set()
+        self.interval = 0.005
+        self.deadline = 0.0
+        self.samples = 0
+        self.started_at: Optional[str] = None
+        self.stacks: _Counter = _Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, targets: Iterable[str], interval_ms: float = 5, duration_s: float = 60):
+        with self._lock:
+            self.targets = set(targets)
+            self.interval = max(0.001, interval_ms / 1000)
+            self.deadline = time.monotonic() + duration_s
+            self.stacks = _Counter()
+            self.samples = 0
+            self.started_at = datetime.utcnow().isoformat()
+            self.enabled = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self.enabled = False
+
+    def _loop(self):
+        me = threading.get_ident()
+        while self.enabled and time.monotonic() < self.deadline:
+            codes = {c: n for c, n in _TARGET_CODES.items() if n in self.targets}
+            for tid, frame in sys._current_frames().items():
+                if tid != me:
+                    self._sample(frame, codes)
+            self.samples += 1
+            time.sleep(self.interval)
+        self.enabled = False
+
+    def _sample(self, frame, codes: Dict[object, str]):
+        parts, name = [], None
+        while frame is not None:
+            code = frame.f_code
+            if code in codes:
+                name = codes[code]  # keeps the outermost target on the stack
+            parts.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+            frame = frame.f_back
+        if name is not None:
+            self.stacks[";".join([name] + parts[::-1])] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self.enabled,
+            "targets": sorted(self.targets),
+            "startedAt": self.started_at,
+            "samples": self.samples,
+            "folded": "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()),
+        }
+
+sampler = Sampler()
+
+def profiled(name: str):
+    # Registers fn as a profile target; fn itself is returned unwrapped
+    def deco(fn):
+        _TARGET_CODES[fn.__code__] = name
+        return fn
+    return deco
@@ -0,0 +1,74 @@
+import math
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from . import models
+from .config import settings
+from .reliability import SUCCESS_CONCLUSIONS
+from .telemetry import DURATION_REGRESSIONS
+
+# Only successful runs feed the baseline: failed and cancelled runs stop early and would drag it down.
+# Flagged runs move the mean but not the variance: a lasting slowdown becomes the new baseline after
+# ~1/alpha runs, without its first few runs widening the band enough to hide the rest of the streak.
+
+def get_baseline(db: Session, repo_id: int, workflow: Optional[str]) -> models.DurationBaseline:
+    workflow = workflow or ""
+    base = db.query(models.DurationBaseline).filter(
+        models.DurationBaseline.repo_id == repo_id,
+        models.DurationBaseline.workflow_name == workflow,
+    ).first()
+    if not base:
+        base = models.DurationBaseline(repo_id=repo_id, workflow_name=workflow, samples=0, slow_streak=0)
+        db.add(base)
+        db.flush()  # sessions don't autoflush: the next lookup of this key must find it
+    return base
+
+def _update(base: models.DurationBaseline, secs: float, flagged: bool):
+    # Incremental EWMA mean/variance; plain running averages until there are 1/alpha samples, so early runs aren't overweighted
+    base.samples += 1
+    if base.mean_secs is None:
+        base.mean_secs, base.var_secs = secs, 0.0
+        return
+    alpha = max(settings.regression_alpha, 1.0 / base.samples)
+    diff = secs - base.mean_secs
+    incr = alpha * diff
+    base.mean_secs += incr
+    if not flagged:
+        base.var_secs = (1 - alpha) * (base.var_secs + diff * incr)
+
+def observe(db: Session, run: models.WorkflowRun) -> Optional[models.DurationRegression]:
+    """Check one completed run against its workflow's baseline, then fold it in.
+
+    Returns the stored regression row when the run is flagged: at least
+    REGRESSION_ZSCORE standard deviations and REGRESSION_MIN_SECS above the
+    mean, once the baseline has REGRESSION_MIN_SAMPLES runs. Each run
+    attempt is applied once.
+    """
+    if run.status != "completed" or run.conclusion not in SUCCESS_CONCLUSIONS or not run.duration_secs or run.duration_secs < 0:
+        return None
+    base = get_baseline(db, run.repo_id, run.workflow_name)
+    if base.last_run_id == run.id and base.last_completed_at == run.completed_at:
+        return None
+    reg = None
+    if (base.samples or 0) >= settings.regression_min_samples:
+        std = math.sqrt(base.var_secs or 0.0)
+        z = (run.duration_secs - base.mean_secs) / max(std, 1.0)
+        if z >= settings.regression_zscore and run.duration_secs - base.mean_secs >= settings.regression_min_secs:
+            base.slow_streak = (base.slow_streak or 0) + 1
+            reg = models.DurationRegression(
+                run_id=run.id, run_attempt=run.run_attempt, repo_id=run.repo_id, workflow_name=run.workflow_name,
+                head_branch=run.head_branch, duration_secs=run.duration_secs, baseline_secs=base.mean_secs,
+                baseline_std_secs=std, zscore=round(z, 3), slow_streak=base.slow_streak, detected_at=run.completed_at)
+            db.add(reg)
+            DURATION_REGRESSIONS.inc()
+    if reg is None:
+        base.slow_streak = 0
+    _update(base, run.duration_secs, reg is not None)
+    base.last_run_id = run.id
+    base.last_completed_at = run.completed_at
+    base.updated_at = datetime.utcnow()
+    return reg
+
+def alert_due(reg: models.DurationRegression) -> bool:
+    # Sustained: REGRESSION_ALERT_RUNS flagged runs in a row; alerted once per streak
+    return settings.regression_alert_runs > 0 and reg.slow_streak == settings.regression_alert_runs
@@ -0,0 +1,73 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from . import models
+
+# Conclusions that count as a failed change / restored service
+FAILURE_CONCLUSIONS = ("failure", "timed_out", "startup_failure")
+SUCCESS_CONCLUSIONS = ("success",)
+
+def get_state(db: Session, repo_id: int, branch: Optional[str], workflow: Optional[str]) -> models.BranchReliability:
+    branch = branch or ""
+    workflow = workflow or ""
+    state = db.query(models.BranchReliability).filter(
+        models.BranchReliability.repo_id == repo_id,
+        models.BranchReliability.head_branch == branch,
+        models.BranchReliability.workflow_name == workflow,
+    ).first()
+    if not state:
+        state = models.BranchReliability(
+            repo_id=repo_id, head_branch=branch, workflow_name=workflow,
+            runs_total=0, failures_total=0, current_streak=0, longest_streak=0,
+            recoveries=0, recovery_secs_total=0.0,
+        )
+        db.add(state)
+        db.flush()  # sessions don't autoflush: the next lookup of this key must find it
+    return state
+
+def advance(db: Session, run: models.WorkflowRun) -> Optional[models.BranchReliability]:
+    """Feed one completed run into its branch/workflow state machine.
+
+    Callers apply each attempt once, as it transitions to completed; the
+    same attempt seen again is a no-op. A run that completed before the
+    last applied one (overlapping runs, fetched out of order) still counts
+    toward the totals, but the newer run has already decided the branch's
+    current streak, so the state machine doesn't move.
+    """
+    if run.status != "completed" or not run.completed_at:
+        return None
+    if run.conclusion not in FAILURE_CONCLUSIONS + SUCCESS_CONCLUSIONS:
+        return None  # cancelled / skipped / neutral don't move the state
+    state = get_state(db, run.repo_id, run.head_branch, run.workflow_name)
+    if state.last_run_id == run.id and state.last_completed_at == run.completed_at:
+        return state  # same attempt again; a re-run attempt of the same run completes later and is applied
+    if state.last_completed_at and run.completed_at < state.last_completed_at:
+        state.runs_total += 1
+        if run.conclusion in FAILURE_CONCLUSIONS:
+            state.failures_total += 1
+        state.updated_at = datetime.utcnow()
+        db.add(state)
+        return state
+
+    state.runs_total += 1
+    if run.conclusion in FAILURE_CONCLUSIONS:
+        state.failures_total += 1
+        if state.current_streak == 0:
+            state.failing_since = run.completed_at
+        state.current_streak += 1
+        state.longest_streak = max(state.longest_streak or 0, state.current_streak)
+    else:
+        if state.current_streak > 0 and state.failing_since:
+            secs = (run.completed_at - state.failing_since).total_seconds()
+            state.recoveries += 1
+            state.recovery_secs_total += secs
+            state.last_recovery_secs = secs
+        state.current_streak = 0
+        state.failing_since = None
+
+    state.last_conclusion = run.conclusion
+    state.last_run_id = run.id
+    state.last_completed_at = run.completed_at
+    state.updated_at = datetime.utcnow()
+    db.add(state)
+    return state
@@ -1,67 +1,160 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import PlainTextResponse
-from sqlalchemy.orm import Session
-from typing import Optional, List
-from .database import get_db
-from . import models
-from .metrics import get_overview, timeseries_counts
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from .config import settings
+from .database import get_async_read_db
+from . import export, models
+from .metrics import get_overview, timeseries_counts, get_reliability, get_flaky, get_regressions, effective_resolution, RESOLUTIONS
 from .logs import read_job_log_text
+from .profiling import TimedJSONResponse
 
 router = APIRouter()
 
+_RUN_COLUMNS = (
+    models.WorkflowRun.id,
+    models.Repo.full_name.label("repo"),
+    models.WorkflowRun.workflow_name,
+    models.WorkflowRun.head_branch,
+    models.WorkflowRun.event,
+    models.WorkflowRun.status,
+    models.WorkflowRun.conclusion,
+    models.WorkflowRun.started_at,
+    models.WorkflowRun.completed_at,
+    models.WorkflowRun.duration_secs,
+    models.WorkflowRun.url,
+    models.WorkflowRun.actor,
+)
+_JOB_COLUMNS = (
+    models.WorkflowJob.id,
+    models.WorkflowJob.name,
+    models.WorkflowJob.status,
+    models.WorkflowJob.conclusion,
+    models.WorkflowJob.started_at,
+    models.WorkflowJob.completed_at,
+    models.WorkflowJob.duration_secs,
+)
+
+async def _rows(db: AsyncSession, stmt) -> TimedJSONResponse:
+    # Plain column rows straight to orjson: no ORM identity map, no jsonable_encoder pass
+    return TimedJSONResponse([dict(m) for m in (await db.execute(stmt)).mappings()])
+
 @router.get("/repos")
-def list_repos(db: Session = Depends(get_db)):
-    repos = db.query(models.Repo).filter(models.Repo.is_active == True).order_by(models.Repo.full_name).all()
-    return [{"id": r.id, "owner": r.owner, "name": r.name, "full_name": r.full_name, "default_branch": r.default_branch} for r in repos]
+async def list_repos(db: AsyncSession = Depends(get_async_read_db)):
+    q = (select(models.Repo.id, models.Repo.owner, models.Repo.name, models.Repo.full_name, models.Repo.default_branch)
+         .where(models.Repo.is_active == True).order_by(models.Repo.full_name))
+    return await _rows(db, q)
 
 @router.get("/runs")
-def list_runs(repo: Optional[str] = None, branch: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
-    q = db.query(models.WorkflowRun).join(models.Repo).order_by(models.WorkflowRun.started_at.desc().nullslast())
+async def list_runs(repo: Optional[str] = None, branch: Optional[str] = None, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
+    q = select(*_RUN_COLUMNS).join(models.Repo).order_by(models.WorkflowRun.started_at.desc().nullslast())
     if repo:
-        q = q.filter(models.Repo.full_name == repo)
+        q = q.where(models.Repo.full_name == repo)
     if branch:
-        q = q.filter(models.WorkflowRun.head_branch == branch)
-    runs = q.limit(limit).all()
-    return [{
-        "id": r.id,
-        "repo": r.repo.full_name if r.repo else None,
-        "workflow_name": r.workflow_name,
-        "head_branch": r.head_branch,
-        "event": r.event,
-        "status": r.status,
-        "conclusion": r.conclusion,
-        "started_at": r.started_at.isoformat() if r.started_at else None,
-        "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-        "duration_secs": r.duration_secs,
-        "url": r.url,
-        "actor": r.actor,
-    } for r in runs]
+        q = q.where(models.WorkflowRun.head_branch == branch)
+    return await _rows(db, q.limit(limit))
 
 @router.get("/runs/{run_id}/jobs")
-def run_jobs(run_id: int, db: Session = Depends(get_db)):
-    jobs = db.query(models.WorkflowJob).filter(models.WorkflowJob.run_id == run_id).all()
-    return [{
-        "id": j.id,
-        "name": j.name,
-        "status": j.status,
-        "conclusion": j.conclusion,
-        "started_at": j.started_at.isoformat() if j.started_at else None,
-        "completed_at": j.completed_at.isoformat() if j.completed_at else None,
-        "duration_secs": j.duration_secs,
-    } for j in jobs]
+async def run_jobs(run_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await _rows(db, select(*_JOB_COLUMNS).where(models.WorkflowJob.run_id == run_id).order_by(models.WorkflowJob.id))
 
 @router.get("/jobs/{job_id}/log", response_class=PlainTextResponse)
-def job_log(job_id: int, db: Session = Depends(get_db)):
-    j = db.query(models.WorkflowJob).filter(models.WorkflowJob.id == job_id).first()
-    if not j or not j.log or not j.log.path:
+async def job_log(job_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    q = (select(models.RunLog.path)
+         .where(models.RunLog.job_id == job_id, models.RunLog.path != None)
+         .order_by(models.RunLog.id.desc()).limit(1))
+    path = (await db.execute(q)).scalar()
+    if not path:
         raise HTTPException(status_code=404, detail="Log not found")
-    text = read_job_log_text(j.log.path, max_bytes=2_000_000)
+    # gunzip of up to 2 MB is blocking file I/O + CPU; keep it off the event loop
+    text = await run_in_threadpool(read_job_log_text, path, 2_000_000)
     return text
 
+@router.get("/jobs/{job_id}/excerpt")
+async def job_excerpt(job_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    e = models.FailureExcerpt
+    # has_log: whether /jobs/{id}/log can serve it (logs over MAX_LOG_BYTES_PER_JOB keep only the excerpt)
+    has_log = select(models.RunLog.id).where(models.RunLog.job_id == e.job_id, models.RunLog.path != None).exists()
+    q = (select(e.job_id, e.step_name, e.step_number, e.error_line, e.error_context, e.tail, e.total_lines, e.log_bytes,
+                has_log.label("has_log")).where(e.job_id == job_id))
+    row = (await db.execute(q)).mappings().first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Excerpt not found")
+    return TimedJSONResponse(dict(row))
+
 @router.get("/metrics/overview")
-def overview(repo: Optional[str] = None, branch: Optional[str] = None, windowDays: int = 7, db: Session = Depends(get_db)):
-    return get_overview(db, repo, branch, windowDays)
+async def overview(repo: Optional[str] = None, branch: Optional[str] = None, windowDays: int = 7, db: AsyncSession = Depends(get_async_read_db)):
+    return TimedJSONResponse(await get_overview(db, repo, branch, windowDays))
 
 @router.get("/metrics/timeseries")
-def timeseries(repo: Optional[str] = None, branch: Optional[str] = None, windowDays: int = 7, db: Session = Depends(get_db)):
-    return timeseries_counts(db, repo, branch, windowDays)
+async def timeseries(repo: Optional[str] = None, branch: Optional[str] = None, windowDays: int = 7,
+                     resolution: str = "day", tz: Optional[str] = None, maxPoints: Optional[int] = None,
+                     db: AsyncSession = Depends(get_async_read_db)):
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    tz = tz or settings.tz
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+    res = effective_resolution(windowDays, resolution, max(1, maxPoints or settings.timeseries_max_points))
+    series = await timeseries_counts(db, repo, branch, windowDays, res, tz)
+    # Bucket start times are local to tz; the header says how coarse they ended up
+    return TimedJSONResponse(series, headers={"X-Timeseries-Resolution": res, "X-Timeseries-Timezone": tz})
+
+@router.get("/metrics/reliability")
+async def reliability(repo: Optional[str] = None, branch: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return TimedJSONResponse(await get_reliability(db, repo, branch))
+
+@router.get("/metrics/flaky")
+async def flaky(repo: Optional[str] = None, workflow: Optional[str] = None, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
+    return TimedJSONResponse(await get_flaky(db, repo, workflow, min(max(limit, 1), 500)))
+
+@router.get("/metrics/regressions")
+async def regressions(repo: Optional[str] = None, workflow: Optional[str] = None, windowDays: int = 7, limit: int = 100,
+                      db: AsyncSession = Depends(get_async_read_db)):
+    return TimedJSONResponse(await get_regressions(db, repo, workflow, min(max(windowDays, 1), 365), min(max(limit, 1), 500)))
+
+@router.get("/status-board")
+async def status_board(repo: Optional[str] = None, branch: Optional[str] = None, workflow: Optional[str] = None,
+                       allBranches: bool = False, failingOnly: bool = False, limit: int = 1000,
+                       db: AsyncSession = Depends(get_async_read_db)):
+    # Latest run per repo/branch/workflow (app.statusboard), failing first, then least recently run;
+    # default branches only unless a branch is named or allBranches is set
+    s = models.BranchStatus
+    q = (select(models.Repo.full_name.label("repo"), s.head_branch.label("branch"), s.workflow_name.label("workflow"),
+                s.run_id, s.run_attempt, s.status, s.conclusion, s.failing, s.started_at, s.completed_at, s.url)
+         .join(models.Repo, models.Repo.id == s.repo_id).where(models.Repo.is_active == True))
+    if repo:
+        q = q.where(models.Repo.full_name == repo)
+    if branch:
+        q = q.where(s.head_branch == branch)
+    elif not allBranches:
+        q = q.where(s.head_branch == models.Repo.default_branch)
+    if workflow:
+        q = q.where(s.workflow_name == workflow)
+    if failingOnly:
+        q = q.where(s.failing == True)
+    return await _rows(db, q.order_by(s.failing.desc(), s.started_at).limit(min(max(limit, 1), 5000)))
+
+def _export_response(kind: str, stmt, format: str) -> StreamingResponse:
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(export.FORMATS)}")
+    filename = f"{kind}-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(export.stream(kind, stmt, format), media_type=export.FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/export/runs")
+async def export_runs(format: str = "csv", repo: Optional[str] = None, branch: Optional[str] = None, workflow: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None):
+    # No session dependency: the stream opens its own, which must outlive the handler
+    return _export_response("runs", export.runs_query(repo, branch, workflow, since, until), format)
+
+@router.get("/export/jobs")
+async def export_jobs(format: str = "csv", repo: Optional[str] = None, branch: Optional[str] = None, workflow: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None):
+    return _export_response("jobs", export.jobs_query(repo, branch, workflow, since, until), format)
@@ -0,0 +1,64 @@
+from sqlalchemy import or_, case, text
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, List, Tuple
+from . import models
+from .database import dialect_insert
+from .reliability import FAILURE_CONCLUSIONS
+
+# Latest run per repo + branch + workflow. Runs may be seen out of order (fast lane, backfill,
+# re-runs), so a row only moves to the same run or one that started at least as late.
+
+_FIELDS = ("run_attempt", "status", "conclusion", "started_at", "completed_at", "url")
+
+def _key(row: Dict) -> Tuple:
+    return row["repo_id"], row["head_branch"] or "", row["workflow_name"] or ""
+
+def upsert(db: Session, runs: List[Dict]):
+    """Apply run rows (WorkflowRun column dicts); of several runs on one key only the newest is kept."""
+    latest = {}
+    for r in runs:
+        if r["repo_id"] is not None:
+            cur = latest.get(_key(r))
+            if cur is None or (r["started_at"] or datetime.min) >= (cur["started_at"] or datetime.min):
+                latest[_key(r)] = r
+    if not latest:
+        return
+    now = datetime.utcnow()
+    s = models.BranchStatus
+    stmt = dialect_insert(db, s).values([
+        {"repo_id": repo_id, "head_branch": branch, "workflow_name": workflow, "run_id": r["id"],
+         "failing": r["status"] == "completed" and r["conclusion"] in FAILURE_CONCLUSIONS, "updated_at": now,
+         **{k: r[k] for k in _FIELDS}}
+        for (repo_id, branch, workflow), r in latest.items()
+    ])
+    ex = stmt.excluded
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["repo_id", "head_branch", "workflow_name"],
+        set_={
+            **{k: getattr(ex, k) for k in ("run_id", "updated_at") + _FIELDS},
+            # A run in progress doesn't clear red: the branch is failing until a newer run passes
+            "failing": case((ex.status == "completed", ex.failing), else_=s.failing),
+        },
+        where=or_(s.run_id == ex.run_id, s.started_at == None, ex.started_at >= s.started_at),
+    ))
+
+def record(db: Session, run: models.WorkflowRun):
+    upsert(db, [{k: getattr(run, k) for k in ("id", "repo_id", "head_branch", "workflow_name") + _FIELDS}])
+
+def seed(conn) -> int:
+    # Fill the table from stored history (last completed run per key); init_db runs this once, when it creates the table
+    failures = ", ".join(f"'{c}'" for c in FAILURE_CONCLUSIONS)
+    return conn.execute(text(f"""
+        INSERT INTO branch_status (repo_id, head_branch, workflow_name, run_id, run_attempt, status, conclusion,
+                                   failing, started_at, completed_at, url, updated_at)
+        SELECT repo_id, head_branch, workflow_name, id, run_attempt, status, conclusion,
+               failing, started_at, completed_at, url, :now
+        FROM (SELECT repo_id, COALESCE(head_branch, '') AS head_branch, COALESCE(workflow_name, '') AS workflow_name,
+                     id, run_attempt, status, conclusion, conclusion IN ({failures}) AS failing,
+                     started_at, completed_at, url,
+                     ROW_NUMBER() OVER (PARTITION BY repo_id, COALESCE(head_branch, ''), COALESCE(workflow_name, '')
+                                        ORDER BY started_at DESC NULLS LAST, id DESC) AS rn
+              FROM workflow_runs WHERE status = 'completed' AND repo_id IS NOT NULL) latest
+        WHERE rn = 1
+    """), {"now": datetime.utcnow()}).rowcount
@@ -0,0 +1,199 @@
+import bisect, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# Minimal in-process Prometheus registry (text exposition format 0.0.4).
+# Each process (API, worker) exposes its own values.
+
+REGISTRY: List["_Metric"] = []
+COLLECTORS: List[Callable[[], None]] = []  # refresh point-in-time gauges (pool usage etc.) just before a scrape
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_fmt_labels(zip(self.labelnames, key))} {_fmt_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, n) in items:
+            base = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(base + [('le', _fmt_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(base)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(base)} {n}")
+        return lines
+
+def on_collect(fn: Callable[[], None]) -> Callable[[], None]:
+    COLLECTORS.append(fn)
+    return fn
+
+def render() -> str:
+    for fn in COLLECTORS:
+        fn()
+    out = []
+    for m in REGISTRY:
+        out.extend(m.render())
+    return "\n".join(out) + "\n"
+
+class _ExpositionHandler(BaseHTTPRequestHandler):
+    # Extra routes: {(method, path): fn(query, headers) -> (status, content_type, body)}
+    routes: Dict[tuple, Callable] = {}
+
+    def _dispatch(self, method: str):
+        path, _, qs = self.path.partition("?")
+        if method == "GET" and path == "/metrics":
+            status, ctype, body = 200, CONTENT_TYPE, render().encode()
+        elif (method, path) in self.routes:
+            query = {k: v[-1] for k, v in parse_qs(qs).items()}
+            status, ctype, body = self.routes[(method, path)](query, self.headers)
+        else:
+            self.send_error(404)
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, *args):
+        pass
+
+def serve(port: int, routes: Optional[Dict[tuple, Callable]] = None) -> ThreadingHTTPServer:
+    # /metrics (plus optional extra routes) for processes without an ASGI app (the ingest worker)
+    handler = type("Handler", (_ExpositionHandler,), {"routes": dict(routes or {})})
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+class MetricsMiddleware:
+    # Plain ASGI middleware (no BaseHTTPMiddleware task overhead); labels by route template, not raw path
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=path, status=status["code"])
+
+# Ingest
+POLL_TICK_SECONDS = Histogram("ci_poll_tick_seconds", "Duration of one poll tick")
+REPOS_POLLED = Counter("ci_repos_polled_total", "Repos processed by poll ticks", ("outcome",))
+OPEN_RUNS_REFRESHED = Counter("ci_open_runs_refreshed_total", "Fast-lane run refreshes", ("outcome",))
+RUNS_UPSERTED = Counter("ci_runs_upserted_total", "Workflow run rows written", ("op",))
+LOG_BYTES_STORED = Counter("ci_log_bytes_stored_total", "Job log bytes written to storage", ("kind",))
+ANALYTICS_ROWS_EXPORTED = Counter("ci_analytics_rows_exported_total", "Rows written to Parquet partitions", ("table",))
+LOGS_STORED = Counter("ci_logs_stored_total", "Job logs written to storage")
+ALERT_SEND_SECONDS = Histogram("ci_alert_send_seconds", "Slack alert delivery latency", ("result",))
+ALERTS_SUPPRESSED = Counter("ci_alerts_suppressed_total", "Failure alerts not sent", ("reason",))
+DURATION_REGRESSIONS = Counter("ci_duration_regressions_total", "Runs flagged as slower than their workflow's baseline")
+# GitHub
+GITHUB_REQUEST_SECONDS = Histogram("ci_github_request_seconds", "GitHub API call latency", ("endpoint", "status"))
+GITHUB_CIRCUIT_OPEN = Gauge("ci_github_circuit_open", "1 while an endpoint's circuit breaker is open", ("endpoint",))
+GITHUB_CIRCUIT_REJECTED = Counter("ci_github_circuit_rejected_total", "Calls failed fast by an open circuit", ("endpoint",))
+GITHUB_RATE_REMAINING = Gauge("ci_github_rate_limit_remaining", "Last seen X-RateLimit-Remaining", ("source",))
+# API
+EXPORT_ROWS = Counter("ci_export_rows_total", "Rows streamed by /api/export", ("kind", "format"))
+HTTP_REQUEST_SECONDS = Histogram("ci_http_request_seconds", "API handler latency", ("method", "route", "status"))
+# Database
+DB_POOL_CONNECTIONS = Gauge("ci_db_pool_connections", "Pooled connections per engine", ("engine", "state"))
+DB_READS = Counter("ci_db_read_sessions_total", "API read sessions by target database", ("target",))
+DB_REPLICA_LAG_SECONDS = Gauge("ci_db_replica_lag_seconds", "Last measured replay lag per read replica (-1 = unreachable)", ("replica",))
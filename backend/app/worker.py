@@ -0,0 +1,68 @@
+import json, logging, signal
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from .config import settings
+from .database import init_db
+from . import ingestor, procpool, telemetry
+from .admin import check_admin_token
+from .profiling import sampler
+
+log = logging.getLogger("ci.worker")
+
+def _admin(fn):
+    # Same X-Admin-Token switch as the API's /admin routes, for profiling poll_tick in this process
+    def handler(query, headers):
+        if not check_admin_token(headers.get("X-Admin-Token")):
+            return 403, "application/json", b'{"detail":"Admin token required"}'
+        return fn(query)
+    return handler
+
+def _profile(query):
+    snap = sampler.snapshot()
+    if query.get("format") == "folded":
+        return 200, "text/plain; charset=utf-8", snap["folded"].encode()
+    return 200, "application/json", json.dumps(snap).encode()
+
+def _profile_start(query):
+    try:
+        interval_ms, duration_s = float(query.get("interval_ms", 5)), float(query.get("duration_s", 60))
+    except ValueError:
+        interval_ms = duration_s = float("nan")
+    if not (interval_ms > 0 and 0 < duration_s <= 600):
+        return 400, "application/json", b'{"detail":"interval_ms must be > 0 and duration_s in (0, 600]"}'
+    # poll_tick is sync code on scheduler threads, so every sample sees its full stack
+    sampler.start(["poll_tick"], interval_ms=interval_ms, duration_s=duration_s)
+    return _profile({})
+
+def _profile_stop(query):
+    sampler.stop()
+    return _profile({})
+
+ADMIN_ROUTES = {
+    ("GET", "/admin/profile"): _admin(_profile),
+    ("POST", "/admin/profile/start"): _admin(_profile_start),
+    ("POST", "/admin/profile/stop"): _admin(_profile_stop),
+}
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    # Start the pool before any DB connection exists so forked children don't inherit sockets
+    procpool.start(settings.ingest_processes)
+    init_db()
+    ingestor.init_client()
+    if settings.worker_metrics_port:
+        telemetry.serve(settings.worker_metrics_port, ADMIN_ROUTES)
+
+    scheduler = BlockingScheduler()
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.shutdown(wait=False))
+    log.info("worker %s starting (processes=%d)", ingestor.leases.WORKER_ID, settings.ingest_processes)
+    try:
+        ingestor.add_jobs(scheduler)
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        procpool.shutdown()
+
+if __name__ == "__main__":
+    main()
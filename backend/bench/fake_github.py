@@ -0,0 +1,340 @@
+"""Local stand-in for the parts of the GitHub REST API the ingestor uses.
+
+Serves repo discovery, workflow runs, jobs and job logs from deterministic
+synthetic data, with configurable latency, page size and rate limit so
+ingest paths can be exercised without a live GitHub:
+
+    python -m bench.fake_github --repos 1000 --runs-per-repo 200 --latency-ms 20
+
+Point the app at it with GITHUB_API_URL=http://127.0.0.1:<port>.
+
+GitHub App mode is served too: one installation per org under
+/app/installations, and installation tokens from
+/app/installations/{id}/access_tokens that expire after --token-ttl seconds
+(expired tokens get a 401). The app JWT is decoded but not verified, so any
+RS256 key works with GITHUB_APP_ID / GITHUB_APP_PRIVATE_KEY.
+"""
+import argparse, hashlib, json, random, re, threading, time
+import jwt
+from datetime import datetime, timedelta, timezone
+from dateutil import parser as dtparser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, urlencode
+
+CONCLUSIONS = ("success",) * 17 + ("failure",) * 2 + ("cancelled",)
+
+class FakeGitHub:
+    def __init__(self, repos: int = 100, runs_per_repo: int = 100, orgs: int = 10, latency_ms: float = 0.0,
+                 page_size: int = 100, rate_limit: int = 5000, rate_window_s: int = 3600, log_kb: int = 64, seed: int = 1,
+                 token_ttl_s: int = 3600):
+        self.repos = repos
+        self.runs_per_repo = runs_per_repo
+        self.orgs = max(1, orgs)
+        self.latency = latency_ms / 1000.0
+        self.page_size = page_size
+        self.rate_limit = rate_limit
+        self.rate_window_s = rate_window_s
+        self.log_kb = log_kb
+        self.seed = seed
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.extra_runs: Dict[int, int] = {}  # repo index -> runs appended via advance()
+        self._calls: Dict[str, Tuple[int, float]] = {}  # token -> (used, window start)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.graphql_requests = 0
+        self.token_ttl_s = token_ttl_s
+        self._tokens: Dict[str, Tuple[int, float]] = {}  # installation token -> (org index, expires_at epoch)
+        self.tokens_minted = 0
+        self.expired_token_requests = 0
+
+    # ---- data ----
+    def repo_name(self, i: int) -> Tuple[str, str]:
+        return f"org{i % self.orgs}", f"repo{i}"
+
+    def repo_json(self, i: int) -> Dict:
+        owner, name = self.repo_name(i)
+        return {"id": i + 1, "name": name, "full_name": f"{owner}/{name}", "owner": {"login": owner},
+                "default_branch": "main", "fork": i % 10 == 9, "archived": False}
+
+    def _run_count(self, i: int) -> int:
+        return self.runs_per_repo + self.extra_runs.get(i, 0)
+
+    def created_at(self, j: int) -> datetime:
+        return self.now - timedelta(minutes=15 * (self.runs_per_repo - j))
+
+    def run_json(self, i: int, j: int) -> Dict:
+        # j = 0 is the oldest run; newest runs are still in flight
+        rng = random.Random(self.seed * 1_000_003 + i * 10_007 + j)
+        owner, name = self.repo_name(i)
+        count = self._run_count(i)
+        created = self.created_at(j)
+        duration = rng.randint(60, 1800)
+        in_flight = j == count - 1 and rng.random() < 0.3
+        return {
+            "id": (i + 1) * 1_000_000 + j,
+            "name": rng.choice(("CI", "Build", "Deploy")),
+            "head_branch": rng.choice(("main", "main", "main", "develop", f"feature-{j % 7}")),
+            "head_sha": hashlib.sha1(f"{i}:{j // 2}".encode()).hexdigest(),
+            "event": "push",
+            "status": "in_progress" if in_flight else "completed",
+            "conclusion": None if in_flight else rng.choice(CONCLUSIONS),
+            "run_attempt": 1,
+            "created_at": created.isoformat().replace("+00:00", "Z"),
+            "run_started_at": created.isoformat().replace("+00:00", "Z"),
+            "updated_at": (created + timedelta(seconds=duration)).isoformat().replace("+00:00", "Z"),
+            "html_url": f"https://github.com/{owner}/{name}/actions/runs/{(i + 1) * 1_000_000 + j}",
+            "actor": {"login": f"dev{rng.randint(1, 40)}"},
+        }
+
+    def jobs_json(self, run: Dict) -> List[Dict]:
+        started = run["run_started_at"]
+        jobs = []
+        for k, jname in enumerate(("lint", "test", "build")):
+            failed = run["conclusion"] == "failure" and jname == "test"
+            concl = "failure" if failed else ("success" if run["status"] == "completed" else None)
+            steps = [{"name": s, "status": "completed", "conclusion": ("failure" if failed and n == 3 else "success"),
+                      "number": n, "started_at": started, "completed_at": run["updated_at"]}
+                     for n, s in enumerate(("Set up job", "Checkout", f"Run {jname}", "Post"), start=1)]
+            jobs.append({"id": run["id"] * 10 + k, "name": jname, "status": run["status"], "conclusion": concl,
+                         "started_at": started, "completed_at": run["updated_at"], "steps": steps})
+        return jobs
+
+    def log_text(self, job_id: int) -> bytes:
+        lines, size, n = [], 0, 0
+        target = self.log_kb * 1024
+        while size < target:
+            line = f"2024-01-01T00:00:{n % 60:02d}.0000000Z step output line {n} for job {job_id}"
+            lines.append(line)
+            size += len(line) + 1
+            n += 1
+        lines.insert(int(len(lines) * 0.8), "##[error]Process completed with exit code 1.")
+        return ("\n".join(lines) + "\n").encode()
+
+    def probe_json(self, i: int) -> Dict:
+        # GraphQL repository node for GitHubClient.probe_repos: last push + newest check suite on the default branch
+        run = self.run_json(i, self._run_count(i) - 1)
+        done = run["status"] == "completed"
+        return {"pushedAt": run["created_at"], "defaultBranchRef": {"target": {"oid": run["head_sha"], "checkSuites": {"nodes": [
+            {"status": "COMPLETED" if done else "IN_PROGRESS", "conclusion": (run["conclusion"] or "").upper() or None,
+             "updatedAt": run["updated_at"] if done else run["created_at"]}]}}}}
+
+    # ---- GitHub App ----
+    def installation_json(self, org: int) -> Dict:
+        return {"id": org + 1, "account": {"login": f"org{org}", "type": "Organization"}, "app_id": 1}
+
+    def mint_token(self, installation_id: int) -> Optional[Dict]:
+        org = installation_id - 1
+        if not 0 <= org < self.orgs:
+            return None
+        with self._lock:
+            self.tokens_minted += 1
+            token = f"ghs_{installation_id}_{self.tokens_minted}"
+            expires = time.time() + self.token_ttl_s
+            self._tokens[token] = (org, expires)
+        return {"token": token, "expires_at": datetime.fromtimestamp(int(expires), timezone.utc).isoformat().replace("+00:00", "Z")}
+
+    def token_org(self, token: str) -> Tuple[bool, Optional[int]]:
+        # (valid, org index); tokens this fake didn't mint are PATs: valid, all repos
+        if token not in self._tokens:
+            return True, None
+        org, expires = self._tokens[token]
+        if time.time() >= expires:
+            with self._lock:
+                self.expired_token_requests += 1
+            return False, org
+        return True, org
+
+    def find_repo(self, owner: str, name: str) -> Optional[int]:
+        m = re.fullmatch(r"repo(\d+)", name)
+        if not m:
+            return None
+        i = int(m.group(1))
+        return i if i < self.repos and self.repo_name(i)[0] == owner else None
+
+    def advance(self, repos: int):
+        # Simulate CI activity: append one new run to the first `repos` repos
+        with self._lock:
+            for i in range(min(repos, self.repos)):
+                self.extra_runs[i] = self.extra_runs.get(i, 0) + 1
+
+    # ---- rate limit ----
+    def charge(self, token: str) -> Tuple[bool, int, int]:
+        with self._lock:
+            self.requests += 1
+            used, start = self._calls.get(token, (0, time.time()))
+            if time.time() - start >= self.rate_window_s:
+                used, start = 0, time.time()
+            ok = used < self.rate_limit
+            if ok:
+                used += 1
+            self._calls[token] = (used, start)
+            return ok, self.rate_limit - used, int(start + self.rate_window_s)
+
+def make_handler(gh: FakeGitHub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, ctype: str = "application/json", headers: Dict[str, str] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _page(self, items: List, page: int, per_page: int, base: str, params: Dict[str, str]) -> Tuple[List, Dict[str, str]]:
+            start = (page - 1) * per_page
+            headers = {}
+            if start + per_page < len(items):
+                q = urlencode({**params, "per_page": per_page, "page": page + 1})
+                headers["Link"] = f'<http://{self.headers.get("Host")}{base}?{q}>; rel="next"'
+            return items[start:start + per_page], headers
+
+        def _json(self, obj, headers: Dict[str, str]):
+            body = json.dumps(obj).encode()
+            etag = 'W/"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, b"", headers={**headers, "ETag": etag})
+            self._send(200, body, headers={**headers, "ETag": etag})
+
+        def _app_jwt_ok(self) -> bool:
+            # App endpoints take the app JWT, not a token; shape and expiry are checked, the signature isn't
+            try:
+                claims = jwt.decode((self.headers.get("Authorization") or "").split(" ")[-1],
+                                    options={"verify_signature": False, "require": ["iat", "exp", "iss"]})
+            except jwt.PyJWTError:
+                return False
+            return claims["exp"] > time.time()
+
+        def do_POST(self):
+            m = re.fullmatch(r"/app/installations/(\d+)/access_tokens", self.path)
+            if m:
+                if not self._app_jwt_ok():
+                    return self._send(401, b'{"message":"A JSON web token could not be decoded"}')
+                token = gh.mint_token(int(m.group(1)))
+                return self._send(201, json.dumps(token).encode()) if token else self._send(404, b'{"message":"Not Found"}')
+            if self.path.startswith("/_admin/advance"):
+                q = parse_qs(urlparse(self.path).query)
+                gh.advance(int(q.get("repos", ["1"])[0]))
+                return self._send(200, b"{}")
+            if self.path == "/graphql":
+                return self._graphql()
+            self._send(404, b'{"message":"Not Found"}')
+
+        def _graphql(self):
+            # Only the probe query: aliases r0..rN with owner/name passed as $o0/$n0 .. $oN/$nN
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            variables = payload.get("variables") or {}
+            ok, remaining, reset = gh.charge("graphql:" + (self.headers.get("Authorization") or ""))
+            rate = {"X-RateLimit-Resource": "graphql", "X-RateLimit-Remaining": str(max(0, remaining)), "X-RateLimit-Reset": str(reset)}
+            if not gh.token_org((self.headers.get("Authorization") or "").split(" ")[-1])[0]:
+                return self._send(401, b'{"message":"Bad credentials"}', headers=rate)
+            if not ok:
+                return self._send(403, b'{"message":"API rate limit exceeded"}', headers=rate)
+            data, errors, k = {}, [], 0
+            while f"o{k}" in variables:
+                i = gh.find_repo(variables[f"o{k}"], variables[f"n{k}"])
+                data[f"r{k}"] = gh.probe_json(i) if i is not None else None
+                if i is None:
+                    errors.append({"type": "NOT_FOUND", "path": [f"r{k}"], "message": "Could not resolve to a Repository"})
+                k += 1
+            gh.graphql_requests += 1
+            body = {"data": data, **({"errors": errors} if errors else {})}
+            self._send(200, json.dumps(body).encode(), headers=rate)
+
+        def do_GET(self):
+            if gh.latency:
+                time.sleep(gh.latency)
+            token = (self.headers.get("Authorization") or "").split(" ")[-1]
+            ok, remaining, reset = gh.charge(token)
+            rate = {"X-RateLimit-Limit": str(gh.rate_limit), "X-RateLimit-Remaining": str(max(0, remaining)), "X-RateLimit-Reset": str(reset)}
+            if not ok:
+                return self._send(403, b'{"message":"API rate limit exceeded"}', headers=rate)
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            per_page = min(int(q.get("per_page", gh.page_size)), gh.page_size)
+            page = int(q.get("page", 1))
+            path = url.path
+
+            if path == "/app/installations":
+                if not self._app_jwt_ok():
+                    return self._send(401, b'{"message":"A JSON web token could not be decoded"}')
+                items, headers = self._page([gh.installation_json(k) for k in range(gh.orgs)], page, per_page, path, {})
+                return self._json(items, headers)
+            valid, org = gh.token_org(token)
+            if not valid:
+                return self._send(401, b'{"message":"Bad credentials"}', headers=rate)
+
+            if path in ("/user/repos", "/installation/repositories"):
+                # An installation token sees its own org's repos only
+                repos = [gh.repo_json(i) for i in range(gh.repos) if org is None or i % gh.orgs == org]
+                items, headers = self._page(repos, page, per_page, path,
+                                            {k: v for k, v in q.items() if k not in ("page", "per_page")})
+                body = {"total_count": len(repos), "repositories": items} if path.startswith("/installation") else items
+                return self._json(body, {**rate, **headers})
+
+            m = re.fullmatch(r"/repos/([^/]+)/([^/]+)/actions/(runs|runs/(\d+)/jobs|runs/(\d+)|jobs/(\d+)/logs)", path)
+            i = gh.find_repo(m.group(1), m.group(2)) if m else None
+            if i is None:
+                return self._send(404, b'{"message":"Not Found"}', headers=rate)
+            kind = m.group(3)
+            if kind == "runs":
+                count = gh._run_count(i)
+                newest_first = list(range(count - 1, -1, -1))
+                if "created" in q:
+                    # ">=A" or "A..B" (inclusive), as GitHub's search-style date qualifier
+                    lo, _, hi = q["created"].lstrip(">=").partition("..")
+                    lo, hi = dtparser.parse(lo), dtparser.parse(hi) if hi else None
+                    newest_first = [j for j in newest_first if gh.created_at(j) >= lo and (hi is None or gh.created_at(j) <= hi)]
+                idx, headers = self._page(newest_first, page, per_page, path,
+                                          {k: v for k, v in q.items() if k not in ("page", "per_page")})
+                runs = [gh.run_json(i, j) for j in idx]
+                return self._json({"total_count": count, "workflow_runs": runs}, {**rate, **headers})
+            if m.group(4) or m.group(5):
+                run_id = int(m.group(4) or m.group(5))
+                j = run_id - (i + 1) * 1_000_000
+                if not 0 <= j < gh._run_count(i):
+                    return self._send(404, b'{"message":"Not Found"}', headers=rate)
+                run = gh.run_json(i, j)
+                if m.group(5):
+                    return self._json(run, rate)
+                jobs = gh.jobs_json(run)
+                return self._json({"total_count": len(jobs), "jobs": jobs}, rate)
+            return self._send(200, gh.log_text(int(m.group(6))), ctype="text/plain", headers=rate)
+
+    return Handler
+
+def start(gh: FakeGitHub, port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(gh))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-github", daemon=True).start()
+    return server
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--port", type=int, default=9010)
+    ap.add_argument("--repos", type=int, default=100)
+    ap.add_argument("--runs-per-repo", type=int, default=100)
+    ap.add_argument("--orgs", type=int, default=10)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--page-size", type=int, default=100)
+    ap.add_argument("--rate-limit", type=int, default=5000)
+    ap.add_argument("--log-kb", type=int, default=64)
+    ap.add_argument("--token-ttl", type=int, default=3600, help="installation token lifetime in seconds")
+    args = ap.parse_args()
+    gh = FakeGitHub(args.repos, args.runs_per_repo, args.orgs, args.latency_ms, args.page_size, args.rate_limit, log_kb=args.log_kb,
+                    token_ttl_s=args.token_ttl)
+    server = start(gh, args.port)
+    print(f"fake GitHub API on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
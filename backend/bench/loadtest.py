@@ -0,0 +1,162 @@
+"""Replay dashboard traffic against a running API and check latency budgets.
+
+    python -m bench.seed --reset --runs 1000000          # seed the API's database
+    python -m bench.loadtest --base-url http://localhost:8080 --tabs 200 --duration 120
+
+Each simulated tab behaves like frontend/src/pages/Dashboard.tsx: load
+/api/repos once, then on every auto-refresh fetch overview, timeseries and
+runs for its repo in parallel; now and then it opens the run-details modal
+(/api/runs/{id}/jobs, then the first failed job's excerpt). Reports throughput
+and p50/p95/p99 per route and exits non-zero when a route exceeds its budget
+or the error rate is too high.
+"""
+import argparse, json, random, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from bench.run import percentiles
+
+# Per-route latency budgets in ms (override with --budgets file.json)
+DEFAULT_BUDGETS: Dict[str, Dict[str, float]] = {
+    "/api/repos": {"p95_ms": 100, "p99_ms": 250},
+    "/api/metrics/overview": {"p95_ms": 250, "p99_ms": 500},
+    "/api/metrics/timeseries": {"p95_ms": 250, "p99_ms": 500},
+    "/api/metrics/reliability": {"p95_ms": 100, "p99_ms": 250},
+    "/api/runs": {"p95_ms": 200, "p99_ms": 400},
+    "/api/runs/{run_id}/jobs": {"p95_ms": 100, "p99_ms": 250},
+    "/api/jobs/{job_id}/excerpt": {"p95_ms": 100, "p99_ms": 250},
+}
+WINDOWS = (7, 7, 7, 7, 30, 30, 90, 365)
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def call(self, session: requests.Session, base: str, route: str, path: str, params: Dict = None) -> Optional[requests.Response]:
+        start = time.perf_counter()
+        resp = None
+        try:
+            resp = session.get(base + path, params=params, timeout=30)
+            ok = resp.status_code < 500 and resp.status_code != 429
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples.setdefault(route, []).append(elapsed)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return resp if ok else None
+
+class Tab(threading.Thread):
+    def __init__(self, n: int, args, rec: Recorder, fanout: ThreadPoolExecutor, deadline: float):
+        super().__init__(name=f"tab-{n}", daemon=True)
+        self.args, self.rec, self.fanout, self.deadline = args, rec, fanout, deadline
+        self.rng = random.Random(n)
+        self.session = requests.Session()
+
+    def run(self):
+        base = self.args.base_url.rstrip("/")
+        self.pause(self.rng.uniform(0, self.args.refresh))  # tabs were opened at different times
+        if time.monotonic() >= self.deadline:
+            return
+        resp = self.rec.call(self.session, base, "/api/repos", "/api/repos")
+        repos = [r["full_name"] for r in (resp.json() if resp is not None else [])] or [None]
+        # Most people watch a handful of busy repos
+        repo = repos[min(len(repos) - 1, int(self.rng.paretovariate(1.2)) - 1)]
+        window = self.rng.choice(WINDOWS)
+        while time.monotonic() < self.deadline:
+            params = {"repo": repo, "branch": "", "windowDays": window}
+            calls = [
+                self.fanout.submit(self.rec.call, self.session, base, "/api/metrics/overview", "/api/metrics/overview", params),
+                self.fanout.submit(self.rec.call, self.session, base, "/api/metrics/timeseries", "/api/metrics/timeseries", params),
+                self.fanout.submit(self.rec.call, self.session, base, "/api/runs", "/api/runs", {"repo": repo, "branch": "", "limit": 50}),
+            ]
+            if self.args.reliability:
+                calls.append(self.fanout.submit(self.rec.call, self.session, base, "/api/metrics/reliability", "/api/metrics/reliability", {"repo": repo}))
+            runs_resp = calls[2].result()
+            for c in calls:
+                c.result()
+            if runs_resp is not None and self.rng.random() < self.args.log_open_rate:
+                self.open_run(base, runs_resp.json())
+            self.pause(self.args.refresh * self.rng.uniform(0.9, 1.1))
+
+    def pause(self, seconds: float):
+        time.sleep(max(0.0, min(seconds, self.deadline - time.monotonic())))
+
+    def open_run(self, base: str, runs: List[Dict]):
+        if not runs:
+            return
+        failed = [r for r in runs if r.get("conclusion") == "failure"]
+        run = self.rng.choice(failed or runs)
+        resp = self.rec.call(self.session, base, "/api/runs/{run_id}/jobs", f"/api/runs/{run['id']}/jobs")
+        jobs = resp.json() if resp is not None else []
+        job = next((j for j in jobs if j.get("conclusion") == "failure"), None)
+        if job:
+            self.rec.call(self.session, base, "/api/jobs/{job_id}/excerpt", f"/api/jobs/{job['id']}/excerpt")
+
+def evaluate(rec: Recorder, duration: float, budgets: Dict[str, Dict[str, float]], max_error_rate: float) -> Tuple[Dict, bool]:
+    report, passed = {}, True
+    for route, samples in sorted(rec.samples.items()):
+        stats = percentiles(samples)
+        errors = rec.errors.get(route, 0)
+        stats.update({"rps": round(len(samples) / duration, 2), "errors": errors})
+        budget = budgets.get(route, {})
+        violations = [f"{k} {stats[k]} > {v}" for k, v in budget.items() if stats.get(k, 0) > v]
+        if samples and errors / len(samples) > max_error_rate:
+            violations.append(f"error rate {errors}/{len(samples)} > {max_error_rate}")
+        stats.update({"budget": budget, "violations": violations})
+        passed = passed and not violations
+        report[route] = stats
+    return report, passed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--base-url", default="http://localhost:8080")
+    ap.add_argument("--tabs", type=int, default=50, help="concurrent dashboard tabs")
+    ap.add_argument("--duration", type=float, default=60, help="seconds")
+    ap.add_argument("--refresh", type=float, default=30, help="auto-refresh interval per tab (UI default 30s)")
+    ap.add_argument("--log-open-rate", type=float, default=0.1, help="chance per refresh of opening a run's jobs + failure excerpt")
+    ap.add_argument("--reliability", action="store_true", help="also hit /api/metrics/reliability on refresh")
+    ap.add_argument("--budgets", help="JSON file of {route: {p95_ms, p99_ms}} overriding the defaults")
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--output", help="write JSON here (default: stdout)")
+    args = ap.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets.update(json.load(f))
+
+    rec = Recorder()
+    start = time.monotonic()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(max_workers=max(4, args.tabs * 3)) as fanout:
+        tabs = [Tab(n, args, rec, fanout, deadline) for n in range(args.tabs)]
+        for t in tabs:
+            t.start()
+        for t in tabs:
+            t.join()
+    elapsed = time.monotonic() - start
+
+    routes, passed = evaluate(rec, elapsed, budgets, args.max_error_rate)
+    total = sum(len(s) for s in rec.samples.values())
+    report = {"meta": {"base_url": args.base_url, "tabs": args.tabs, "duration_s": round(elapsed, 2), "refresh_s": args.refresh},
+              "total": {"requests": total, "rps": round(total / elapsed, 2), "errors": sum(rec.errors.values())},
+              "routes": routes, "passed": passed}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for route, stats in routes.items():
+        for v in stats["violations"]:
+            print(f"BUDGET EXCEEDED {route}: {v}", file=sys.stderr)
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
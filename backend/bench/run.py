@@ -0,0 +1,199 @@
+"""Benchmarks for the ingest and read hot paths, reported as JSON.
+
+    python -m bench.run --database-url postgresql://ci:ci@localhost:5432/ci_bench \\
+        --reset --seed-runs 1000000 --output bench.json
+
+Starts bench.fake_github in-process, optionally seeds synthetic history,
+then measures:
+  * discovery and poll_tick throughput against the fake API (cold, then warm)
+  * get_overview / timeseries_counts / list_runs latency percentiles
+  * stored job log read latency
+
+With --app the ingest phases authenticate as a GitHub App (a throwaway RSA
+key, one installation per fake org). Installation tokens live just past the
+300 s refresh margin, so they are re-minted every few seconds during the run.
+"""
+import argparse, asyncio, json, os, platform, statistics, sys, tempfile, time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    xs = sorted(samples)
+    if not xs:
+        return {"n": 0}
+    def pct(p):
+        return xs[min(len(xs) - 1, max(0, int(round(p / 100.0 * len(xs) + 0.5)) - 1))] * 1000
+    return {"n": len(xs), "mean_ms": round(statistics.fmean(xs) * 1000, 3), "p50_ms": round(pct(50), 3),
+            "p95_ms": round(pct(95), 3), "p99_ms": round(pct(99), 3), "max_ms": round(xs[-1] * 1000, 3)}
+
+def timed(fn: Callable, iterations: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+def bench_ingest(fake, poll_repos: int) -> Dict:
+    from sqlalchemy import update, func
+    from app.database import SessionLocal
+    from app import ingestor, models
+
+    db = SessionLocal()
+    out = {}
+    try:
+        ingestor.init_client()
+        for phase in ("discovery_cold", "discovery_warm"):
+            start, before = time.perf_counter(), fake.requests
+            ingestor.discover_and_sync_repos()
+            out[phase] = {"seconds": round(time.perf_counter() - start, 3), "github_requests": fake.requests - before}
+
+        # Poll only the first poll_repos repos so a bench run stays bounded
+        keep = [r.id for r in db.query(models.Repo.id).filter(models.Repo.is_active == True).order_by(models.Repo.id).limit(poll_repos)]
+        db.execute(update(models.Repo).where(models.Repo.id.notin_(keep)).values(is_active=False))
+        db.commit()
+
+        for phase in ("poll_cold", "poll_warm"):
+            if phase == "poll_warm":
+                fake.advance(len(keep) // 4)
+            db.execute(update(models.RepoLease).values(next_poll_at=None, leased_until=None, worker_id=None))
+            db.commit()
+            runs_before = db.query(func.count(models.WorkflowRun.id)).scalar()
+            start, before, gql_before, ticks = time.perf_counter(), fake.requests, fake.graphql_requests, 0
+            while True:
+                ticks += 1
+                ingestor.poll_tick()
+                due = db.query(func.count(models.RepoLease.repo_id)).filter(models.RepoLease.next_poll_at == None).scalar()
+                db.commit()
+                if not due:
+                    break
+            secs = time.perf_counter() - start
+            new_runs = db.query(func.count(models.WorkflowRun.id)).scalar() - runs_before
+            out[phase] = {"seconds": round(secs, 3), "ticks": ticks, "repos": len(keep),
+                          "repos_per_sec": round(len(keep) / secs, 2), "new_runs": new_runs,
+                          "github_requests": fake.requests - before, "graphql_requests": fake.graphql_requests - gql_before}
+    finally:
+        db.close()
+    return out
+
+async def atimed(fn: Callable, iterations: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+async def bench_reads(iterations: int) -> Dict:
+    from sqlalchemy import func, select
+    from app.database import AsyncSessionLocal
+    from app import models, routes
+    from app.metrics import get_overview, timeseries_counts
+
+    out = {}
+    async with AsyncSessionLocal() as db:
+        busiest = (await db.execute(select(models.Repo.full_name).join(models.WorkflowRun)
+                                    .group_by(models.Repo.full_name).order_by(func.count(models.WorkflowRun.id).desc()).limit(1))).first()
+        repo = busiest[0] if busiest else None
+        for scope, repo_full in (("all", None), ("repo", repo)):
+            for days in (7, 30, 365):
+                out[f"overview.{scope}.{days}d"] = await atimed(lambda: get_overview(db, repo_full, None, days), iterations)
+                out[f"timeseries.{scope}.{days}d"] = await atimed(lambda: timeseries_counts(db, repo_full, None, days), iterations)
+            out[f"list_runs.{scope}.50"] = await atimed(lambda: routes.list_runs(repo=repo_full, branch=None, limit=50, db=db), iterations)
+            out[f"list_runs.{scope}.500"] = await atimed(lambda: routes.list_runs(repo=repo_full, branch=None, limit=500, db=db), iterations)
+            await db.rollback()
+    return out
+
+def bench_logs(iterations: int) -> Dict:
+    from app.database import SessionLocal
+    from app import models
+    from app.logs import read_job_log_text
+
+    db = SessionLocal()
+    try:
+        paths = [p for (p,) in db.query(models.RunLog.path).filter(models.RunLog.path != None).limit(200)]
+    finally:
+        db.close()
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return {}
+    it = iter(paths * (iterations // len(paths) + 1))
+    return {"read_job_log_text.2MB": timed(lambda: read_job_log_text(next(it), max_bytes=2_000_000), iterations)}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    ap.add_argument("--output", help="write JSON here (default: stdout)")
+    ap.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    ap.add_argument("--seed-repos", type=int, default=1000)
+    ap.add_argument("--seed-runs", type=int, default=0, help="synthetic runs to generate (0 = use existing data)")
+    ap.add_argument("--seed-logs", type=int, default=200)
+    ap.add_argument("--poll-repos", type=int, default=100)
+    ap.add_argument("--runs-per-repo", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="fake GitHub per-request latency")
+    ap.add_argument("--iterations", type=int, default=30)
+    ap.add_argument("--skip", default="", help="comma-separated: ingest,reads,logs")
+    ap.add_argument("--app", action="store_true", help="authenticate as a GitHub App against the fake's token endpoint")
+    ap.add_argument("--token-ttl", type=int, default=305, help="installation token lifetime in --app mode (seconds)")
+    args = ap.parse_args()
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+
+    from bench.fake_github import FakeGitHub, start
+    fake = FakeGitHub(repos=args.seed_repos, runs_per_repo=args.runs_per_repo, orgs=20, latency_ms=args.latency_ms, rate_limit=10**9,
+                      token_ttl_s=args.token_ttl)
+    server = start(fake)
+    # app.config reads the environment at import time
+    os.environ["GITHUB_API_URL"] = f"http://127.0.0.1:{server.server_port}"
+    if args.app:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        os.environ["GITHUB_APP_ID"] = "1"
+        os.environ["GITHUB_APP_PRIVATE_KEY"] = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                                 serialization.NoEncryption()).decode()
+    os.environ.setdefault("GITHUB_TOKEN", "bench")
+    os.environ.setdefault("ALERTS_ENABLED", "false")
+    os.environ.setdefault("LOG_DIR", os.path.join(tempfile.gettempdir(), "ci-bench-logs"))
+    os.environ.setdefault("POLL_BATCH_SIZE", "50")
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from app.database import Base, SessionLocal, engine, init_db
+    from app import models  # noqa: F401
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    init_db()
+
+    report = {"meta": {"started_at": datetime.utcnow().isoformat(), "python": platform.python_version(),
+                       "database": engine.dialect.name, "args": vars(args)}}
+    if args.seed_runs:
+        from bench.seed import seed
+        db = SessionLocal()
+        try:
+            report["seed"] = seed(db, args.seed_repos, args.seed_runs, 365, 0.12, args.seed_logs)
+        finally:
+            db.close()
+    if "ingest" not in skip:
+        report["ingest"] = bench_ingest(fake, args.poll_repos)
+        if args.app:
+            report["ingest"]["github_app"] = {"installations": fake.orgs, "tokens_minted": fake.tokens_minted,
+                                              "expired_token_requests": fake.expired_token_requests}
+    if "reads" not in skip:
+        report["reads"] = asyncio.run(bench_reads(args.iterations))
+    if "logs" not in skip:
+        report["logs"] = bench_logs(args.iterations)
+    server.shutdown()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
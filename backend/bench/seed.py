@@ -0,0 +1,121 @@
+"""Fill a database with synthetic CI history for benchmarks.
+
+    python -m bench.seed --database-url postgresql://ci:ci@localhost:5432/ci_bench --repos 1000 --runs 2000000
+
+Uses COPY on Postgres (falls back to batched INSERTs elsewhere). Data is
+deterministic for a given --seed.
+"""
+import argparse, csv, io, os, random, sys, time
+from datetime import datetime, timedelta
+
+WORKFLOWS = ("CI", "Build", "Deploy", "Lint", "Release")
+BRANCHES = ("main",) * 6 + ("develop",) * 2 + tuple(f"feature-{i}" for i in range(8))
+
+RUN_COLUMNS = ("id", "repo_id", "workflow_name", "head_branch", "head_sha", "event", "status", "conclusion",
+               "started_at", "completed_at", "duration_secs", "url", "actor", "created_at")
+JOB_COLUMNS = ("id", "run_id", "name", "status", "conclusion", "started_at", "completed_at", "duration_secs")
+RUN_ID_BASE = 5_000_000_000  # clear of the ids bench.fake_github hands out
+
+def _copy(db, table: str, columns, rows):
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        from sqlalchemy import text
+        stmt = text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})")
+        db.execute(stmt, [dict(zip(columns, r)) for r in rows])
+        return
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for r in rows:
+        w.writerow(["\\N" if v is None else (v.isoformat() if isinstance(v, datetime) else v) for v in r])
+    buf.seek(0)
+    cur = db.connection().connection.cursor()
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+
+def seed(db, repos: int, runs: int, days: int, failure_rate: float, logs: int, seed_value: int = 1, batch: int = 50_000) -> dict:
+    from app import models
+    from app.config import settings
+    from app.logs import extract_excerpt, store_job_log_gz
+    from bench.fake_github import FakeGitHub
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow().replace(microsecond=0)
+    t0 = time.perf_counter()
+
+    repo_rows = [{"owner": f"org{i % 20}", "name": f"repo{i}", "full_name": f"org{i % 20}/repo{i}",
+                  "default_branch": "main", "is_active": True} for i in range(repos)]
+    db.execute(models.Repo.__table__.insert(), repo_rows)
+    repo_ids = [r.id for r in db.query(models.Repo.id).order_by(models.Repo.id).all()]
+    # A few busy repos and a long tail, like a real org
+    weights = [1.0 / (k + 1) ** 0.8 for k in range(len(repo_ids))]
+
+    failed_runs = []
+    written = 0
+    while written < runs:
+        n = min(batch, runs - written)
+        picked = rng.choices(repo_ids, weights=weights, k=n)
+        rows = []
+        for k in range(n):
+            run_id = RUN_ID_BASE + written + k
+            started = now - timedelta(seconds=rng.randint(0, days * 86400))
+            duration = max(30.0, rng.gauss(600, 240))
+            r = rng.random()
+            conclusion = "failure" if r < failure_rate else ("cancelled" if r < failure_rate + 0.03 else "success")
+            rows.append((run_id, picked[k], rng.choice(WORKFLOWS), rng.choice(BRANCHES), f"{rng.getrandbits(160):040x}",
+                         "push", "completed", conclusion, started, started + timedelta(seconds=duration), duration,
+                         f"https://github.com/x/y/actions/runs/{run_id}", f"dev{rng.randint(1, 60)}", started))
+            if conclusion == "failure" and len(failed_runs) < max(logs, 1000):
+                failed_runs.append((run_id, started, duration))
+        _copy(db, "workflow_runs", RUN_COLUMNS, rows)
+        db.commit()
+        written += n
+        print(f"  runs {written}/{runs}", file=sys.stderr)
+
+    # Jobs for some failed runs, each failed job with its excerpt, and stored logs for the first `logs` of them
+    fake = FakeGitHub(log_kb=256)
+    job_rows, log_paths, excerpts = [], [], []
+    for idx, (run_id, started, duration) in enumerate(failed_runs):
+        for k, name in enumerate(("lint", "test", "build")):
+            job_id = run_id * 10 + k
+            concl = "failure" if name == "test" else "success"
+            job_rows.append((job_id, run_id, name, "completed", concl, started, started + timedelta(seconds=duration / 3), duration / 3))
+            if concl == "failure":
+                text = fake.log_text(job_id)
+                excerpts.append({"job_id": job_id, "step_name": "Run tests", "step_number": 3, "created_at": now,
+                                 **extract_excerpt(text, settings.excerpt_tail_lines, settings.excerpt_context_lines)})
+                if idx < logs:
+                    log_paths.append((job_id, store_job_log_gz("bench", "seed", run_id, job_id, text)))
+    _copy(db, "workflow_jobs", JOB_COLUMNS, job_rows)
+    if excerpts:
+        db.execute(models.FailureExcerpt.__table__.insert(), excerpts)
+    if log_paths:
+        db.execute(models.RunLog.__table__.insert(), [{"job_id": j, "storage": "disk", "path": p, "size_bytes": os.path.getsize(p)} for j, p in log_paths])
+    db.commit()
+    return {"repos": repos, "runs": runs, "jobs": len(job_rows), "excerpts": len(excerpts), "logs": len(log_paths), "seconds": round(time.perf_counter() - t0, 2)}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    ap.add_argument("--repos", type=int, default=1000)
+    ap.add_argument("--runs", type=int, default=1_000_000)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--failure-rate", type=float, default=0.12)
+    ap.add_argument("--logs", type=int, default=200, help="failed jobs that get a stored log")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    args = ap.parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from app.database import Base, SessionLocal, engine, init_db
+    if args.reset:
+        from app import models  # noqa: F401
+        Base.metadata.drop_all(bind=engine)
+    init_db()
+    db = SessionLocal()
+    try:
+        print(seed(db, args.repos, args.runs, args.days, args.failure_rate, args.logs, args.seed))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
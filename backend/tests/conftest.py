@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app import models
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+@pytest.fixture
+def db():
+    # The state machines only need the ORM and ON CONFLICT; SQLite stands in for Postgres
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+@pytest.fixture
+def repo(db):
+    r = models.Repo(owner="acme", name="api", full_name="acme/api", default_branch="main")
+    db.add(r)
+    db.commit()
+    return r
+
+def make_run(db, repo, run_id, conclusion="success", started=0, minutes=10, branch="main", workflow="CI",
+             sha=None, attempt=1, status="completed"):
+    """Add a run that started `started` minutes after T0 and took `minutes`."""
+    started_at = T0 + timedelta(minutes=started)
+    completed_at = started_at + timedelta(minutes=minutes) if status == "completed" else None
+    run = models.WorkflowRun(id=run_id, repo_id=repo.id, workflow_name=workflow, head_branch=branch,
+                             head_sha=sha or f"sha{run_id}", status=status,
+                             conclusion=conclusion if status == "completed" else None,
+                             started_at=started_at, completed_at=completed_at,
+                             duration_secs=minutes * 60.0 if completed_at else None, run_attempt=attempt)
+    db.merge(run)
+    db.flush()
+    return db.get(models.WorkflowRun, run_id)
+
+class FakeGitHub:
+    """Serves one run's jobs and a queue of run listings; log downloads fail (they're optional on every path)."""
+    name, rate_remaining, rate_reset = "fake", None, None
+
+    def __init__(self, jobs=(), pages=()):
+        self.jobs = list(jobs)
+        self.job_lists = 0
+        self.pages = list(pages)
+        self.urls = []
+
+    def has_budget(self, reserve=0):
+        return True
+
+    def runs_url(self, owner, name, created=None):
+        return f"/repos/{owner}/{name}/actions/runs?created={created}"
+
+    def get_page_conditional(self, url, etag=None):
+        self.urls.append(url)
+        return 200, None, {"workflow_runs": self.pages.pop(0) if self.pages else []}, None
+
+    def list_jobs_for_run(self, owner, name, run_id):
+        self.job_lists += 1
+        return {"jobs": self.jobs}
+
+    def download_job_log(self, owner, name, job_id):
+        raise requests.ConnectionError("no logs here")
+
+def api_run(run_id, conclusion="failure", status="completed", created="2024-01-01T12:00:00Z", updated="2024-01-01T12:10:00Z"):
+    return {"id": run_id, "name": "CI", "head_branch": "main", "head_sha": f"sha{run_id}", "event": "push",
+            "status": status, "conclusion": conclusion if status == "completed" else None, "run_attempt": 1,
+            "created_at": created, "run_started_at": created, "updated_at": updated,
+            "html_url": f"https://github.com/acme/api/actions/runs/{run_id}"}
@@ -0,0 +1,58 @@
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import backfill, ingestor, models
+
+from .conftest import FakeGitHub, api_run
+
+@pytest.fixture
+def gh(db, monkeypatch):
+    client = FakeGitHub([{"id": 21, "name": "test", "status": "completed", "conclusion": "failure", "run_attempt": 1}])
+    monkeypatch.setattr(ingestor, "client_for", lambda repo: client)
+    monkeypatch.setattr(backfill, "SessionLocal", sessionmaker(bind=db.get_bind(), autoflush=False))
+    monkeypatch.setattr(ingestor.settings, "alerts_enabled", False)
+    return client
+
+def poll(db, repo, *runs):
+    for run in runs:
+        ingestor.upsert_run(db, repo, run)
+    repo.last_checked_at = datetime(2024, 1, 1, 12, 30)
+    db.commit()
+
+def test_history_starts_below_what_live_polling_owns(db, repo, gh):
+    poll(db, repo, api_run(1, "success", created="2024-01-01T12:00:00Z"),
+         api_run(2, status="in_progress", created="2024-01-01T12:20:00Z"))
+    assert backfill.live_horizon(db, repo) == datetime(2024, 1, 1, 12, 0)
+
+    gh.pages = [[api_run(0, "success", created="2023-12-31T12:00:00Z", updated="2023-12-31T12:10:00Z")]]
+    backfill.backfill_repo(repo.id, datetime(2023, 12, 30), False, threading.Event())
+    assert gh.urls[0].endswith("..2024-01-01T12:00:00Z")
+    assert db.get(models.WorkflowRun, 0).status == "completed"
+
+def test_run_seen_by_backfill_and_poller_completes_once(db, repo, gh):
+    poll(db, repo, api_run(1, "success", created="2024-01-01T12:00:00Z"),
+         api_run(2, status="in_progress", created="2024-01-01T12:20:00Z"))
+    done = api_run(2, "failure", created="2024-01-01T12:20:00Z", updated="2024-01-01T12:40:00Z")
+    # The backfill gets there first (e.g. a window boundary); it must leave the completion to the poller
+    gh.pages = [[done]]
+    backfill.backfill_repo(repo.id, datetime(2023, 12, 30), False, threading.Event())
+    db.expire_all()
+    assert db.get(models.WorkflowRun, 2).status == "in_progress"
+
+    poll(db, repo, done)
+    poll(db, repo, done)  # and again on the next tick
+    state = db.query(models.BranchReliability).one()
+    assert (state.runs_total, state.failures_total) == (2, 1)
+    assert gh.job_lists == 1
+    assert db.get(models.WorkflowJob, 21) is not None
+    assert db.query(models.OpenRun).count() == 0
+
+def test_backfill_still_refreshes_completed_runs(db, repo, gh):
+    poll(db, repo, api_run(1, "success", created="2024-01-01T12:00:00Z"))
+    gh.pages = [[{**api_run(1, "success", created="2024-01-01T12:00:00Z"), "html_url": "https://example/1"}]]
+    backfill.backfill_repo(repo.id, datetime(2023, 12, 30), False, threading.Event())
+    db.expire_all()
+    assert db.get(models.WorkflowRun, 1).url == "https://example/1"
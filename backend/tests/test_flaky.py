@@ -0,0 +1,52 @@
+from app import flaky, models
+
+from .conftest import make_run
+
+def add_job(db, run, job_id, name, conclusion):
+    db.add(models.WorkflowJob(id=job_id, run_id=run.id, name=name, status="completed", conclusion=conclusion,
+                              run_attempt=run.run_attempt))
+    db.flush()
+
+def stat(db, repo, job=""):
+    return db.query(models.FlakyStat).filter_by(repo_id=repo.id, workflow_name="CI", job_name=job).one()
+
+def test_failure_then_pass_on_same_commit_is_flaky(db, repo):
+    failed = make_run(db, repo, 1, "failure", sha="abc")
+    add_job(db, failed, 11, "test", "failure")
+    add_job(db, failed, 12, "lint", "success")
+    flaky.record(db, failed)
+    # The re-run updates the same row in place, unflushed, as the ingestor does; jobs aren't fetched for passing runs
+    failed.run_attempt, failed.conclusion = 2, "success"
+    flaky.record(db, failed)
+
+    for job in ("", "test"):
+        s = stat(db, repo, job)
+        assert (s.commits_total, s.failed_commits, s.flaky_commits) == (1, 1, 1)
+        assert s.score == 1.0
+        assert s.last_flaky_sha == "abc"
+    assert db.query(models.FlakyStat).filter_by(job_name="lint").count() == 0
+
+def test_score_is_flaky_over_failed_commits(db, repo):
+    flaky.record(db, make_run(db, repo, 1, "failure", sha="a"))
+    flaky.record(db, make_run(db, repo, 2, "success", sha="a", started=20))
+    flaky.record(db, make_run(db, repo, 3, "failure", sha="b", started=40))
+    flaky.record(db, make_run(db, repo, 4, "success", sha="c", started=60))
+    s = stat(db, repo)
+    assert (s.commits_total, s.failed_commits, s.flaky_commits) == (3, 2, 1)
+    assert s.score == 0.5
+
+def test_attempt_is_applied_once(db, repo):
+    run = make_run(db, repo, 1, "failure", sha="a")
+    assert flaky.record(db, run) is not None
+    assert flaky.record(db, run) is None
+    assert stat(db, repo).failed_commits == 1
+
+def test_is_known_flaky(db, repo, monkeypatch):
+    monkeypatch.setattr(flaky.settings, "flaky_suppress_score", 0.5)
+    monkeypatch.setattr(flaky.settings, "flaky_min_commits", 1)
+    flaky.record(db, make_run(db, repo, 1, "failure", sha="a"))
+    flaky.record(db, make_run(db, repo, 2, "success", sha="a", started=20))
+    assert flaky.is_known_flaky(db, make_run(db, repo, 3, "failure", sha="b", started=40))
+
+    monkeypatch.setattr(flaky.settings, "flaky_min_commits", 2)
+    assert not flaky.is_known_flaky(db, make_run(db, repo, 4, "failure", sha="c", started=60))
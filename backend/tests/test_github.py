@@ -0,0 +1,78 @@
+import pytest
+import requests
+
+from app import github
+from app.github import CircuitBreaker, CircuitOpenError
+
+def cool_down(b: CircuitBreaker):
+    b.opened_at -= b.cooldown
+
+def test_opens_after_threshold_consecutive_failures():
+    b = CircuitBreaker("/x", threshold=3, cooldown=60)
+    for ok in (False, False, True, False, False):
+        b.before()
+        b.record(ok)
+    assert b.opened_at is None  # the success reset the count
+    b.before()
+    b.record(False)
+    assert b.opened_at is not None
+    with pytest.raises(CircuitOpenError):
+        b.before()
+
+def test_half_open_lets_a_single_trial_through():
+    b = CircuitBreaker("/x", threshold=1, cooldown=60)
+    b.record(False)
+    cool_down(b)
+    b.before()  # the trial
+    with pytest.raises(CircuitOpenError):
+        b.before()  # everyone else waits for its outcome
+    b.record(True)
+    assert (b.failures, b.opened_at, b.trial) == (0, None, False)
+    b.before()
+
+def test_failed_trial_reopens_for_another_cooldown():
+    b = CircuitBreaker("/x", threshold=3, cooldown=60)
+    for _ in range(3):
+        b.record(False)
+    cool_down(b)
+    b.before()
+    b.record(False)
+    assert b.trial is False
+    with pytest.raises(CircuitOpenError):
+        b.before()
+    cool_down(b)
+    b.before()
+
+class Down:
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, *args, **kwargs):
+        self.calls += 1
+        raise requests.ConnectionError("down")
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker("/repos/{repo}", threshold=1, cooldown=60)
+    monkeypatch.setattr(github, "breaker_for", lambda endpoint: b)
+    return b
+
+def test_client_records_failures_and_fails_fast(breaker):
+    client = github.GitHubClient(token="t")
+    client.session = Down()
+    with pytest.raises(requests.ConnectionError):
+        client._get("https://api.github.com/repos/acme/api")
+    with pytest.raises(CircuitOpenError):
+        client._get("https://api.github.com/repos/acme/api")
+    assert client.session.calls == 1
+
+def test_token_failure_during_half_open_does_not_strand_the_trial(breaker):
+    def mint():
+        raise requests.HTTPError("installation token: 500")
+    breaker.record(False)
+    cool_down(breaker)
+    client = github.GitHubClient(token_provider=mint)
+    with pytest.raises(requests.HTTPError):
+        client._get("https://api.github.com/repos/acme/api")
+    assert breaker.trial is False
+    breaker.before()  # the next caller still gets the trial
@@ -0,0 +1,26 @@
+import pytest
+import requests
+
+from app import ingestor, models
+
+from .conftest import FakeGitHub, api_run
+
+@pytest.fixture
+def gh(monkeypatch):
+    client = FakeGitHub([{"id": 11, "name": "test", "status": "completed", "conclusion": "failure", "run_attempt": 1,
+                          "steps": [{"number": 1, "name": "pytest", "status": "completed", "conclusion": "failure"}]}])
+    monkeypatch.setattr(ingestor, "client_for", lambda repo: client)
+    return client
+
+def test_slack_failure_does_not_undo_ingestion(db, repo, gh, monkeypatch):
+    def down(*args, **kwargs):
+        raise requests.ConnectionError("slack is down")
+    monkeypatch.setattr(ingestor.settings, "alerts_enabled", True)
+    monkeypatch.setattr(ingestor.settings, "slack_webhook_url", "https://hooks.slack.invalid/x")
+    monkeypatch.setattr(ingestor, "post_slack_webhook", down)
+
+    ingestor.upsert_run(db, repo, api_run(1))
+    db.commit()
+    assert db.get(models.WorkflowRun, 1).conclusion == "failure"
+    assert db.get(models.WorkflowJob, 11) is not None
+    assert db.query(models.BranchReliability).one().failures_total == 1
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import leases, models
+
+from .conftest import make_run
+
+@pytest.fixture(autouse=True)
+def cadence(monkeypatch):
+    for name, value in {"lease_seconds": 120, "poll_interval_seconds": 30, "poll_shards": 4,
+                        "poll_idle_max_factor": 4, "open_runs_poll_seconds": 10}.items():
+        monkeypatch.setattr(leases.settings, name, value)
+
+def lease(db, repo):
+    db.expire_all()
+    return db.get(models.RepoLease, repo.id)
+
+def test_acquire_leases_each_due_repo_once(db, repo):
+    leases.ensure_leases(db)
+    leases.ensure_leases(db)  # idempotent
+    assert leases.acquire(db, 10, worker_id="w1") == [repo.id]
+    assert leases.acquire(db, 10, worker_id="w2") == []
+    l = lease(db, repo)
+    assert l.worker_id == "w1" and l.leased_until > datetime.utcnow()
+
+def test_inactive_repos_are_not_leased(db, repo):
+    repo.is_active = False
+    db.commit()
+    leases.ensure_leases(db)
+    assert leases.acquire(db, 10, worker_id="w1") == []
+
+def test_expired_lease_is_taken_over(db, repo):
+    leases.ensure_leases(db)
+    leases.acquire(db, 10, worker_id="w1")
+    lease(db, repo).leased_until = datetime.utcnow() - timedelta(seconds=1)  # w1 stopped heartbeating
+    db.commit()
+    assert leases.acquire(db, 10, worker_id="w2") == [repo.id]
+    # w1's late release no longer touches the row
+    leases.release(db, repo.id, worker_id="w1")
+    assert lease(db, repo).worker_id == "w2"
+
+def test_release_schedules_the_next_poll(db, repo):
+    leases.ensure_leases(db)
+    leases.acquire(db, 10, worker_id="w1")
+    before = datetime.utcnow()
+    leases.release(db, repo.id, worker_id="w1", idle_polls=0)
+    l = lease(db, repo)
+    assert (l.worker_id, l.leased_until, l.idle_polls) == (None, None, 0)
+    assert l.next_poll_at - before >= timedelta(seconds=120)  # interval * shards
+    assert leases.acquire(db, 10, worker_id="w1") == []  # not due yet
+
+@pytest.mark.parametrize("idle, factor", [(1, 2), (2, 4), (5, 4), (100, 4)])
+def test_idle_repos_back_off_up_to_the_cap(db, repo, idle, factor):
+    leases.ensure_leases(db)
+    leases.acquire(db, 10, worker_id="w1")
+    before = datetime.utcnow()
+    leases.release(db, repo.id, worker_id="w1", idle_polls=idle)
+    delay = lease(db, repo).next_poll_at - before
+    assert timedelta(seconds=120 * factor) <= delay < timedelta(seconds=120 * factor + 5)
+
+def test_open_runs_are_claimed_once_per_interval(db, repo):
+    run = make_run(db, repo, 1, status="in_progress")
+    leases.open_run(db, run)
+    leases.open_run(db, run)  # idempotent
+    db.commit()
+    assert leases.claim_open_runs(db, 10) == [(1, repo.id, None)]
+    assert leases.claim_open_runs(db, 10) == []
+    leases.close_run(db, 1)
+    assert db.query(models.OpenRun).count() == 0
+
+def test_discovery_is_recorded_for_the_ready_endpoint(db, repo, monkeypatch):
+    from app import ingestor
+
+    class Clients:
+        app = False
+
+        def sources(self):
+            return [("", GitHub())]
+
+    class GitHub:
+        def user_repos_url(self):
+            return "/user/repos"
+
+        def get_page_conditional(self, url, etag=None):
+            return 200, "etag", [{"full_name": "acme/api", "owner": {"login": "acme"}, "name": "api"}], None
+
+    monkeypatch.setattr(ingestor, "clients", Clients())
+    monkeypatch.setattr(ingestor, "SessionLocal", lambda: db)
+    leases.heartbeat(db, worker_id=leases.WORKER_ID)
+    assert db.get(models.IngestWorker, leases.WORKER_ID).last_discovery_at is None
+    ingestor.discover_and_sync_repos()
+    assert db.get(models.IngestWorker, leases.WORKER_ID).last_discovery_at is not None
@@ -0,0 +1,42 @@
+from app.logs import _MAX_LINE, extract_excerpt, format_excerpt
+
+def log(*lines):
+    return ("\n".join(f"2024-01-01T12:00:{i % 60:02d}.1234567Z {l}" for i, l in enumerate(lines)) + "\n").encode()
+
+def test_timestamps_are_stripped():
+    e = extract_excerpt(("\ufeff" + log("first", "second").decode()).encode(), 10, 2)
+    assert e["tail"] == "first\nsecond"
+    # Only GitHub's line prefix goes; timestamps inside the output stay
+    e = extract_excerpt(log("built at 2024-01-01T12:00:00Z ok"), 10, 2)
+    assert e["tail"] == "built at 2024-01-01T12:00:00Z ok"
+
+def test_context_window_around_the_first_error():
+    lines = [f"line {i}" for i in range(20)]
+    lines[8] = "##[error]Process completed with exit code 1."
+    lines[15] = "##[error]second error"
+    e = extract_excerpt(log(*lines), 3, 2)
+    assert e["error_line"] == 9
+    assert e["error_context"].splitlines() == ["line 6", "line 7", lines[8], "line 9", "line 10"]
+    assert e["tail"].splitlines() == ["line 17", "line 18", "line 19"]
+    assert (e["total_lines"], e["log_bytes"]) == (20, len(log(*lines)))
+
+def test_context_window_is_clipped_at_the_edges():
+    e = extract_excerpt(log("##[error]boom", "after"), 5, 3)
+    assert e["error_context"] == "##[error]boom\nafter"
+    e = extract_excerpt(log("before", "##[error]boom"), 5, 3)
+    assert e["error_context"] == "before\n##[error]boom"
+
+def test_no_error_falls_back_to_the_tail():
+    e = extract_excerpt(log(*(f"line {i}" for i in range(10))), 2, 5)
+    assert (e["error_line"], e["error_context"]) == (None, "")
+    assert e["tail"] == "line 8\nline 9"
+    assert format_excerpt("Run tests", e["error_context"], e["tail"]) == "Step: Run tests\nline 8\nline 9"
+
+def test_long_lines_are_capped():
+    e = extract_excerpt(log("x" * 10_000, "##[error]" + "y" * 10_000), 10, 1)
+    assert [len(l) for l in e["tail"].splitlines()] == [_MAX_LINE, _MAX_LINE]
+    assert len(e["error_context"]) == 2 * _MAX_LINE + 1
+
+def test_invalid_utf8_does_not_raise():
+    e = extract_excerpt(b"\xff\xfe broken\n##[error]boom\n", 5, 0)
+    assert e["error_context"] == "##[error]boom"
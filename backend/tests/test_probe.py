@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import ingestor, leases, models
+
+T = datetime(2024, 1, 1, 12, 0)
+
+@pytest.fixture(autouse=True)
+def cadence(monkeypatch):
+    for name, value in {"probe_full_poll_minutes": 10, "poll_interval_seconds": 30, "poll_shards": 4,
+                        "poll_idle_max_factor": 4, "github_probe": True}.items():
+        monkeypatch.setattr(ingestor.settings, name, value)
+
+def decide(repo, lease, fp, now):
+    full, activity = ingestor.probe_decision(repo, lease, fp, now)
+    lease.idle_polls, lease.probe_state = activity["idle_polls"], activity["probe_state"]
+    if full:
+        repo.last_checked_at = now
+    return full
+
+def test_changed_fingerprint_lists_and_resets_idle():
+    repo, lease = models.Repo(last_checked_at=T), models.RepoLease(probe_state="a", idle_polls=3)
+    assert decide(repo, lease, "b", T + timedelta(minutes=1))
+    assert lease.idle_polls == 0
+
+def test_never_listed_repo_is_listed():
+    assert decide(models.Repo(), models.RepoLease(probe_state="a"), "a", T)
+
+def test_idle_repo_is_listed_once_its_last_listing_is_too_old():
+    repo, lease = models.Repo(last_checked_at=T), models.RepoLease(probe_state="a", idle_polls=0)
+    # The probe misses fork-PR runs and re-runs on other branches: however idle, a repo is listed every 10 minutes
+    assert [decide(repo, lease, "a", T + timedelta(minutes=m)) for m in (2, 6, 9, 10, 12, 19, 21)] == \
+        [False, False, False, True, False, False, True]
+    assert lease.idle_polls == 7  # a forced listing doesn't reset the backoff
+
+class Clock(datetime):
+    now = T
+
+    @classmethod
+    def utcnow(cls):
+        return cls.now
+
+def test_idle_backoff_and_cap_bound_the_lateness(db, repo, monkeypatch):
+    # Poll ticks as the scheduler would run them, for a repo whose fingerprint never changes
+    monkeypatch.setattr(Clock, "now", T)
+    monkeypatch.setattr(ingestor, "datetime", Clock)
+    monkeypatch.setattr(leases, "datetime", Clock)
+    monkeypatch.setattr(ingestor, "SessionLocal", sessionmaker(bind=db.get_bind(), autoflush=False))
+    monkeypatch.setattr(ingestor, "probe_activity", lambda db, ids: {i: "same" for i in ids})
+    listed = []
+    monkeypatch.setattr(ingestor, "ingest_repo_runs", lambda db, r: (listed.append(Clock.now), setattr(r, "last_checked_at", Clock.now)))
+    monkeypatch.setattr(ingestor, "client_for", lambda r: type("gh", (), {"has_budget": lambda self, reserve: True})())
+
+    polls = []
+    while Clock.now < T + timedelta(hours=2):
+        if not polls or db.get(models.RepoLease, repo.id).next_poll_at <= Clock.now:
+            ingestor._poll_tick()
+            polls.append(Clock.now)
+            db.expire_all()
+        Clock.now += timedelta(seconds=30)
+    gaps = [b - a for a, b in zip(polls, polls[1:])]
+    assert max(gaps) == timedelta(minutes=8)  # 2 minutes, doubled per idle tick up to x4
+    assert max(b - a for a, b in zip(listed, listed[1:])) <= timedelta(minutes=10 + 8)
+    assert len(listed) > 6
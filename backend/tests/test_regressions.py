@@ -0,0 +1,63 @@
+import pytest
+
+from app import models, regressions
+
+from .conftest import make_run
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    for name, value in {"regression_alpha": 0.1, "regression_min_samples": 5, "regression_zscore": 3.0,
+                        "regression_min_secs": 60.0, "regression_alert_runs": 2}.items():
+        monkeypatch.setattr(regressions.settings, name, value)
+
+def warm_up(db, repo, n=6):
+    # Alternating 10 and 11 minute runs: mean ~10.5m, std ~30s
+    for i in range(n):
+        assert regressions.observe(db, make_run(db, repo, i + 1, minutes=10 + i % 2, started=i * 20)) is None
+    return n
+
+def test_baseline_is_a_running_mean_until_enough_samples(db, repo):
+    for i, minutes in enumerate((10, 20)):
+        regressions.observe(db, make_run(db, repo, i + 1, minutes=minutes, started=i * 30))
+    base = regressions.get_baseline(db, repo.id, "CI")
+    assert base.samples == 2
+    assert base.mean_secs == pytest.approx(15 * 60)
+
+def test_only_successful_runs_feed_the_baseline(db, repo):
+    assert regressions.observe(db, make_run(db, repo, 1, "failure", minutes=1)) is None
+    assert regressions.observe(db, make_run(db, repo, 2, status="in_progress")) is None
+    assert regressions.get_baseline(db, repo.id, "CI").samples == 0
+
+def test_slow_runs_are_flagged_and_streak(db, repo):
+    n = warm_up(db, repo)
+    first = regressions.observe(db, make_run(db, repo, n + 1, minutes=20, started=200))
+    assert first is not None and first.slow_streak == 1
+    assert not regressions.alert_due(first)
+    second = regressions.observe(db, make_run(db, repo, n + 2, minutes=20, started=240))
+    assert second is not None and second.slow_streak == 2
+    assert regressions.alert_due(second)
+    # A normal run ends the streak
+    assert regressions.observe(db, make_run(db, repo, n + 3, minutes=10, started=280)) is None
+    assert regressions.get_baseline(db, repo.id, "CI").slow_streak == 0
+    db.flush()
+    assert db.query(models.DurationRegression).count() == 2
+
+def test_flagged_runs_move_the_mean_but_not_the_variance(db, repo):
+    n = warm_up(db, repo)
+    base = regressions.get_baseline(db, repo.id, "CI")
+    mean, var = base.mean_secs, base.var_secs
+    regressions.observe(db, make_run(db, repo, n + 1, minutes=20, started=200))
+    assert base.mean_secs > mean
+    assert base.var_secs == var
+
+def test_small_slowdowns_need_min_secs(db, repo):
+    n = warm_up(db, repo)
+    # Several std above the mean, but under REGRESSION_MIN_SECS slower
+    assert regressions.observe(db, make_run(db, repo, n + 1, minutes=11.5, started=200)) is None
+
+def test_same_attempt_twice_is_a_noop(db, repo):
+    n = warm_up(db, repo)
+    run = make_run(db, repo, n + 1, minutes=20, started=200)
+    assert regressions.observe(db, run) is not None
+    assert regressions.observe(db, run) is None
+    assert regressions.get_baseline(db, repo.id, "CI").samples == n + 1
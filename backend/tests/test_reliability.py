@@ -0,0 +1,44 @@
+from app import ingestor, reliability
+
+from .conftest import make_run
+
+def test_streak_and_recovery(db, repo):
+    runs = [make_run(db, repo, 1, "failure", started=0), make_run(db, repo, 2, "failure", started=20),
+            make_run(db, repo, 3, "success", started=40)]
+    for run in runs:
+        state = reliability.advance(db, run)
+    assert (state.runs_total, state.failures_total) == (3, 2)
+    assert (state.current_streak, state.longest_streak) == (0, 2)
+    assert state.recoveries == 1
+    assert state.last_recovery_secs == 40 * 60  # first failure completed at +10m, recovery at +50m
+
+def test_same_attempt_twice_is_a_noop(db, repo):
+    run = make_run(db, repo, 1, "failure")
+    reliability.advance(db, run)
+    state = reliability.advance(db, run)
+    assert (state.runs_total, state.failures_total, state.current_streak) == (1, 1, 1)
+
+def test_out_of_order_completion_counts_but_keeps_streak(db, repo):
+    # Run 1 started first but finished after run 2; run 2 (a pass) is applied first
+    early = make_run(db, repo, 1, "failure", started=0, minutes=30)
+    late = make_run(db, repo, 2, "success", started=5, minutes=5)
+    reliability.advance(db, early)
+    state = reliability.advance(db, late)
+    assert (state.runs_total, state.failures_total) == (2, 1)
+    assert state.current_streak == 1  # run 1 completed last: the branch is red
+    assert state.last_run_id == 1
+
+    # The other way round: the older completion is counted, the newer one decides the streak
+    other = make_run(db, repo, 3, "failure", started=60, minutes=30, branch="dev")
+    newer = make_run(db, repo, 4, "success", started=65, minutes=5, branch="dev")
+    reliability.advance(db, other)
+    state = reliability.advance(db, newer)
+    assert (state.runs_total, state.failures_total, state.current_streak) == (2, 1, 1)
+
+def test_completed_runs_apply_in_completion_order():
+    runs = [
+        {"id": 2, "status": "completed", "created_at": "2024-01-01T12:05:00Z", "updated_at": "2024-01-01T12:10:00Z"},
+        {"id": 1, "status": "completed", "created_at": "2024-01-01T12:00:00Z", "updated_at": "2024-01-01T12:30:00Z"},
+        {"id": 3, "status": "in_progress", "created_at": "2024-01-01T12:20:00Z", "updated_at": "2024-01-01T12:21:00Z"},
+    ]
+    assert [r["id"] for r in sorted(runs, key=ingestor._apply_order)] == [2, 3, 1]
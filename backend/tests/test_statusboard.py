@@ -0,0 +1,46 @@
+from app import models, statusboard
+
+from .conftest import make_run
+
+def row(db, repo, branch="main"):
+    db.expire_all()
+    return db.query(models.BranchStatus).filter_by(repo_id=repo.id, head_branch=branch, workflow_name="CI").one()
+
+def test_newer_run_replaces_older_is_ignored(db, repo):
+    statusboard.record(db, make_run(db, repo, 2, "success", started=20))
+    statusboard.record(db, make_run(db, repo, 1, "failure", started=0))  # seen late (backfill)
+    assert (row(db, repo).run_id, row(db, repo).failing) == (2, False)
+    statusboard.record(db, make_run(db, repo, 3, "failure", started=40))
+    assert (row(db, repo).run_id, row(db, repo).failing) == (3, True)
+
+def test_run_in_progress_keeps_the_branch_red(db, repo):
+    statusboard.record(db, make_run(db, repo, 1, "failure"))
+    statusboard.record(db, make_run(db, repo, 2, started=20, status="in_progress"))
+    s = row(db, repo)
+    assert (s.run_id, s.status, s.failing) == (2, "in_progress", True)
+    statusboard.record(db, make_run(db, repo, 2, "success", started=20))
+    assert row(db, repo).failing is False
+
+def test_same_run_always_updates(db, repo):
+    statusboard.record(db, make_run(db, repo, 1, "failure", started=20))
+    # A re-run attempt may report an earlier started_at than the stored one; it's still the same run
+    statusboard.record(db, make_run(db, repo, 1, "success", started=10, attempt=2))
+    s = row(db, repo)
+    assert (s.run_attempt, s.conclusion, s.failing) == (2, "success", False)
+
+def test_batch_keeps_newest_per_key(db, repo):
+    runs = [make_run(db, repo, 1, "failure", started=0), make_run(db, repo, 2, "success", started=20),
+            make_run(db, repo, 3, "failure", started=10, branch="dev")]
+    statusboard.upsert(db, [{k: getattr(r, k) for k in ("id", "repo_id", "head_branch", "workflow_name") + statusboard._FIELDS}
+                            for r in runs])
+    assert row(db, repo).run_id == 2
+    assert row(db, repo, "dev").failing is True
+
+def test_seed_takes_last_completed_run_per_key(db, repo):
+    make_run(db, repo, 1, "success", started=0)
+    make_run(db, repo, 2, "failure", started=20)
+    make_run(db, repo, 3, started=40, status="in_progress")
+    make_run(db, repo, 4, "success", started=0, branch="dev")
+    assert statusboard.seed(db.connection()) == 2
+    assert (row(db, repo).run_id, row(db, repo).failing) == (2, True)
+    assert row(db, repo, "dev").run_id == 4
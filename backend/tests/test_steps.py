@@ -0,0 +1,37 @@
+from sqlalchemy import text
+
+from app import database, ingestor, models
+
+from .conftest import make_run
+
+def job(steps):
+    return {"id": 11, "steps": [{"number": n, "name": name, "status": "completed", "conclusion": c,
+                                 "started_at": "2024-01-01T12:00:00Z", "completed_at": "2024-01-01T12:01:00Z"}
+                                for n, name, c in steps]}
+
+def steps(db):
+    return db.query(models.WorkflowStep.job_id, models.WorkflowStep.number, models.WorkflowStep.name,
+                    models.WorkflowStep.conclusion).order_by(models.WorkflowStep.number).all()
+
+def test_fetching_a_job_twice_updates_its_steps_in_place(db, repo):
+    make_run(db, repo, 1)
+    db.add(models.WorkflowJob(id=11, run_id=1, name="test"))
+    ingestor.bulk_upsert_steps(db, [job([(1, "checkout", "success"), (2, "pytest", None)])])
+    ingestor.bulk_upsert_steps(db, [job([(1, "checkout", "success"), (2, "pytest", "failure")]),
+                                    {"id": 12, "steps": [{"name": "no number"}]}])
+    assert steps(db) == [(11, 1, "checkout", "success"), (11, 2, "pytest", "failure")]
+
+def test_migration_removes_duplicate_steps_before_building_the_index(db, repo, monkeypatch):
+    # A table left by older versions: no unique index, a new row per step on every fetch
+    db.execute(text("DROP INDEX uq_workflow_steps_job_number"))
+    rows = [(1, 11, 1, "old"), (2, 11, 2, "pytest"), (3, 11, 1, "checkout"), (4, 11, None, "a"), (5, 11, None, "b"),
+            (6, 12, 1, "other job")]
+    for id_, job_id, number, name in rows:
+        db.add(models.WorkflowStep(id=id_, job_id=job_id, number=number, name=name))
+    db.commit()
+
+    monkeypatch.setattr(database, "engine", db.get_bind())
+    database._migrate()
+    ids = [id_ for (id_,) in db.execute(text("SELECT id FROM workflow_steps ORDER BY id"))]
+    assert ids == [2, 3, 4, 5, 6]  # newest of (11, 1) kept; NULL numbers are never duplicates
+    assert "uq_workflow_steps_job_number" in {i["name"] for i in database.inspect(db.get_bind()).get_indexes("workflow_steps")}
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import duckdb
+import pytest
+
+from app import analytics
+from app.analytics import partition_path
+from app.metrics import effective_resolution
+
+@pytest.mark.parametrize("window, resolution, max_points, expected", [
+    (30, "hour", 720, "hour"),   # 720 hourly buckets: exactly fits
+    (31, "hour", 720, "day"),
+    (200, "day", 200, "day"),
+    (201, "day", 200, "week"),
+    (364, "day", 52, "week"),    # 52 weeks
+    (365, "day", 52, "month"),
+    (3650, "hour", 1, "month"),  # nothing fits: the coarsest resolution
+    (7, "month", 200, "month"),  # never refined
+])
+def test_effective_resolution(window, resolution, max_points, expected):
+    assert effective_resolution(window, resolution, max_points) == expected
+
+@pytest.fixture
+def parquet_runs(tmp_path, monkeypatch):
+    # Two runs an hour apart across New York's midnight (04:30 and 05:30 UTC on 5 March)
+    monkeypatch.setattr(analytics.settings, "analytics_dir", str(tmp_path))
+    path = partition_path("workflow_runs", datetime(2024, 3, 1).date())
+    (tmp_path / "workflow_runs" / "month=2024-03").mkdir(parents=True)
+    duckdb.sql("COPY (SELECT * FROM (VALUES (TIMESTAMP '2024-03-05 04:30:00', 'failure', 60.0, 'acme/api', 'main'),"
+               " (TIMESTAMP '2024-03-05 05:30:00', 'success', 120.0, 'acme/api', 'main'))"
+               f" t(started_at, conclusion, duration_secs, repo, head_branch)) TO '{path}' (FORMAT parquet)")
+
+def buckets(tz, resolution="day"):
+    rows = analytics.timeseries("acme/api", None, datetime(2024, 3, 1), datetime(2024, 3, 10), resolution, tz)
+    return [(b.date().isoformat(), int(s), int(f)) for b, s, f, *_ in rows]
+
+def test_day_buckets_follow_the_viewers_midnight(parquet_runs):
+    assert buckets("UTC") == [("2024-03-05", 1, 1)]
+    assert buckets("America/New_York") == [("2024-03-04", 0, 1), ("2024-03-05", 1, 0)]
+
+def test_week_buckets_start_on_local_monday(parquet_runs):
+    # 5 March 2024 is a Tuesday in both zones
+    assert buckets("America/New_York", "week") == [("2024-03-04", 1, 1)]
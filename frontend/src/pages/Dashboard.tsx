@@ -14,6 +14,7 @@ type Run = {
 type Job = {
   id:number; name:string; status:string; conclusion:string; started_at:string; completed_at:string; duration_secs:number
 }
+type Excerpt = { job_id:number; step_name:string|null; error_line:number|null; error_context:string; tail:string; has_log:boolean }
 
 const fmtDuration = (secs:number) => {
   if (!secs && secs !== 0) return '-'
@@ -93,7 +94,7 @@ export default function Dashboard() {
   const [openDetails, setOpenDetails] = useState(false)
   const [selectedRun, setSelectedRun] = useState<Run | null>(null)
   const [jobs, setJobs] = useState<Job[]>([])
-  const [jobLog, setJobLog] = useState<string>('')
+  const [excerpt, setExcerpt] = useState<Excerpt | null>(null)
 
   const primaryRepo = useMemo(() => repo || (repos[0]?.full_name ?? ''), [repo, repos])
 
@@ -126,15 +127,15 @@ export default function Dashboard() {
     setSelectedRun(r)
     setOpenDetails(true)
     setJobs([])
-    setJobLog('')
+    setExcerpt(null)
     try {
       const j = await axios.get(`/api/runs/${r.id}/jobs`)
       setJobs(j.data)
-      // quick peek: fetch first failed job log (if any)
+      // quick peek: precomputed excerpt of the first failed job (if any)
       const failed = (j.data as Job[]).find(j => j.conclusion === 'failure')
       if (failed) {
-        const log = await axios.get(`/api/jobs/${failed.id}/log`, { responseType: 'text' })
-        setJobLog(log.data)
+        const ex = await axios.get(`/api/jobs/${failed.id}/excerpt`)
+        setExcerpt(ex.data)
       }
     } catch { /* ignore */ }
   }
@@ -345,10 +346,16 @@ export default function Dashboard() {
               </div>
             </div>
 
-            {jobLog && (
+            {excerpt && (
               <div>
-                <div className="font-semibold mb-2">Log Snippet (last lines from first failed job)</div>
-                <pre className="p-3 rounded-xl bg-slate-100 dark:bg-slate-800 overflow-auto max-h-72 text-xs whitespace-pre-wrap">{jobLog}</pre>
+                <div className="font-semibold mb-2">
+                  Failure{excerpt.step_name ? ` in "${excerpt.step_name}"` : ''}
+                  {excerpt.error_line ? <span className="text-slate-500 font-normal"> (line {excerpt.error_line})</span> : null}
+                  {' '}{excerpt.has_log
+                    ? <a className="text-indigo-600 underline font-normal text-sm" href={`/api/jobs/${excerpt.job_id}/log`} target="_blank">Full log</a>
+                    : <span className="text-slate-500 font-normal text-sm">(full log over the size cap, not stored)</span>}
+                </div>
+                <pre className="p-3 rounded-xl bg-slate-100 dark:bg-slate-800 overflow-auto max-h-72 text-xs whitespace-pre-wrap">{excerpt.error_context || excerpt.tail}</pre>
               </div>
             )}
           </div>